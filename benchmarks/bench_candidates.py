@@ -0,0 +1,65 @@
+import os  
+import sys  
+import time  
+import random  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_candidates.py  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  
+import core_engine  
+  
+# 候補駅抽出 (search_routes の1リクエスト分) の所要時間を、従来の全駅ループと比較する  
+  
+PAIRS = [  
+    ("新宿", "町田"), ("渋谷", "横浜"), ("東京", "八王子"), ("池袋", "大宮"),  
+    ("品川", "小田原"), ("上野", "柏"), ("新宿", "高尾"), ("東京", "千葉"),  
+]  
+REPEAT = 200  
+  
+def select_candidates_legacy(start_name, start_coords, target_coords):  
+    """ 空間インデックス導入前の実装 (全駅 x haversine 2回) """  
+    candidates = []  
+    total_dist = core_engine.haversine_distance(start_coords, target_coords)  
+    for name, coords in core_engine.station_coords.items():  
+        if name == start_name: continue  
+        d_from_start = core_engine.haversine_distance(start_coords, coords)  
+        d_to_goal = core_engine.haversine_distance(coords, target_coords)  
+        if (d_from_start + d_to_goal) < total_dist * core_engine.DETOUR_RATIO:  
+            candidates.append({"name": name, "dist_start": d_from_start, "dist_goal": d_to_goal})  
+    candidates.sort(key=lambda x: x["dist_start"])  
+    if len(candidates) > core_engine.MAX_CANDIDATES:  
+        step = len(candidates) // core_engine.MAX_CANDIDATES  
+        candidates = candidates[::step]  
+    return candidates  
+  
+def bench(fn, queries):  
+    t0 = time.perf_counter()  
+    for _ in range(REPEAT):  
+        for start, s_coords, t_coords in queries:  
+            fn(start, s_coords, t_coords)  
+    return (time.perf_counter() - t0) / (REPEAT * len(queries)) * 1000  
+  
+if __name__ == "__main__":  
+    coords = core_engine.station_coords  
+    queries = [(s, coords[s], coords[t]) for s, t in PAIRS if s in coords and t in coords]  
+    # ランダムな駅ペアも混ぜる  
+    rng = random.Random(0)  
+    names = list(coords.keys())  
+    for _ in range(20):  
+        s, t = rng.sample(names, 2)  
+        queries.append((s, coords[s], coords[t]))  
+  
+    mismatch = 0  
+    for start, s_coords, t_coords in queries:  
+        old = [c["name"] for c in select_candidates_legacy(start, s_coords, t_coords)]  
+        new = [c["name"] for c in core_engine.select_candidates(start, s_coords, t_coords)]  
+        if old != new:  
+            mismatch += 1  
+            print(f"⚠️ {start}: {old} != {new}")  
+  
+    legacy_ms = bench(select_candidates_legacy, queries)  
+    grid_ms = bench(core_engine.select_candidates, queries)  
+    print(f"stations       : {len(coords)}")  
+    print(f"queries        : {len(queries)} x {REPEAT}")  
+    print(f"legacy loop    : {legacy_ms:.3f} ms / request")  
+    print(f"grid + numpy   : {grid_ms:.3f} ms / request  (x{legacy_ms / grid_ms:.1f})")  
+    print(f"result mismatch: {mismatch}")  
\ No newline at end of file
@@ -0,0 +1,173 @@
+import os  
+import io  
+import sys  
+import json  
+import time  
+import random  
+import contextlib  
+from datetime import datetime  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_engine.py  
+# エンジンの主な処理の所要時間と結果を測り、benchmarks/baseline_engine.json と比べる (遅くなった・答えが変わったら知らせる)  
+#   1. haversine_distance / calculate_taxi_fare (1回あたり)  
+#   2. 候補駅の抽出 select_candidates  
+#   3. Yahoo!の印刷用ページの解析 parse_yahoo_route (fixtures/yahoo の保存済みページ。期待値との一致も確認)  
+#   4. search_routes (backend="yahoo") の全体。Yahoo!は yahoo_stub_server.py (ローカル) に差し替え、  
+#      stops.txt の実在の駅の組 x 終電前後の時刻で、選ばれた駅と1検索あたりの問い合わせ数を記録する  
+#   5. 時刻表の生成 (generate_full_timetable.generate_line 全路線 + スナップショット用の配列化)  
+#   BENCH_SAVE_BASELINE=1 : 今回の結果を基準として保存する  
+#   BENCH_TOLERANCE=1.5   : 基準よりこの倍率以上遅い項目を ⚠️ で知らせる  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  
+os.chdir(ROOT)  
+# 問い合わせ数を数えるので経路キャッシュは使わない。マナー待機もローカル相手なので無し  
+os.environ.update({"ROUTE_CACHE_DB": "", "ROUTE_CACHE_LRU_SIZE": "0", "YAHOO_DELAY_SEC": "0"})  
+with contextlib.redirect_stdout(io.StringIO()):  
+    import core_engine  
+import yahoo_stub_server  
+  
+BASELINE_JSON = os.path.join(ROOT, "benchmarks", "baseline_engine.json")  
+SAVE_BASELINE = os.environ.get("BENCH_SAVE_BASELINE") == "1"  
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "1.5"))  
+PAIRS = 12  
+TIMES = ["23:00", "24:00", "24:40"]  
+MIN_DISTANCE_KM, MAX_DISTANCE_KM = 8, 45  
+  
+def per_call(fn, args_list, min_time=0.2, rounds=3):  
+    """ args_list を何周か回し、1回あたりの時間 (us) の最小値 (rounds 回のうち) """  
+    best = None  
+    for _ in range(rounds):  
+        n = 0  
+        t0 = time.perf_counter()  
+        while True:  
+            for args in args_list: fn(*args)  
+            n += len(args_list)  
+            elapsed = time.perf_counter() - t0  
+            if elapsed >= min_time: break  
+        us = elapsed / n * 1e6  
+        best = us if best is None else min(best, us)  
+    return best  
+  
+def pick_pairs():  
+    """ stops.txt の駅から、決まった乱数で MIN〜MAX km 離れた駅の組を選ぶ """  
+    rng = random.Random(7)  
+    names = list(core_engine.station_coords.keys())  
+    pairs = []  
+    while len(pairs) < PAIRS:  
+        a, b = rng.sample(names, 2)  
+        d = core_engine.haversine_distance(core_engine.station_coords[a], core_engine.station_coords[b])  
+        if MIN_DISTANCE_KM <= d <= MAX_DISTANCE_KM: pairs.append((a, b))  
+    return pairs  
+  
+def bench_micro(pairs, timings):  
+    coords = [(core_engine.station_coords[a], core_engine.station_coords[b]) for a, b in pairs]  
+    timings["haversine_distance_us"] = per_call(core_engine.haversine_distance, coords)  
+    kms = [(0.05 + i * 0.7,) for i in range(40)]  
+    timings["calculate_taxi_fare_us"] = per_call(core_engine.calculate_taxi_fare, kms)  
+    args = [(a, core_engine.station_coords[a], core_engine.station_coords[b]) for a, b in pairs]  
+    timings["select_candidates_us"] = per_call(core_engine.select_candidates, args)  
+  
+def bench_parse(timings, results):  
+    cases = yahoo_stub_server.load_cases()  
+    args = []  
+    for case in cases:  
+        h, m = map(int, case["query"].split(":"))  
+        dt = datetime(2025, 12, 12, h, m)  
+        got = core_engine.parse_yahoo_route(case["html"], dt)  
+        results[f"parse:{case['file']}"] = got  
+        if got != case["expected"]: print(f"  ❌ parse {case['file']}: {got} != {case['expected']}")  
+        args.append((case["html"], dt))  
+    timings["parse_yahoo_route_us"] = per_call(core_engine.parse_yahoo_route, args, min_time=0.5)  
+    print(f"  parse_yahoo_route      {timings['parse_yahoo_route_us'] / 1000:8.2f} ms/page  ({len(cases)} fixtures, {sum(len(c['html']) for c in cases) // len(cases) // 1024} KB avg)")  
+  
+def bench_search(pairs, timings, results):  
+    server, url = yahoo_stub_server.start_server()  
+    core_engine.YAHOO_PRINT_URL = url  
+    counts = server.RequestHandlerClass.counts  
+    for mode in ("bisect", "speculative"):  
+        core_engine.YAHOO_SEARCH_MODE = mode  
+        elapsed = []  
+        probes = []  
+        for start, target in pairs:  
+            for t in TIMES:  
+                before = counts["requests"]  
+                t0 = time.perf_counter()  
+                with contextlib.redirect_stdout(io.StringIO()):  
+                    res = core_engine.search_routes(start, t, target_name=target, backend="yahoo")  
+                elapsed.append(time.perf_counter() - t0)  
+                probes.append(counts["requests"] - before)  
+                results[f"search:{mode}:{start}->{target}@{t}"] = {"station": res[0]["station"], "probes": probes[-1]}  
+        timings[f"search_{mode}_ms"] = sum(elapsed) / len(elapsed) * 1000  
+        results[f"probes:{mode}:total"] = sum(probes)  
+        print(f"  search ({mode:<11})  {timings[f'search_{mode}_ms']:8.2f} ms/search  probes/search avg {sum(probes) / len(probes):.2f} max {max(probes)}  ({len(probes)} searches)")  
+    server.shutdown()  
+    # 先読みしても二分探索と同じ駅を選ぶはず  
+    differ = [k for k in results if k.startswith("search:bisect:") and results[k.replace(":bisect:", ":speculative:")]["station"] != results[k]["station"]]  
+    if differ: print(f"  ❌ bisect / speculative differ: {differ}")  
+  
+def bench_generate(timings, results):  
+    import generate_full_timetable as gen  
+    import timetable  
+    with open(gen.INPUT_JSON, "r", encoding="utf-8") as f:  
+        stations = json.load(f)  
+    lines = {}  
+    for s in stations: lines.setdefault(s["l"], []).append(s)  
+    jobs = [(name, st_list, True) for name, st_list in lines.items() if len(st_list) >= 2]  
+  
+    t0 = time.perf_counter()  
+    trips = []  
+    rows = 0  
+    for job in jobs:  
+        text, directions = gen.generate_line(job)  
+        rows += text.count("\n")  
+        for trip_ids, order, times in directions:  
+            trips.extend((trip_id, order, row, row) for trip_id, row in zip(trip_ids, times.tolist()))  
+    timings["generate_lines_ms"] = (time.perf_counter() - t0) * 1000  
+    t0 = time.perf_counter()  
+    with contextlib.redirect_stdout(io.StringIO()):  
+        tt = timetable.timetable_from_trips(trips, timetable.STOPS_TXT)  
+    timings["timetable_from_trips_ms"] = (time.perf_counter() - t0) * 1000  
+    results["generate:rows"] = rows  
+    results["generate:trips"] = len(trips)  
+    print(f"  generate_line x{len(jobs):<4}   {timings['generate_lines_ms']:8.1f} ms  ({rows} rows, {len(trips)} trips)")  
+    print(f"  timetable_from_trips   {timings['timetable_from_trips_ms']:8.1f} ms  ({len(tt.station_names)} stations, {tt.route_count} routes)")  
+  
+def compare(timings, results):  
+    with open(BASELINE_JSON, "r", encoding="utf-8") as f:  
+        baseline = json.load(f)  
+    changed = [k for k in sorted(set(baseline["results"]) | set(results)) if baseline["results"].get(k) != results.get(k)]  
+    for k in changed[:20]:  
+        print(f"  ❌ {k}: {baseline['results'].get(k)} -> {results.get(k)}")  
+    print(f"  results: {len(results) - len(changed)}/{len(results)} same as baseline")  
+    for k, v in timings.items():  
+        base = baseline["timings"].get(k)  
+        if base is None: continue  
+        ratio = v / base  
+        mark = "⚠️" if ratio >= TOLERANCE else ("🚀" if ratio <= 1 / TOLERANCE else "  ")  
+        print(f"  {mark} {k:<26} {base:10.2f} -> {v:10.2f}  (x{ratio:.2f})")  
+    return not changed  
+  
+def main():  
+    pairs = pick_pairs()  
+    timings, results = {}, {}  
+    print(f"🧪 {len(core_engine.station_coords)} stations, {len(pairs)} pairs x {len(TIMES)} times")  
+    bench_micro(pairs, timings)  
+    print(f"  haversine_distance     {timings['haversine_distance_us']:8.2f} us")  
+    print(f"  calculate_taxi_fare    {timings['calculate_taxi_fare_us']:8.2f} us")  
+    print(f"  select_candidates      {timings['select_candidates_us']:8.2f} us")  
+    bench_parse(timings, results)  
+    bench_search(pairs, timings, results)  
+    bench_generate(timings, results)  
+  
+    if SAVE_BASELINE:  
+        with open(BASELINE_JSON, "w", encoding="utf-8") as f:  
+            json.dump({"timings": timings, "results": results}, f, ensure_ascii=False, indent=1)  
+        print(f"💾 {BASELINE_JSON}")  
+    elif os.path.exists(BASELINE_JSON):  
+        print("📊 baseline:")  
+        if not compare(timings, results): sys.exit(1)  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
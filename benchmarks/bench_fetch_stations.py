@@ -0,0 +1,133 @@
+import os  
+import sys  
+import csv  
+import json  
+import time  
+import zlib  
+import tempfile  
+import threading  
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  
+from urllib.parse import urlparse, parse_qs  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_fetch_stations.py  (pykakasi が必要)  
+# 今の stations_kanto.json / stops.txt から HeartRails Express API の代わりをするローカルサーバーを立て、  
+#   1. 旧実装 (1リクエストずつ + 路線ごとに0.1秒待ち + 駅ごとにかな変換)  
+#   2. 新実装 (並列 + 都県をまたぐ路線は1回 + かな変換のメモ化)、キャッシュなし  
+#   3. 新実装の再実行 (ディスクのキャッシュだけで、通信しない)  
+# の所要時間とリクエスト数を比べ、どれも同じ駅リストになることを確かめる。  
+# 路線は 1〜3 の都県にまたがるように決まった規則で割り振る (実 API と同じく、またぐ路線は各都県の一覧に出る)  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+os.chdir(ROOT)  
+import fetch_stations  
+import http_crawler  
+  
+LATENCY_MS = 100  
+  
+def build_dataset():  
+    with open("data/stations_kanto.json", "r", encoding="utf-8") as f:  
+        entries = json.load(f)  
+    coords = {}  
+    with open("data/stops.txt", "r", encoding="utf-8") as f:  
+        for row in csv.DictReader(f):  
+            coords[row["stop_name"]] = (row["stop_lon"], row["stop_lat"])  
+    lines = {}  
+    for e in entries:  
+        x, y = coords.get(e["n"], ("139.7", "35.7"))  
+        lines.setdefault(e["l"], []).append({"name": e["n"], "line": e["l"], "x": float(x), "y": float(y)})  
+    prefectures = {pref: [] for pref in fetch_stations.PREFECTURES}  
+    for line in lines:  
+        h = zlib.crc32(line.encode("utf-8"))  
+        for i in range(1 + h % 3):  
+            prefectures[fetch_stations.PREFECTURES[(h // 3 + i * 2) % len(fetch_stations.PREFECTURES)]].append(line)  
+    return prefectures, lines  
+  
+class StubHandler(BaseHTTPRequestHandler):  
+    prefectures = lines = None  
+    requests = 0  
+    lock = threading.Lock()  
+  
+    def log_message(self, *args):  
+        pass  
+  
+    def do_GET(self):  
+        with self.lock:  
+            type(self).requests += 1  
+        threading.Event().wait(LATENCY_MS / 1000)  
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}  
+        if q.get("method") == "getLines" and q.get("prefecture") in self.prefectures:  
+            data = {"response": {"line": self.prefectures[q["prefecture"]]}}  
+        elif q.get("method") == "getStations" and q.get("line") in self.lines:  
+            data = {"response": {"station": self.lines[q["line"]]}}  
+        else:  
+            data = {"response": {"error": "not found"}}  
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")  
+        self.send_response(200)  
+        self.send_header("Content-Type", "application/json; charset=utf-8")  
+        self.send_header("Content-Length", str(len(body)))  
+        self.end_headers()  
+        self.wfile.write(body)  
+  
+def legacy_fetch(base):  
+    """ 変更前の fetch_kanto_stations と同じ手順 (通信先だけ差し替え) """  
+    import requests  
+    url = f"{base}/json"  
+    all_stations, seen_ids = [], set()  
+    for pref in fetch_stations.PREFECTURES:  
+        try:  
+            lines = requests.get(url, params={"method": "getLines", "prefecture": pref}).json()['response']['line']  
+        except Exception:  
+            continue  
+        for line in lines:  
+            try:  
+                stations = requests.get(url, params={"method": "getStations", "line": line}).json()['response']['station']  
+            except Exception:  
+                continue  
+            for st in stations:  
+                kana = fetch_stations.to_hiragana.__wrapped__(st['name'])  
+                unique_key = f"{st['name']}_{st['line']}"  
+                if unique_key not in seen_ids:  
+                    all_stations.append({"id": st['name'], "n": st['name'], "k": kana, "l": st['line'],  
+                                         "lat": float(st['y']), "lon": float(st['x'])})  
+                    seen_ids.add(unique_key)  
+            time.sleep(0.1)  
+    return all_stations  
+  
+def timed(label, fn):  
+    before = StubHandler.requests  
+    t0 = time.perf_counter()  
+    stations = fn()  
+    elapsed = time.perf_counter() - t0  
+    print(f"  {label:<24} {elapsed:6.2f}s  requests={StubHandler.requests - before:4d}  stations={len(stations)}")  
+    return elapsed, stations  
+  
+def main():  
+    StubHandler.prefectures, StubHandler.lines = build_dataset()  
+    listed = sum(len(v) for v in StubHandler.prefectures.values())  
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)  
+    server.daemon_threads = True  
+    threading.Thread(target=server.serve_forever, daemon=True).start()  
+    base = f"http://127.0.0.1:{server.server_address[1]}/api"  
+    print(f"🧪 stub: {base} ({len(StubHandler.lines)} lines, {listed} listed across prefectures, latency {LATENCY_MS}ms)")  
+  
+    with tempfile.TemporaryDirectory() as cache_dir:  
+        def new_fetch():  
+            fetch_stations.to_hiragana.cache_clear()  
+            crawler = http_crawler.JsonCrawler(base, cache_dir, rate=fetch_stations.RATE_PER_SEC,  
+                                               concurrency=fetch_stations.CONCURRENCY, max_age=3600)  
+            try:  
+                return fetch_stations.fetch_kanto_stations(crawler)  
+            finally:  
+                crawler.close()  
+  
+        legacy_time, legacy = timed("legacy (sequential)", lambda: legacy_fetch(base))  
+        cold_time, cold = timed("concurrent, cold cache", new_fetch)  
+        warm_time, warm = timed("rerun, warm cache", new_fetch)  
+  
+    print(f"  speedup: cold x{legacy_time / cold_time:.1f}, warm x{legacy_time / warm_time:.0f}")  
+    print(f"  same stations: {legacy == cold == warm}")  
+    server.shutdown()  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
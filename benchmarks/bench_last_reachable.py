@@ -0,0 +1,63 @@
+import os  
+import sys  
+import time  
+import random  
+import contextlib  
+import io  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_last_reachable.py  
+# (先に compile_timetable.py と build_last_reachable.py を実行しておく)  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  
+import core_engine  
+import last_reachable  
+  
+# 終電間際の問い合わせ1件分を、到達プロファイルを引く場合とその場で RAPTOR を回す場合とで比較する  
+  
+QUERIES = 300  
+  
+def bench(fn, queries):  
+    t0 = time.perf_counter()  
+    with contextlib.redirect_stdout(io.StringIO()):  
+        for start, minutes, s_coords, t_coords in queries:  
+            fn(start, minutes, s_coords, t_coords)  
+    return (time.perf_counter() - t0) / len(queries) * 1000  
+  
+def front_key(stations, with_station=True):  
+    """ with_station=False ならパレート集合の3基準だけを比べる """  
+    if not with_station: return [(s["res"]["arr"], s["res"]["transfers"], s["res"]["cost"]) for s in stations]  
+    return [(s["station"], s["res"]["dep"], s["res"]["arr"], s["res"]["transfers"], s["res"]["cost"]) for s in stations]  
+  
+if __name__ == "__main__":  
+    table = last_reachable.get_table()  
+    if table is None:  
+        print(f"❌ {last_reachable.LAST_REACHABLE_BIN} がありません。build_last_reachable.py を実行してください。")  
+        sys.exit(1)  
+  
+    coords = core_engine.station_coords  
+    origins = [o for o in table.origin_rows if o in coords]  
+    names = list(coords.keys())  
+    rng = random.Random(0)  
+    queries = []  
+    for _ in range(QUERIES):  
+        start = rng.choice(origins)  
+        minutes = rng.randint(table.window_start, table.window_end)  
+        queries.append((start, minutes, coords[start], coords[rng.choice(names)]))  
+  
+    # 料金・到着・乗換回数がすべて同じ駅が並んだときに、どちらを残すかだけは違ってよい  
+    mismatch = tie = 0  
+    with contextlib.redirect_stdout(io.StringIO()):  
+        for start, minutes, s_coords, t_coords in queries:  
+            table_front = core_engine.search_precomputed(start, minutes, s_coords, t_coords)  
+            live_front = core_engine.search_pareto(start, minutes, s_coords, t_coords)  
+            if front_key(table_front) == front_key(live_front): continue  
+            if front_key(table_front, False) == front_key(live_front, False): tie += 1  
+            else: mismatch += 1  
+  
+    live_ms = bench(core_engine.search_pareto, queries)  
+    table_ms = bench(core_engine.search_precomputed, queries)  
+    print(f"origins        : {len(table.origin_rows)} ({table.window_start // 60}:{table.window_start % 60:02d}-{table.window_end // 60}:{table.window_end % 60:02d})")  
+    print(f"queries        : {len(queries)}")  
+    print(f"live RAPTOR    : {live_ms:.3f} ms / request")  
+    print(f"precomputed    : {table_ms:.3f} ms / request  (x{live_ms / table_ms:.1f})")  
+    print(f"tie-break only : {tie}")  
+    print(f"result mismatch: {mismatch}")  
\ No newline at end of file
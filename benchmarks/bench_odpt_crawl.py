@@ -0,0 +1,94 @@
+import os  
+import sys  
+import glob  
+import json  
+import time  
+import shutil  
+import hashlib  
+import tempfile  
+import subprocess  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_odpt_crawl.py  
+# ローカルの ODPT 代替サーバー (odpt_stub_server.py) に対して fetch_odpt.py を別プロセスで走らせ、  
+#   1. 逐次 (同時接続1) と並列の所要時間  
+#   2. 途中で止まった想定 (キャッシュを半分消す) からの再実行で、足りない分だけ取り直すか  
+#   3. キャッシュが古くなった想定 (max_age=0) で、条件付きGET (304) だけで済むか  
+# を確かめる。どの実行でも時刻表 (シャードを順に連結したもの) が同じになることも確認する。  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  
+import odpt_stub_server  
+  
+OPERATORS = [  
+    "odpt.Operator:TokyoMetro", "odpt.Operator:Toei", "odpt.Operator:JR-East",  
+    "odpt.Operator:Tokyu", "odpt.Operator:Odakyu", "odpt.Operator:Keio",  
+    "odpt.Operator:Seibu", "odpt.Operator:Tobu", "odpt.Operator:Sotetsu",  
+    "odpt.Operator:Keikyu", "odpt.Operator:Yurikamome", "odpt.Operator:TWR",  
+    "odpt.Operator:YokohamaMunicipal", "odpt.Operator:MIR"  
+]  
+  
+def crawl(server, base, workdir, **env_overrides):  
+    env = dict(os.environ, ODPT_API_BASE=base, ODPT_RATE="0", PYTHONPATH=ROOT)  
+    env.update({k: str(v) for k, v in env_overrides.items()})  
+    before = dict(server.RequestHandlerClass.counts)  
+    t0 = time.perf_counter()  
+    out = subprocess.run([sys.executable, os.path.join(ROOT, "fetch_odpt.py")], cwd=workdir, env=env,  
+                         capture_output=True, text=True)  
+    elapsed = time.perf_counter() - t0  
+    if out.returncode != 0:  
+        print(out.stdout[-2000:], out.stderr[-2000:])  
+        raise SystemExit("❌ fetch_odpt.py failed")  
+    after = server.RequestHandlerClass.counts  
+    h = hashlib.sha1()  
+    with open(os.path.join(workdir, "data", "stop_times.manifest.json"), "r", encoding="utf-8") as f:  
+        manifest = json.load(f)  
+    for shard in manifest["shards"]:  
+        with open(os.path.join(workdir, "data", manifest["shard_dir"], shard["file"]), "rb") as f:  
+            h.update(f.read())  
+    digest = h.hexdigest()[:12]  
+    return elapsed, {k: after[k] - before[k] for k in after}, digest  
+  
+def report(label, result):  
+    elapsed, counts, digest = result  
+    print(f"  {label:<28} {elapsed:6.2f}s  requests={counts['requests']:4d} ok={counts['ok']:4d} "  
+          f"304={counts['not_modified']:4d} 503={counts['failed']:3d}  timetable={digest}")  
+  
+def main():  
+    server, base = odpt_stub_server.start_server(OPERATORS, fail_rate=0.05, latency_ms=100)  
+    print(f"🧪 stub: {base}")  
+    results = {}  
+    with tempfile.TemporaryDirectory() as tmp:  
+        seq_dir, par_dir = os.path.join(tmp, "seq"), os.path.join(tmp, "par")  
+        os.makedirs(seq_dir)  
+        os.makedirs(par_dir)  
+  
+        results["sequential"] = crawl(server, base, seq_dir, ODPT_CONCURRENCY=1)  
+        report("cold, concurrency=1", results["sequential"])  
+        results["parallel"] = crawl(server, base, par_dir, ODPT_CONCURRENCY=8)  
+        report("cold, concurrency=8", results["parallel"])  
+  
+        results["warm"] = crawl(server, base, par_dir, ODPT_CONCURRENCY=8)  
+        report("warm (fresh cache)", results["warm"])  
+  
+        # 中断を真似て、保存済みの応答を半分消す  
+        cached = sorted(glob.glob(os.path.join(par_dir, "data", "odpt_cache", "*", "*.json")))  
+        removed = cached[::2]  
+        for path in removed: os.remove(path)  
+        results["resume"] = crawl(server, base, par_dir, ODPT_CONCURRENCY=8)  
+        report(f"resume ({len(removed)}/{len(cached)} missing)", results["resume"])  
+  
+        results["revalidate"] = crawl(server, base, par_dir, ODPT_CONCURRENCY=8, ODPT_CACHE_MAX_AGE_SEC=0)  
+        report("stale cache (max_age=0)", results["revalidate"])  
+        shutil.rmtree(seq_dir)  
+    server.shutdown()  
+  
+    digests = {r[2] for r in results.values()}  
+    resumed_ok = results["resume"][1]["ok"]  
+    print(f"📊 speedup x{results['sequential'][0] / results['parallel'][0]:.1f}, "  
+          f"warm requests={results['warm'][1]['requests']}, resume refetched ok={resumed_ok} (missing {len(removed)}), "  
+          f"revalidate ok={results['revalidate'][1]['ok']}")  
+    print("✅ timetable identical across runs" if len(digests) == 1 else f"❌ timetable differs: {digests}")  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os  
+import sys  
+import time  
+import asyncio  
+import tempfile  
+import threading  
+import multiprocessing  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_outbound_scheduler.py  
+# outbound_scheduler (Yahoo!への送出間隔を全ワーカーで守る行列) の確認:  
+#   1. 複数プロセス x 複数スレッドで一斉に取りに行っても、全体の送出頻度が 1/interval を超えないか  
+#      (従来の「問い合わせごとに sleep」だと何倍になるか も並べて出す)  
+#   2. 優先度: 先に始まった検索の続きの問い合わせが、後から来た検索より先に出て早く終わるか  
+#      (優先度なし = 来た順 と比べる)  
+# 守れていなければ終了コード 1  
+#   BENCH_PROCS=4 / BENCH_THREADS=4 / BENCH_GRANTS=10 / BENCH_INTERVAL_SEC=0.02  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+import outbound_scheduler  
+  
+PROCS = int(os.environ.get("BENCH_PROCS", "4"))  
+THREADS = int(os.environ.get("BENCH_THREADS", "4"))  
+GRANTS = int(os.environ.get("BENCH_GRANTS", "10"))   # スレッドごとの送出数  
+INTERVAL_SEC = float(os.environ.get("BENCH_INTERVAL_SEC", "0.02"))  
+  
+def _worker(state_path, out):  
+    """ 1つのワーカープロセス: THREADS 本のスレッドが GRANTS 回ずつ取る """  
+    scheduler = outbound_scheduler.OutboundScheduler("bench", outbound_scheduler.SharedBucket(INTERVAL_SEC, 1, state_path))  
+    stamps = []  
+    lock = threading.Lock()  
+  
+    def run():  
+        for _ in range(GRANTS):  
+            scheduler.acquire()  
+            with lock:  
+                stamps.append(time.time())  
+  
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]  
+    for t in threads: t.start()  
+    for t in threads: t.join()  
+    out.put(stamps)  
+  
+def _legacy_worker(out):  
+    """ 従来の方式: 問い合わせごとに INTERVAL_SEC だけ sleep してから送る """  
+    stamps = []  
+    lock = threading.Lock()  
+  
+    def run():  
+        for _ in range(GRANTS):  
+            time.sleep(INTERVAL_SEC)  
+            with lock:  
+                stamps.append(time.time())  
+  
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]  
+    for t in threads: t.start()  
+    for t in threads: t.join()  
+    out.put(stamps)  
+  
+def run_procs(target, *args):  
+    out = multiprocessing.Queue()  
+    procs = [multiprocessing.Process(target=target, args=args + (out,)) for _ in range(PROCS)]  
+    for p in procs: p.start()  
+    stamps = sorted(s for _ in procs for s in out.get())  
+    for p in procs: p.join()  
+    return stamps  
+  
+def report_rate(label, stamps):  
+    rate = (len(stamps) - 1) / (stamps[-1] - stamps[0])  
+    # 1秒あたりではなく、任意の連続 n 件の間隔で見る (瞬間的な集中も拾う)  
+    window = 10  
+    worst = min(stamps[i + window] - stamps[i] for i in range(len(stamps) - window)) / window  
+    print(f"  {label:<10} {len(stamps)} sends  {rate:7.1f}/s  (limit {1 / INTERVAL_SEC:.1f}/s)  "  
+          f"tightest {window}-send spacing {worst * 1000:5.1f} ms (interval {INTERVAL_SEC * 1000:.0f} ms)")  
+    return rate, worst  
+  
+def check_rate():  
+    print(f"🧪 rate: {PROCS} procs x {THREADS} threads x {GRANTS} sends, interval {INTERVAL_SEC * 1000:.0f} ms")  
+    with tempfile.TemporaryDirectory() as workdir:  
+        shared = run_procs(_worker, os.path.join(workdir, "rate.state"))  
+    legacy = run_procs(_legacy_worker)  
+    rate, worst = report_rate("scheduler", shared)  
+    report_rate("per-call", legacy)  
+    # 記録は送出の直後なので多少揺れる。間隔の 90% を下回ったら守れていない  
+    return rate <= 1 / INTERVAL_SEC * 1.05 and worst >= INTERVAL_SEC * 0.9  
+  
+async def _search(scheduler, probes, http_sec, prioritized):  
+    """ 逐次の二分探索と同じく、1件送って結果を待ってから次を送る検索 """  
+    t0 = time.perf_counter()  
+    if prioritized:  
+        with outbound_scheduler.search_priority():  
+            for _ in range(probes):  
+                await scheduler.acquire_async()  
+                await asyncio.sleep(http_sec)  
+    else:  
+        for _ in range(probes):  
+            await scheduler.acquire_async()  
+            await asyncio.sleep(http_sec)  
+    return time.perf_counter() - t0  
+  
+async def _priority_case(prioritized, interval=0.05, probes=5, newcomers=6):  
+    scheduler = outbound_scheduler.OutboundScheduler("bench", outbound_scheduler.SharedBucket(interval, 1, None))  
+    first = asyncio.ensure_future(_search(scheduler, probes, interval * 2, prioritized))  
+    await asyncio.sleep(interval * 1.5)  # 最初の検索が1件目の結果を待っている間に、新しい検索が一斉に来る  
+    others = [asyncio.ensure_future(_search(scheduler, probes, interval * 2, prioritized)) for _ in range(newcomers)]  
+    first_sec = await first  
+    others_sec = await asyncio.gather(*others)  
+    return first_sec, sum(others_sec) / len(others_sec)  
+  
+def check_priority():  
+    print("🧪 priority: 1 search in progress + 6 new searches, 5 sequential probes each")  
+    fifo = asyncio.run(_priority_case(False))  
+    prio = asyncio.run(_priority_case(True))  
+    print(f"  arrival order  : first search {fifo[0] * 1000:6.0f} ms, newcomers avg {fifo[1] * 1000:6.0f} ms")  
+    print(f"  search priority: first search {prio[0] * 1000:6.0f} ms, newcomers avg {prio[1] * 1000:6.0f} ms")  
+    return prio[0] < fifo[0]  
+  
+def main():  
+    ok = check_rate()  
+    ok = check_priority() and ok  
+    print("✅ OK" if ok else "❌ NG")  
+    if not ok: sys.exit(1)  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
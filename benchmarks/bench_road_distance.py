@@ -0,0 +1,149 @@
+import os  
+import io  
+import sys  
+import time  
+import math  
+import random  
+import tempfile  
+import contextlib  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_road_distance.py  
+# build_road_distances.py -> road_distance.py の確認 (本物の OSM の抽出は大きいので、合成した道路網で試す):  
+#   東京の東側に格子状の道路を作り、経度 RIVER_LON に「川」を置いて橋 (BRIDGE_LATS) でしか渡れないようにする。  
+#   1. 表の道のり / 従来の見積もり (直線 x 1.4) を、その場の最短経路 (正解) と比べる (川を渡る組・渡らない組)  
+#   2. 1回あたりの料金計算の時間: calculate_taxi_fare(km) と 表を引く station_taxi_fare  
+# 次のどれかで終了コード 1 (いずれも実測からの目安。合成データと乱数は固定なので誤差の値は毎回同じ):  
+#   表の道のりの誤差の中央値が MAX_ERROR_KM を超える / 従来の見積もりの誤差の MAX_ERROR_RATIO 倍を超える  
+#     (実測: 川を渡る 0.49km (x1.4 は 0.73km)、渡らない 0.38km (0.51km))  
+#   表を引く料金計算が calculate_taxi_fare の MAX_SLOWDOWN 倍より遅い (実測 2.3〜2.6倍。揺れを除くため5回の最速で比べる)  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+os.chdir(ROOT)  
+  
+SOUTH, NORTH, WEST, EAST = 35.60, 35.76, 139.68, 139.92  
+STEP_DEG = 0.003               # 道路の間隔 (約300m)  
+RIVER_LON = 139.80  
+BRIDGE_LATS = (35.642, 35.72)  # この緯度の道だけ川を渡れる  
+PAIRS = 400  
+MAX_ERROR_KM = 0.6  
+MAX_ERROR_RATIO = 0.85  
+MAX_SLOWDOWN = 3.0  
+REPEATS = 5  
+  
+def write_synthetic_osm(path):  
+    """ 格子状の道路網 (.osm)。南北の道は川で切れず、東西の道は橋の緯度のものだけ川を渡る """  
+    lats = [SOUTH + i * STEP_DEG for i in range(int((NORTH - SOUTH) / STEP_DEG) + 1)]  
+    lons = [WEST + j * STEP_DEG for j in range(int((EAST - WEST) / STEP_DEG) + 1)]  
+    bridges = {min(range(len(lats)), key=lambda i: abs(lats[i] - b)) for b in BRIDGE_LATS}  
+    node_id = lambda i, j: 1 + i * len(lons) + j  
+    with open(path, "w", encoding="utf-8") as f:  
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')  
+        for i, lat in enumerate(lats):  
+            for j, lon in enumerate(lons):  
+                f.write(f'<node id="{node_id(i, j)}" lat="{lat:.6f}" lon="{lon:.6f}"/>\n')  
+        way = 1  
+  
+        def write_way(refs, highway, oneway=False):  
+            nonlocal way  
+            f.write(f'<way id="{way}">' + "".join(f'<nd ref="{r}"/>' for r in refs))  
+            f.write(f'<tag k="highway" v="{highway}"/>' + ('<tag k="oneway" v="yes"/>' if oneway else "") + "</way>\n")  
+            way += 1  
+  
+        for j in range(len(lons)):  
+            write_way([node_id(i, j) for i in range(len(lats))], "secondary" if j % 5 == 0 else "residential")  
+        split = next(j for j, lon in enumerate(lons) if lon > RIVER_LON)  
+        for i in range(len(lats)):  
+            highway = "primary" if i in bridges else "residential"  
+            if i in bridges:  
+                write_way([node_id(i, j) for j in range(len(lons))], highway)  
+            else:  
+                write_way([node_id(i, j) for j in range(split)], highway, oneway=(i == 1))  
+                write_way([node_id(i, j) for j in range(split, len(lons))], highway)  
+        # 走れない道 (歩道) は使わない  
+        write_way([node_id(0, 0), node_id(len(lats) - 1, len(lons) - 1)], "footway")  
+        f.write("</osm>\n")  
+  
+def exact_road_km(builder, graph, st_lat, st_lon, lat, lon):  
+    """ 正解: 駅に一番近いノードから目的地に一番近いノードまでの最短経路 + 両端の直線 """  
+    node_lat, node_lon, indptr, indices, weights = graph  
+    near = lambda a, b: int(((node_lat - a) ** 2 + ((node_lon - b) * math.cos(math.radians(a))) ** 2).argmin())  
+    s, t = near(st_lat, st_lon), near(lat, lon)  
+    dist = builder.shortest_paths(s, math.inf)  
+    d = dist.get(t, math.inf) if isinstance(dist, dict) else dist[t]  
+    local = lambda a, b, n: math.hypot((a - node_lat[n]) * 111.19, (b - node_lon[n]) * 111.19 * math.cos(math.radians(a)))  
+    return d + local(st_lat, st_lon, s) + local(lat, lon, t)  
+  
+def main():  
+    with tempfile.TemporaryDirectory() as workdir:  
+        osm_path = os.path.join(workdir, "roads.osm")  
+        out_path = os.path.join(workdir, "road_distances.bin")  
+        write_synthetic_osm(osm_path)  
+        os.environ["ROAD_DISTANCE_BIN"] = out_path  
+        with contextlib.redirect_stdout(io.StringIO()):  
+            import core_engine  
+        import road_distance  
+        import build_road_distances as builder  
+  
+        t0 = time.perf_counter()  
+        builder.build_road_distances(osm_path, out_path, radius_km=15)  
+        build_sec = time.perf_counter() - t0  
+        table = road_distance.get_table()  
+  
+        # 正解を出すためのグラフ (build と同じもの) をこのプロセスにも用意する  
+        graph = builder.build_graph(builder.read_osm(osm_path))  
+        builder._init_worker(graph[2], graph[3], graph[4], None, None, math.inf)  
+  
+        stations = [(n, c) for n, c in core_engine.station_coords.items()  
+                    if table.ids.get(n) is not None and SOUTH < c["lat"] < NORTH and WEST < c["lon"] < EAST and not n.endswith("駅")]  
+        rng = random.Random(3)  
+        rows = {"cross": [], "same": []}  
+        for _ in range(PAIRS):  
+            name, c = rng.choice(stations)  
+            lat, lon = rng.uniform(SOUTH + 0.01, NORTH - 0.01), rng.uniform(WEST + 0.01, EAST - 0.01)  
+            km = core_engine.haversine_distance(c, {"lat": lat, "lon": lon})  
+            road = table.road_km(name, lat, lon)  
+            if road is None or km < 1: continue  
+            exact = exact_road_km(builder, graph, c["lat"], c["lon"], lat, lon)  
+            side = "cross" if (c["lon"] < RIVER_LON) != (lon < RIVER_LON) else "same"  
+            fare_exact = core_engine.calculate_taxi_fare(km, exact)  
+            rows[side].append((abs(road - exact), abs(km * 1.4 - exact),  
+                               abs(core_engine.calculate_taxi_fare(km, road) - fare_exact),  
+                               abs(core_engine.calculate_taxi_fare(km) - fare_exact)))  
+  
+        print(f"🧪 {len(stations)} stations in the synthetic network, build {build_sec:.1f}s")  
+        median = lambda xs: sorted(xs)[len(xs) // 2] if xs else float("nan")  
+        ok = True  
+        for side, label in (("cross", "across the river"), ("same", "same side")):  
+            r = rows[side]  
+            if not r: continue  
+            print(f"  {label:<17} {len(r):4d} pairs  road km error: table {median([x[0] for x in r]):5.2f} / x1.4 {median([x[1] for x in r]):5.2f}"  
+                  f"   fare error (yen): table {median([x[2] for x in r]):6.0f} / x1.4 {median([x[3] for x in r]):6.0f}")  
+            table_err, formula_err = median([x[0] for x in r]), median([x[1] for x in r])  
+            ok &= table_err <= MAX_ERROR_KM and table_err <= formula_err * MAX_ERROR_RATIO  
+  
+        # 1回あたりの時間  
+        samples = [(name, c, rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)) for name, c in (rng.choice(stations) for _ in range(2000))]  
+        kms = [core_engine.haversine_distance(c, {"lat": lat, "lon": lon}) for name, c, lat, lon in samples]  
+        targets = [{"lat": lat, "lon": lon} for _, _, lat, lon in samples]  
+        names = [name for name, _, _, _ in samples]  
+  
+        def per_call_us(run):  
+            best = math.inf  
+            for _ in range(REPEATS):  
+                t0 = time.perf_counter()  
+                for _ in range(20): run()  
+                best = min(best, (time.perf_counter() - t0) / (20 * len(kms)) * 1e6)  
+            return best  
+  
+        formula_us = per_call_us(lambda: [core_engine.calculate_taxi_fare(km) for km in kms])  
+        table_us = per_call_us(lambda: [core_engine.station_taxi_fare(n, km, t) for n, km, t in zip(names, kms, targets)])  
+        print(f"  calculate_taxi_fare (x1.4)  {formula_us:6.2f} us")  
+        print(f"  station_taxi_fare (table)   {table_us:6.2f} us  (x{table_us / formula_us:.1f}, limit x{MAX_SLOWDOWN:.0f})")  
+        ok &= table_us <= formula_us * MAX_SLOWDOWN  
+  
+    print("✅ OK" if ok else "❌ NG")  
+    if not ok: sys.exit(1)  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
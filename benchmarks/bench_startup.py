@@ -0,0 +1,54 @@
+import os  
+import sys  
+import json  
+import statistics  
+import subprocess  
+import tempfile  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_startup.py  
+# main.app を import して使える状態になるまでの時間を、新しいプロセスで繰り返し測る (コールドスタートの目安)  
+  
+REPEAT = 7  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+HEAVY_MODULES = ["pandas", "requests", "bs4", "httpx"]  
+  
+PROBE = """  
+import os, sys, time, json, importlib  
+t0 = time.perf_counter()  
+if os.environ.get("BENCH_EAGER_IMPORTS"):  
+    for m in %r: importlib.import_module(m)  
+import main  
+main.app  
+ready = time.perf_counter() - t0  
+print(json.dumps({"ready": ready, "heavy": [m for m in %r if m in sys.modules]}))  
+""" % (HEAVY_MODULES, HEAVY_MODULES)  
+  
+def measure(env_overrides):  
+    env = dict(os.environ, **env_overrides)  
+    times = []  
+    heavy = []  
+    for _ in range(REPEAT):  
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)  
+        result = json.loads(out.stdout.strip().splitlines()[-1])  
+        times.append(result["ready"] * 1000)  
+        heavy = result["heavy"]  
+    return statistics.median(times), min(times), heavy  
+  
+if __name__ == "__main__":  
+    # 駅スナップショットは一時ファイルに作って使う (data/ は汚さない)  
+    sys.path.insert(0, ROOT)  
+    os.chdir(ROOT)  
+    import station_store  
+    snapshot = os.path.join(tempfile.mkdtemp(), "stations.bin")  
+    station_store.write_station_snapshot(snapshot)  
+  
+    cases = [  
+        ("stations.bin", {"STATIONS_BIN": snapshot}),  
+        ("stops.txt (csv)", {"STATIONS_BIN": ""}),  
+        # 以前と同じく重いモジュールを起動時に全部読んだ場合の目安  
+        ("eager imports", {"STATIONS_BIN": "", "BENCH_EAGER_IMPORTS": "1"}),  
+    ]  
+    print(f"import main -> app ready (median of {REPEAT}, fresh process each)")  
+    for label, env in cases:  
+        median, best, heavy = measure(env)  
+        print(f"{label:16}: {median:7.1f} ms (best {best:.1f} ms)  heavy modules loaded: {heavy or 'none'}")  
\ No newline at end of file
@@ -0,0 +1,80 @@
+import os  
+import sys  
+import json  
+import time  
+import random  
+import statistics  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_suggest.py  
+# 駅名の入力候補について、index.html が打鍵ごとにやっていた全件の線形フィルタ (Python に移したもの) と  
+# station_suggest の前方一致索引を、実際の駅名・かなの先頭1〜3文字の問い合わせで比べる。  
+#   - 候補になる駅の集合が同じか (件数の上限なしで比較)  
+#   - 1問い合わせあたりの時間 (p50 / p99)  
+#   - /suggest エンドポイント込みの時間 (TestClient, HTTP の往復は含まない)  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+os.chdir(ROOT)  
+import station_suggest  
+  
+QUERIES = 2000  
+LIMIT = 10  
+  
+def linear_filter(all_stations, val, limit=LIMIT):  
+    """ 旧 index.html の filterStations と同じ処理 """  
+    hits = [st for st in all_stations if st["n"].startswith(val) or (st.get("k") and st["k"].startswith(val))]  
+    grouped = {}  
+    for st in hits:  
+        lines = grouped.setdefault(st["n"], [])  
+        if st["l"] not in lines: lines.append(st["l"])  
+    return list(grouped.items())[:limit] if limit else list(grouped.items())  
+  
+def percentiles(samples):  
+    samples = sorted(samples)  
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6  
+  
+def timed(fn, queries):  
+    samples = []  
+    for q in queries:  
+        t0 = time.perf_counter()  
+        fn(q)  
+        samples.append(time.perf_counter() - t0)  
+    return percentiles(samples)  
+  
+def main():  
+    with open(station_suggest.STATIONS_JSON, "r", encoding="utf-8") as f:  
+        all_stations = json.load(f)  
+    t0 = time.perf_counter()  
+    index = station_suggest.SuggestIndex(all_stations)  
+    print(f"🧪 {len(all_stations)} entries -> {len(index)} stations, index built in {(time.perf_counter() - t0) * 1000:.1f} ms")  
+  
+    rng = random.Random(1)  
+    queries = []  
+    for _ in range(QUERIES):  
+        st = rng.choice(all_stations)  
+        term = st["k"] if st.get("k") and rng.random() < 0.5 else st["n"]  
+        queries.append(term[:rng.randint(1, 3)])  
+  
+    # 索引はカタカナの入力をひらがなでも引くので、その分だけ候補が増えることはある (欠けるのは不可)  
+    missing = extra = 0  
+    for q in set(queries):  
+        expected = {name for name, _ in linear_filter(all_stations, q, limit=None)}  
+        got = {s["n"] for s in index.suggest(q, limit=len(index))}  
+        if expected - got: missing += 1  
+        elif got != expected: extra += 1  
+    print(f"  {len(set(queries))} distinct queries: missing candidates in {missing}, extra (katakana as kana) in {extra}")  
+  
+    p50, p99 = timed(lambda q: linear_filter(all_stations, q), queries)  
+    print(f"  linear filter   p50 {p50:8.1f} us  p99 {p99:8.1f} us")  
+    i50, i99 = timed(lambda q: index.suggest(q, LIMIT), queries)  
+    print(f"  prefix index    p50 {i50:8.1f} us  p99 {i99:8.1f} us  (x{p50 / i50:.0f} at p50)")  
+  
+    from fastapi.testclient import TestClient  
+    import main as app_main  
+    client = TestClient(app_main.app)  
+    client.get("/suggest", params={"q": "し"})  # 索引を作らせる  
+    e50, e99 = timed(lambda q: client.get("/suggest", params={"q": q, "limit": LIMIT}), queries[:500])  
+    print(f"  /suggest (app)  p50 {e50:8.1f} us  p99 {e99:8.1f} us")  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
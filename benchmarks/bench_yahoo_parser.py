@@ -0,0 +1,105 @@
+import os  
+import io  
+import sys  
+import time  
+import random  
+import contextlib  
+from datetime import datetime  
+  
+# リポジトリ直下から実行する: python benchmarks/bench_yahoo_parser.py  
+# yahoo_parser の各方式 (fast / soup / lxml) について  
+#   1. 契約の確認: 同じページから parse_yahoo_route が同じ結果 (出発・到着・乗換回数、[翌] による弾き、ルートなし) を返すか  
+#   2. 1ページあたりの解析時間  
+# を比べる。ページは fixtures/yahoo の保存済みページ、yahoo_stub_server で作った多数のページ、  
+# それらを書き換えた変種 (大文字のタグ・複数クラス・属性の引用符・文字参照・script 内の偽の要約 など)。  
+# 違いが1件でもあれば終了コード 1  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  
+os.chdir(ROOT)  
+with contextlib.redirect_stdout(io.StringIO()):  
+    import core_engine  
+import yahoo_parser  
+import yahoo_stub_server  
+  
+REFERENCE = "soup"  
+GENERATED_PAGES = 300  
+  
+def variants(html):  
+    """ 同じ意味のまま書き方を変えたページ (と、要約らしき文字列が本物の前にあるページ) """  
+    yield "upper", html.replace('<div class="routeSummary">', '<DIV CLASS="routeSummary">').replace("</div>\n</div>\n<div class=\"routeDetail\">", "</DIV>\n</div>\n<div class=\"routeDetail\">")  
+    yield "multi_class", html.replace('class="routeSummary"', 'class="routeBox routeSummary is-print"')  
+    yield "single_quote", html.replace('<li class="time">', "<li class='time'>").replace('<li class="transfer">', "<li class=transfer>")  
+    yield "charref", html.replace("発→", "発&rarr;").replace(":", "&#58;", 3)  
+    yield "decoy_script", html.replace("</head>", "<script>var tpl = '<div class=\"routeSummary\"><li class=\"time\">00:00発→00:01着</li></div>';</script>\n</head>", 1)  
+    yield "decoy_comment", html.replace('<div id="srline">', '<div id="srline">\n<!-- <div class="routeSummary"><ul><li class="time">01:00発→01:30着</li></ul></div> -->', 1)  
+    yield "decoy_class", html.replace('<div id="srline">', '<div id="srline">\n<div class="routeSummaryHeader"><ul><li class="time">01:00発→01:30着</li></ul></div>', 1)  
+    yield "transfer_first", html.replace(  
+        '<li class="time">', '<li class="transfer">乗換：<span class="mark">9回</span></li>\n<li class="time">', 1).replace(  
+        '<li class="transfer">乗換：', '<li class="other">乗換：', 2).replace('<li class="other">乗換：', '<li class="transfer">乗換：', 1)  
+  
+def build_corpus():  
+    corpus = []  
+    for case in yahoo_stub_server.load_cases():  
+        h, m = map(int, case["query"].split(":"))  
+        corpus.append((f"fixture:{case['file']}", case["html"], datetime(2025, 12, 12, h, m)))  
+  
+    coords = yahoo_stub_server.load_coords()  
+    names = list(coords[0].keys())  
+    rng = random.Random(5)  
+    for i in range(GENERATED_PAGES):  
+        a, b = rng.sample(names, 2)  
+        hh, mm = rng.choice([21, 22, 23, 0, 1, 10]), rng.randrange(60)  
+        route = yahoo_stub_server.render_route(coords, a, b, hh, mm)  
+        html = yahoo_stub_server.render_page(a, b, f"2025年12月12日 {hh:02d}:{mm:02d}", route)  
+        corpus.append((f"stub:{i}", html, datetime(2025, 12, 12, hh, mm)))  
+  
+    for name, html, dt in list(corpus[:40]):  
+        for kind, variant in variants(html):  
+            corpus.append((f"{name}:{kind}", variant, dt))  
+    return corpus  
+  
+def available_backends():  
+    backends = []  
+    for name in yahoo_parser.BACKENDS:  
+        try:  
+            yahoo_parser.extract_summary("<div class='routeSummary'></div>", name)  
+            backends.append(name)  
+        except (ImportError, ValueError) as e:  # bs4 が lxml を見つけられないときは FeatureNotFound (ValueError)  
+            print(f"  ⚠️ {name}: {e} (skipped)")  
+    return backends  
+  
+def main():  
+    corpus = build_corpus()  
+    backends = available_backends()  
+    print(f"🧪 {len(corpus)} pages ({sum(len(h) for _, h, _ in corpus) // len(corpus) // 1024} KB avg), backends {backends}")  
+  
+    expected = [core_engine.parse_yahoo_route(html, dt, REFERENCE) for _, html, dt in corpus]  
+    found = sum(1 for e in expected if e)  
+    print(f"  reference ({REFERENCE}): {found} routes / {len(corpus) - found} rejected or no route")  
+  
+    failed = False  
+    timings = {}  
+    for backend in backends:  
+        mismatches = []  
+        for (name, html, dt), exp in zip(corpus, expected):  
+            got = core_engine.parse_yahoo_route(html, dt, backend)  
+            if got != exp: mismatches.append((name, exp, got))  
+        for name, exp, got in mismatches[:10]:  
+            print(f"  ❌ {backend} {name}: expected {exp}, got {got}")  
+        failed |= bool(mismatches)  
+  
+        t0 = time.perf_counter()  
+        for _, html, dt in corpus:  
+            core_engine.parse_yahoo_route(html, dt, backend)  
+        timings[backend] = (time.perf_counter() - t0) / len(corpus) * 1e6  
+        print(f"  {backend:<5} {timings[backend]:9.1f} us/page  contract: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")  
+  
+    if REFERENCE in timings:  
+        for backend, us in timings.items():  
+            if backend != REFERENCE: print(f"  {backend} is x{timings[REFERENCE] / us:.1f} faster than {REFERENCE}")  
+    if failed: sys.exit(1)  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
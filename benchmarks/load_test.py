@@ -0,0 +1,208 @@
+import os  
+import sys  
+import time  
+import json  
+import random  
+import socket  
+import asyncio  
+import tempfile  
+import statistics  
+import subprocess  
+  
+# リポジトリ直下から実行する: python benchmarks/load_test.py  
+# main.app を uvicorn (ワーカー数を変えて) で起動し、終電前後の /search を決まった到着率で投げ続けて、  
+#   スループット / p50・p95・p99 の応答時間 / エラー率 / ワーカーごとのメモリ (RSS)  
+# を到着率ごとに出す。Yahoo!は yahoo_stub_server.py (遅延を指定できるローカルサーバー) に差し替える。  
+# (ODPT はアプリの実行中には使わない (fetch_odpt.py の事前取得だけ) ので、ここでは差し替える先がない)  
+# 問い合わせは stops.txt の実在の駅の組から作り、一部は target_lat / target_lon (自宅の座標) で投げる。  
+# 人気の組に偏らせる (Zipf) ので、同じ検索のまとめ・経路キャッシュも実際に近い形で効く。  
+#   LOAD_WORKERS=1,2,4          : 試すワーカー数  
+#   LOAD_RATES=2,5,10,20        : 試す到着率 (リクエスト/秒)。低い方から順に上げる  
+#   LOAD_DURATION_SEC=15        : 1つの到着率を続ける時間  
+#   LOAD_STUB_LATENCY_MS=150    : Yahoo!代わりの応答の遅延  
+#   LOAD_YAHOO_DELAY_SEC=0.5    : アプリ側のマナー待機 (YAHOO_DELAY_SEC。全ワーカー合計の送出間隔)  
+#   LOAD_BACKEND=auto           : SEARCH_BACKEND (時刻表が無ければ auto は Yahoo!を使う)  
+#   LOAD_TIMEOUT_SEC=30         : これを超えた応答はエラー扱い  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+sys.path.insert(0, ROOT)  
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  
+import yahoo_stub_server  
+  
+WORKERS = [int(w) for w in os.environ.get("LOAD_WORKERS", "1,2,4").split(",")]  
+RATES = [float(r) for r in os.environ.get("LOAD_RATES", "2,5,10,20").split(",")]  
+DURATION_SEC = float(os.environ.get("LOAD_DURATION_SEC", "15"))  
+STUB_LATENCY_MS = float(os.environ.get("LOAD_STUB_LATENCY_MS", "150"))  
+YAHOO_DELAY_SEC = os.environ.get("LOAD_YAHOO_DELAY_SEC", "0.5")  
+BACKEND = os.environ.get("LOAD_BACKEND", "auto")  
+TIMEOUT_SEC = float(os.environ.get("LOAD_TIMEOUT_SEC", "30"))  
+  
+REQUEST_POOL = 200      # 問い合わせの種類  
+HOME_RATIO = 0.3        # target_lat / target_lon で投げる割合  
+ZIPF_S = 1.1            # 人気の偏り  
+MIN_DISTANCE_KM, MAX_DISTANCE_KM = 5, 50  
+  
+def build_requests(coords, seed=11):  
+    """ SearchRequest の本文 (dict) を REQUEST_POOL 種類と、その出やすさ (Zipf) """  
+    name_rows, lats, lons = coords  
+    names = list(name_rows.keys())  
+    rng = random.Random(seed)  
+    pool = []  
+    while len(pool) < REQUEST_POOL:  
+        a, b = rng.sample(names, 2)  
+        ra, rb = name_rows[a], name_rows[b]  
+        km = yahoo_stub_server.haversine(lats[ra], lons[ra], lats[rb], lons[rb])  
+        if not MIN_DISTANCE_KM <= km <= MAX_DISTANCE_KM: continue  
+        minutes = rng.randint(23 * 60, 25 * 60)  # 23:00〜25:00  
+        req = {"start_station": a, "target_station": b, "current_time": f"{minutes // 60}:{minutes % 60:02d}"}  
+        if rng.random() < HOME_RATIO:  
+            # 自宅 = 到着駅の近く (〜1km)  
+            req["target_lat"] = round(lats[rb] + rng.uniform(-0.01, 0.01), 6)  
+            req["target_lon"] = round(lons[rb] + rng.uniform(-0.01, 0.01), 6)  
+        pool.append(req)  
+    weights = [1 / (i + 1) ** ZIPF_S for i in range(len(pool))]  
+    return pool, weights  
+  
+def free_port():  
+    with socket.socket() as s:  
+        s.bind(("127.0.0.1", 0))  
+        return s.getsockname()[1]  
+  
+def rss_mb(pid):  
+    try:  
+        with open(f"/proc/{pid}/status", "r") as f:  
+            for line in f:  
+                if line.startswith("VmRSS:"): return int(line.split()[1]) / 1024  
+    except OSError:  
+        pass  
+    return None  
+  
+def child_pids(pid):  
+    """ uvicorn のマスターから起動されたワーカーのPID (Linux の /proc を見る) """  
+    children = []  
+    for entry in os.listdir("/proc"):  
+        if not entry.isdigit(): continue  
+        try:  
+            with open(f"/proc/{entry}/stat", "r") as f:  
+                fields = f.read().rsplit(")", 1)[1].split()  
+        except OSError:  
+            continue  
+        if int(fields[1]) == pid: children.append(int(entry))  
+    return children  
+  
+def worker_memory(server_pid, workers):  
+    """ ワーカーごとの RSS (MB)。ワーカー1つならマスター自身が処理する """  
+    pids = child_pids(server_pid) if workers > 1 else [server_pid]  
+    # multiprocessing の管理用プロセス (resource_tracker など) は小さいので、大きい順にワーカー数だけ取る  
+    sizes = sorted((m for m in (rss_mb(p) for p in pids) if m is not None), reverse=True)  
+    return sizes[:workers]  
+  
+def start_app(workers, yahoo_url, workdir):  
+    port = free_port()  
+    env = dict(os.environ, YAHOO_PRINT_URL=yahoo_url, YAHOO_DELAY_SEC=YAHOO_DELAY_SEC, SEARCH_BACKEND=BACKEND,  
+               ROUTE_CACHE_DB=os.path.join(workdir, "route_cache.sqlite3"),  
+               YAHOO_RATE_STATE=os.path.join(workdir, "yahoo_rate.state"), PYTHONPATH=ROOT)  
+    proc = subprocess.Popen(  
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),  
+         "--workers", str(workers), "--log-level", "warning"],  
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,  
+    )  
+    return proc, f"http://127.0.0.1:{port}"  
+  
+async def wait_ready(base, proc, timeout=60):  
+    import httpx  
+    deadline = time.monotonic() + timeout  
+    async with httpx.AsyncClient() as client:  
+        while time.monotonic() < deadline:  
+            if proc.poll() is not None:  
+                raise SystemExit(f"❌ uvicorn exited: {proc.stderr.read()[-2000:]}")  
+            try:  
+                if (await client.get(f"{base}/stats")).status_code == 200: return  
+            except httpx.HTTPError:  
+                pass  
+            await asyncio.sleep(0.2)  
+    raise SystemExit("❌ uvicorn did not become ready")  
+  
+async def run_rate(base, rate, pool, weights, rng):  
+    """ 到着率 rate (ポアソン到着) で DURATION_SEC 投げ続ける (応答を待たずに次を投げる = 開ループ) """  
+    import httpx  
+    latencies, errors, partial = [], 0, 0  
+  
+    async def one(client, body):  
+        nonlocal errors, partial  
+        t0 = time.perf_counter()  
+        try:  
+            res = await client.post(f"{base}/search", json=body)  
+            data = res.json()  
+            if res.status_code != 200 or data.get("status") != "success": errors += 1  
+            elif data.get("partial"): partial += 1  
+        except (httpx.HTTPError, ValueError):  
+            errors += 1  
+        latencies.append(time.perf_counter() - t0)  
+  
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)  
+    async with httpx.AsyncClient(timeout=TIMEOUT_SEC, limits=limits) as client:  
+        tasks = []  
+        start = time.perf_counter()  
+        at = 0.0  
+        while True:  
+            at += rng.expovariate(rate)  
+            if at >= DURATION_SEC: break  
+            delay = start + at - time.perf_counter()  
+            if delay > 0: await asyncio.sleep(delay)  
+            tasks.append(asyncio.ensure_future(one(client, rng.choices(pool, weights)[0])))  
+        await asyncio.gather(*tasks)  
+        elapsed = time.perf_counter() - start  
+  
+    latencies.sort()  
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000  
+    return {  
+        "rate": rate, "sent": len(latencies), "throughput": (len(latencies) - errors) / elapsed,  
+        "p50": statistics.median(latencies) * 1000, "p95": pick(0.95), "p99": pick(0.99),  
+        "error_rate": errors / len(latencies) if latencies else 0.0, "partial": partial,  
+    }  
+  
+async def run_workers(workers, yahoo_url, pool, weights):  
+    with tempfile.TemporaryDirectory() as workdir:  
+        proc, base = start_app(workers, yahoo_url, workdir)  
+        try:  
+            await wait_ready(base, proc)  
+            rows = []  
+            rng = random.Random(1)  # どのワーカー数でも同じ問い合わせの並びを流す  
+            for rate in RATES:  
+                row = await run_rate(base, rate, pool, weights, rng)  
+                row["rss"] = worker_memory(proc.pid, workers)  
+                rows.append(row)  
+                rss = "/".join(f"{m:.0f}" for m in row["rss"])  
+                print(f"  {workers:>2}w {rate:6.1f}/s  sent {row['sent']:5d}  ok {row['throughput']:6.2f}/s  "  
+                      f"p50 {row['p50']:7.0f}  p95 {row['p95']:7.0f}  p99 {row['p99']:7.0f} ms  "  
+                      f"err {row['error_rate'] * 100:5.1f}%  partial {row['partial']:4d}  rss {rss} MB")  
+            return rows  
+        finally:  
+            proc.terminate()  
+            try:  
+                proc.wait(timeout=15)  
+            except subprocess.TimeoutExpired:  
+                proc.kill()  
+  
+def main():  
+    coords = yahoo_stub_server.load_coords()  
+    pool, weights = build_requests(coords)  
+    server, yahoo_url = yahoo_stub_server.start_server(latency_ms=STUB_LATENCY_MS, coords=coords)  
+    print(f"🧪 workers {WORKERS} x rates {RATES}/s, {DURATION_SEC:.0f}s each, stub latency {STUB_LATENCY_MS:.0f}ms, "  
+          f"backend {BACKEND}, {os.cpu_count()} CPUs")  
+    report = {}  
+    for workers in WORKERS:  
+        before = server.RequestHandlerClass.counts["requests"]  
+        report[workers] = asyncio.run(run_workers(workers, yahoo_url, pool, weights))  
+        print(f"     Yahoo stub requests: {server.RequestHandlerClass.counts['requests'] - before}")  
+    server.shutdown()  
+  
+    out = os.environ.get("LOAD_REPORT_JSON")  
+    if out:  
+        with open(out, "w", encoding="utf-8") as f:  
+            json.dump(report, f, indent=1)  
+        print(f"💾 {out}")  
+  
+if __name__ == "__main__":  
+    main()  
\ No newline at end of file
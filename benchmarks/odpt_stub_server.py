@@ -0,0 +1,134 @@
+import os  
+import json  
+import random  
+import hashlib  
+import threading  
+from email.utils import formatdate  
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  
+from urllib.parse import urlparse, parse_qs  
+  
+# ODPT API の代わりをするローカルサーバー (fetch_odpt.py / http_crawler.py の確認用)  
+#   python benchmarks/odpt_stub_server.py  -> http://127.0.0.1:8001/api/v4  
+#   ODPT_API_BASE=http://127.0.0.1:8001/api/v4 python fetch_odpt.py  
+# 架空の事業者・路線・駅を決まった乱数で作り、ETag / Last-Modified を付けて返す (If-None-Match なら 304)。  
+# FAIL_RATE の割合で 503 (Retry-After なし) を返し、再試行の動きも確かめられる。  
+#   ODPT_STUB_PORT / ODPT_STUB_FAIL_RATE / ODPT_STUB_LATENCY_MS / ODPT_STUB_LINES (事業者あたりの路線数)  
+  
+PORT = int(os.environ.get("ODPT_STUB_PORT", "8001"))  
+FAIL_RATE = float(os.environ.get("ODPT_STUB_FAIL_RATE", "0.05"))  
+LATENCY_MS = float(os.environ.get("ODPT_STUB_LATENCY_MS", "20"))  
+LINES_PER_OPERATOR = int(os.environ.get("ODPT_STUB_LINES", "3"))  
+STATIONS_PER_LINE = 12  
+LAST_MODIFIED = formatdate(0, usegmt=True)  
+  
+def build_dataset(operators, lines_per_operator=LINES_PER_OPERATOR, seed=1):  
+    """ 事業者 -> 駅 / 路線、路線 -> 列車時刻表 (偶数番目の路線だけ。奇数番目は駅時刻表から組み立てさせる) """  
+    rng = random.Random(seed)  
+    stations, railways, trains, station_tables = {}, {}, {}, {}  
+    for op in operators:  
+        op_name = op.split(":")[-1]  
+        stations[op], railways[op] = [], []  
+        for line_no in range(lines_per_operator):  
+            rid = f"odpt.Railway:{op_name}.Line{line_no}"  
+            sids = [f"odpt.Station:{op_name}.Line{line_no}.S{i}" for i in range(STATIONS_PER_LINE)]  
+            lat, lon = 35.5 + rng.random() * 0.4, 139.4 + rng.random() * 0.5  
+            for i, sid in enumerate(sids):  
+                stations[op].append({"owl:sameAs": sid, "dc:title": f"{op_name}{line_no}-{i}",  
+                                     "geo:lat": round(lat + i * 0.01, 5), "geo:long": round(lon + i * 0.01, 5)})  
+            railways[op].append({"owl:sameAs": rid, "odpt:stationOrder": [{"odpt:station": s} for s in sids]})  
+  
+            first = 5 * 60 + rng.randrange(30)  
+            departures = list(range(first, 24 * 60 + 30, 15))  
+            if line_no % 2 == 0:  
+                trains[rid] = [{  
+                    "owl:sameAs": f"odpt.Train:{op_name}.Line{line_no}.{d}",  
+                    "odpt:trainTimetableObject": [  
+                        {"odpt:departureStation": sid, "odpt:departureTime": "%02d:%02d" % divmod((d + 2 * i) % 1440, 60)}  
+                        for i, sid in enumerate(sids)  
+                    ],  
+                } for d in departures]  
+            else:  
+                trains[rid] = []  
+                for i, sid in enumerate(sids):  
+                    station_tables[(sid, rid)] = [{"odpt:stationTimetableObject": [  
+                        {"odpt:departureTime": "%02d:%02d" % divmod((d + 2 * i) % 1440, 60), "odpt:destinationStation": [sids[-1]]}  
+                        for d in departures  
+                    ]}]  
+    return {"stations": stations, "railways": railways, "trains": trains, "station_tables": station_tables}  
+  
+class StubHandler(BaseHTTPRequestHandler):  
+    dataset = None  
+    fail_rate = FAIL_RATE  
+    latency_ms = LATENCY_MS  
+    counts = {"requests": 0, "ok": 0, "not_modified": 0, "failed": 0}  
+    lock = threading.Lock()  
+  
+    def log_message(self, *args):  
+        pass  
+  
+    def _count(self, name):  
+        with self.lock:  
+            self.counts[name] += 1  
+  
+    def do_GET(self):  
+        self._count("requests")  
+        if self.latency_ms > 0: threading.Event().wait(self.latency_ms / 1000)  
+        if random.random() < self.fail_rate:  
+            self._count("failed")  
+            self.send_response(503)  
+            self.send_header("Content-Length", "0")  
+            self.end_headers()  
+            return  
+  
+        url = urlparse(self.path)  
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}  
+        kind = url.path.rsplit("/", 1)[-1]  
+        d = self.dataset  
+        if kind == "odpt:Station": data = d["stations"].get(q.get("odpt:operator"), [])  
+        elif kind == "odpt:Railway": data = d["railways"].get(q.get("odpt:operator"), [])  
+        elif kind == "odpt:TrainTimetable": data = d["trains"].get(q.get("odpt:railway"), [])  
+        elif kind == "odpt:StationTimetable": data = d["station_tables"].get((q.get("odpt:station"), q.get("odpt:railway")), [])  
+        else:  
+            self.send_response(404)  
+            self.send_header("Content-Length", "0")  
+            self.end_headers()  
+            return  
+  
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")  
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()  
+        if self.headers.get("If-None-Match") == etag:  
+            self._count("not_modified")  
+            self.send_response(304)  
+            self.send_header("ETag", etag)  
+            self.end_headers()  
+            return  
+        self._count("ok")  
+        self.send_response(200)  
+        self.send_header("Content-Type", "application/json; charset=utf-8")  
+        self.send_header("Content-Length", str(len(body)))  
+        self.send_header("ETag", etag)  
+        self.send_header("Last-Modified", LAST_MODIFIED)  
+        self.end_headers()  
+        self.wfile.write(body)  
+  
+def start_server(operators, port=0, fail_rate=FAIL_RATE, latency_ms=LATENCY_MS):  
+    """ 別スレッドで起動して (server, base_url) を返す。port=0 なら空いているポート """  
+    handler = type("Handler", (StubHandler,), {  
+        "dataset": build_dataset(operators), "fail_rate": fail_rate, "latency_ms": latency_ms,  
+        "counts": dict(StubHandler.counts), "lock": threading.Lock(),  
+    })  
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)  
+    server.daemon_threads = True  
+    threading.Thread(target=server.serve_forever, daemon=True).start()  
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v4"  
+  
+if __name__ == "__main__":  
+    import sys  
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  
+    import fetch_odpt  
+    server, base = start_server(fetch_odpt.TARGET_OPERATORS, PORT)  
+    print(f"🧪 ODPT stub server: {base} (fail_rate={FAIL_RATE}, latency={LATENCY_MS}ms)")  
+    try:  
+        threading.Event().wait()  
+    except KeyboardInterrupt:  
+        server.shutdown()  
\ No newline at end of file
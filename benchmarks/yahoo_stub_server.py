@@ -0,0 +1,189 @@
+import os  
+import sys  
+import json  
+import math  
+import zlib  
+import threading  
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  
+from urllib.parse import urlparse, parse_qs  
+  
+# Yahoo!乗換案内 印刷用ページ (/search/print) の代わりをするローカルサーバー (ベンチマーク・負荷試験用)  
+#   python benchmarks/yahoo_stub_server.py  -> http://127.0.0.1:8003/search/print  
+#   YAHOO_PRINT_URL=http://127.0.0.1:8003/search/print YAHOO_DELAY_SEC=0 uvicorn main:app  
+# 返すページは fixtures/yahoo/print_page.html (ページの外枠) にルート部分を埋め込んだもの。  
+# ルートの有無は「終電が近づくほど遠くまで行けなくなる」決まった規則で決める:  
+#   出発駅から到着駅までの直線距離 <= (LAST_TRAIN_MIN - 検索時刻(営業日の分)) * REACH_KM_PER_MIN ならルートあり  
+# 候補駅は出発駅から近い順に並ぶので、二分探索の前提 (途中から先は全部 NG) がそのまま成り立つ。  
+#   YAHOO_STUB_PORT / YAHOO_STUB_LATENCY_MS / YAHOO_STUB_FAIL_RATE  
+  
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "yahoo")  
+PORT = int(os.environ.get("YAHOO_STUB_PORT", "8003"))  
+LATENCY_MS = float(os.environ.get("YAHOO_STUB_LATENCY_MS", "0"))  
+FAIL_RATE = float(os.environ.get("YAHOO_STUB_FAIL_RATE", "0"))  
+  
+LAST_TRAIN_MIN = 25 * 60 + 20   # この時刻 (営業日の分) 以降はどこにも行けない  
+REACH_KM_PER_MIN = 0.5          # 終電まで1分早いごとに行ける距離 (km)  
+SERVICE_DAY_START_HOUR = 4  
+  
+def _read_fixture(name):  
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:  
+        return f.read()  
+  
+PAGE = _read_fixture("print_page.html")  
+NO_ROUTE = _read_fixture("no_route.html")  
+  
+def load_coords():  
+    sys.path.insert(0, ROOT)  
+    import station_store  
+    return station_store.read_stops(os.path.join(ROOT, "data", "stops.txt"))  
+  
+def haversine(lat1, lon1, lat2, lon2):  
+    R = 6371  
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)  
+    a = math.sin(math.radians(lat2 - lat1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2  
+    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))  
+  
+def clock(minutes):  
+    """ 暦日の分 -> "[翌]00:05" / "23:10" """  
+    prefix = "[翌]" if minutes >= 1440 else ""  
+    minutes %= 1440  
+    return f"{prefix}{minutes // 60:02d}:{minutes % 60:02d}"  
+  
+def render_summary(dep, arr, transfers, fare=None, km=None):  
+    """ ルートの要約 (div.routeSummary)。dep / arr は clock() の文字列 """  
+    extra = ""  
+    if fare is not None: extra += f'<li class="fare">IC優先：{fare:,}円</li>\n'  
+    if km is not None: extra += f'<li class="distance">{km:.1f}km</li>\n'  
+    return (  
+        '<div class="routeSummary">\n<ul class="summary">\n'  
+        f'<li class="time"><span class="small">{dep}発→{arr}着</span></li>\n'  
+        f'<li class="transfer">乗換：<span class="mark">{transfers}回</span></li>\n'  
+        f'{extra}</ul>\n</div>\n'  
+    )  
+  
+def render_detail(stops, times, lines):  
+    """ 経路の詳細 (駅・乗り換え・路線)。stops と times は同じ長さ、lines は1つ少ない """  
+    parts = ['<div class="routeDetail">\n']  
+    for i, (name, t) in enumerate(zip(stops, times)):  
+        icon = "出発" if i == 0 else ("到着" if i == len(stops) - 1 else "乗換")  
+        parts.append(  
+            f'<div class="station"><ul class="time"><li>{t}</li></ul><p class="icon"><span class="icnStation">{icon}</span></p>'  
+            f'<dl><dt><a href="/station/top?q={name}">{name}</a></dt><dd><ul><li><a href="/station/time?q={name}">時刻表</a></li>'  
+            f'<li><a href="/station/map?q={name}">地図</a></li><li><a href="/station/exit?q={name}">出口</a></li></ul></dd></dl></div>\n'  
+        )  
+        if i < len(lines):  
+            parts.append(  
+                '<div class="fareSection"><div class="access"><ul class="info">'  
+                f'<li class="transport"><div><span class="line">{lines[i]}</span><span class="destination">（{stops[i + 1]}方面）</span></div></li>'  
+                '<li class="platform">[発] 1番線 → [着] 2番線</li><li class="stop">停車駅を表示</li></ul></div></div>\n'  
+            )  
+    parts.append('</div>\n')  
+    return "".join(parts)  
+  
+def render_page(origin, goal, date_label, route_html):  
+    return (PAGE.replace("{{FROM}}", origin).replace("{{TO}}", goal).replace("{{DATE}}", date_label)  
+            .replace("<!--ROUTE-->", route_html))  
+  
+def route_for(coords, origin, goal, hh, mm):  
+    """ 決まった規則で (出発分, 到着分, 乗換回数, 距離km) を返す (暦日の分)。ルートなしなら None """  
+    name_rows, lats, lons = coords  
+    if origin not in name_rows or goal not in name_rows: return None  
+    a, b = name_rows[origin], name_rows[goal]  
+    km = haversine(lats[a], lons[a], lats[b], lons[b])  
+    service_min = (hh + 24 if hh < SERVICE_DAY_START_HOUR else hh) * 60 + mm  
+    if km > (LAST_TRAIN_MIN - service_min) * REACH_KM_PER_MIN: return None  
+    h = zlib.crc32(f"{origin}|{goal}|{service_min}".encode("utf-8"))  
+    dep = hh * 60 + mm + h % 8  
+    arr = dep + 3 + round(km / 40 * 60)  
+    return dep, arr, min(3, int(km // 15)), km  
+  
+def render_route(coords, origin, goal, hh, mm):  
+    route = route_for(coords, origin, goal, hh, mm)  
+    if route is None: return NO_ROUTE  
+    dep, arr, transfers, km = route  
+    # 乗換駅は決まった規則で実在の駅名から選ぶ (ページの大きさを実物に近づけるため)  
+    names = list(coords[0].keys())  
+    via = [names[zlib.crc32(f"{origin}|{goal}|{i}".encode("utf-8")) % len(names)] for i in range(transfers)]  
+    stops = [origin] + via + [goal]  
+    times = [clock(dep + (arr - dep) * i // len(stops[1:])) for i in range(len(stops))]  
+    lines = [f"{names[zlib.crc32(s.encode('utf-8')) % len(names)]}線" for s in stops[:-1]]  
+    summary = render_summary(clock(dep), clock(arr), transfers, fare=170 + int(km * 16) // 10 * 10, km=km * 1.2)  
+    return f'<div id="route01" class="routeDetailBox">\n{summary}{render_detail(stops, times, lines)}</div>\n'  
+  
+class StubHandler(BaseHTTPRequestHandler):  
+    coords = None  
+    latency_ms = LATENCY_MS  
+    fail_rate = FAIL_RATE  
+    counts = {"requests": 0, "ok": 0, "no_route": 0, "failed": 0}  
+    lock = threading.Lock()  
+  
+    def log_message(self, *args):  
+        pass  
+  
+    def _count(self, name):  
+        with self.lock:  
+            self.counts[name] += 1  
+  
+    def do_GET(self):  
+        self._count("requests")  
+        if self.latency_ms > 0: threading.Event().wait(self.latency_ms / 1000)  
+        url = urlparse(self.path)  
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}  
+        if not url.path.endswith("/search/print"):  
+            self.send_response(404)  
+            self.send_header("Content-Length", "0")  
+            self.end_headers()  
+            return  
+        if self.fail_rate > 0 and zlib.crc32(self.path.encode("utf-8")) % 1000 < self.fail_rate * 1000:  
+            self._count("failed")  
+            self.send_response(503)  
+            self.send_header("Content-Length", "0")  
+            self.end_headers()  
+            return  
+  
+        try:  
+            hh, mm = int(q["hh"]), int(q["m1"]) * 10 + int(q["m2"])  
+            origin, goal = q["from"], q["to"]  
+        except (KeyError, ValueError):  
+            hh = mm = 0  
+            origin = goal = ""  
+        route_html = render_route(self.coords, origin, goal, hh, mm)  
+        self._count("no_route" if route_html is NO_ROUTE else "ok")  
+        date_label = f"{q.get('y', '')}年{q.get('m', '')}月{q.get('d', '')}日 {hh:02d}:{mm:02d}"  
+        body = render_page(origin, goal, date_label, route_html).encode("utf-8")  
+        try:  
+            self.send_response(200)  
+            self.send_header("Content-Type", "text/html; charset=UTF-8")  
+            self.send_header("Content-Length", str(len(body)))  
+            self.end_headers()  
+            self.wfile.write(body)  
+        except (BrokenPipeError, ConnectionResetError):  
+            pass  # 先読みの外れ・締め切りで取り消された問い合わせ (クライアントが先に切断した)  
+  
+def start_server(port=0, latency_ms=LATENCY_MS, fail_rate=FAIL_RATE, coords=None):  
+    """ 別スレッドで起動して (server, print_url) を返す。port=0 なら空いているポート """  
+    handler = type("Handler", (StubHandler,), {  
+        "coords": coords or load_coords(), "latency_ms": latency_ms, "fail_rate": fail_rate,  
+        "counts": dict(StubHandler.counts), "lock": threading.Lock(),  
+    })  
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)  
+    server.daemon_threads = True  
+    threading.Thread(target=server.serve_forever, daemon=True).start()  
+    return server, f"http://127.0.0.1:{server.server_address[1]}/search/print"  
+  
+def load_cases():  
+    """ fixtures/yahoo/cases.json: 保存済みのページと、parse_yahoo_route が返すべき値 """  
+    with open(os.path.join(FIXTURE_DIR, "cases.json"), "r", encoding="utf-8") as f:  
+        cases = json.load(f)  
+    for case in cases:  
+        case["html"] = _read_fixture(case["file"])  
+    return cases  
+  
+if __name__ == "__main__":  
+    server, url = start_server(PORT)  
+    print(f"🧪 Yahoo stub server: {url} (latency={LATENCY_MS}ms, fail_rate={FAIL_RATE})")  
+    try:  
+        threading.Event().wait()  
+    except KeyboardInterrupt:  
+        server.shutdown()  
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os  
+import time  
+import numpy as np  
+from array import array  
+from concurrent.futures import ProcessPoolExecutor  
+import timetable  
+import raptor_engine  
+import last_reachable  
+  
+# 時刻表 -> data/last_reachable.bin (終電間際の到達プロファイル)  
+# 時刻表を作り直したら compile_timetable.py の後に実行する。出発駅ごとにプロセスへ振り分ける  
+#   LAST_REACHABLE_ORIGINS : 出発駅をカンマ区切りで指定 (省略時は発車本数の多い順に上位 LAST_REACHABLE_TOP 駅)  
+#   LAST_REACHABLE_WORKERS : プロセス数 (省略時はCPU数)  
+  
+TOP_ORIGINS = int(os.environ.get("LAST_REACHABLE_TOP", "300"))  
+  
+def build_origin(args):  
+    """  
+    1つの出発駅について、窓の各分で RAPTOR を回し、(駅, 乗換回数) ごとの結果が変わる分だけを段として残す。  
+    戻り値: (駅番号, [((駅, 乗換回数), [(分, 到着, 発車), ...]), ...])  
+    """  
+    sid, window = args  
+    tt = timetable.get_timetable()  # ワーカーごとに1回だけ mmap する  
+    absent = (last_reachable.ABSENT, 0)  
+    steps = {}  
+    prev = {}  
+    prev_labels = None  
+    for minute in range(window[0], window[1] + 1):  
+        labels = raptor_engine.raptor_labels(tt, sid, minute)  
+        if labels == prev_labels: continue  
+        prev_labels = labels  
+        offset = minute - window[0]  
+        cur = {(s, k - 1): (arr, dep) for s, k, arr, dep in labels}  
+        for key in cur.keys() | prev.keys():  
+            value = cur.get(key, absent)  
+            if value == prev.get(key, absent): continue  
+            # 途中から着けるようになった組も、窓の先頭に「着けない」段を置いて必ず引けるようにする  
+            if key not in steps: steps[key] = [] if offset == 0 else [(0,) + absent]  
+            steps[key].append((offset,) + value)  
+        prev = cur  
+    return sid, sorted(steps.items())  
+  
+def select_origins(tt):  
+    names = os.environ.get("LAST_REACHABLE_ORIGINS")  
+    if names:  
+        return [tt.station_ids[n] for n in names.split(",") if n in tt.station_ids]  
+    departures = np.bincount(np.asarray(tt.conn_from), minlength=len(tt.station_names))  
+    return [int(s) for s in np.argsort(-departures, kind="stable")[:TOP_ORIGINS] if departures[s] > 0]  
+  
+def build_last_reachable(out_path=last_reachable.LAST_REACHABLE_BIN, window=(last_reachable.WINDOW_START, last_reachable.WINDOW_END)):  
+    print("🚀 終電間際の到達プロファイルを作成します...")  
+  
+    tt = timetable.get_timetable()  
+    if tt is None:  
+        print(f"❌ {timetable.stop_times_source()} が見つかりません。")  
+        return  
+    if window[1] - window[0] >= last_reachable.MINUTE_SLOTS:  
+        print(f"❌ 窓が長すぎます ({last_reachable.MINUTE_SLOTS}分まで)。")  
+        return  
+  
+    origins = select_origins(tt)  
+    print(f"  {len(origins)} origins x {window[1] - window[0] + 1} minutes")  
+  
+    t0 = time.time()  
+    workers = int(os.environ.get("LAST_REACHABLE_WORKERS", "0")) or os.cpu_count()  
+    station_code = 'H' if len(tt.station_names) < 65536 else 'I'  
+    columns = {  
+        "station_names": array('B', "\n".join(tt.station_names).encode("utf-8")),  
+        "meta": array('i', window),  
+        "origins": array('I'),  
+        "origin_keys": array('I', [0]),  
+        "key_station": array(station_code), "key_transfers": array('B'),  
+        "seg_code": array('I'), "seg_arr": array('H'), "seg_dep": array('H'),  
+    }  
+    with ProcessPoolExecutor(workers) as pool:  
+        # 結果は出発駅の順に届くので、届いたそばから列に追記する  
+        for n, (sid, steps) in enumerate(pool.map(build_origin, [(s, window) for s in origins], chunksize=4), 1):  
+            columns["origins"].append(sid)  
+            for (station, transfers), segments in steps:  
+                key = len(columns["key_station"])  
+                columns["key_station"].append(station)  
+                columns["key_transfers"].append(transfers)  
+                for offset, arr, dep in segments:  
+                    columns["seg_code"].append(key * last_reachable.MINUTE_SLOTS + offset)  
+                    columns["seg_arr"].append(arr)  
+                    columns["seg_dep"].append(dep)  
+            columns["origin_keys"].append(len(columns["key_station"]))  
+            if n % 20 == 0: print(f"  ... {n}/{len(origins)} origins ({time.time() - t0:.0f}s)")  
+  
+    size = timetable.write_columns(out_path, columns, last_reachable.TABLE_MAGIC, last_reachable.TABLE_VERSION)  
+    print(f"💾 {out_path} ({size / 1024 / 1024:.1f} MB, {len(columns['seg_code'])} steps) {time.time() - t0:.1f}s")  
+    print("🎉 完了！")  
+  
+if __name__ == "__main__":  
+    build_last_reachable()  
\ No newline at end of file
@@ -0,0 +1,314 @@
+import os  
+import bz2  
+import gzip  
+import math  
+import time  
+import heapq  
+import numpy as np  
+from array import array  
+from concurrent.futures import ProcessPoolExecutor  
+import xml.etree.ElementTree as ET  
+import timetable  
+import station_store  
+import road_distance  
+  
+# OSM の道路データ -> data/road_distances.bin (駅 x 周囲のセル の道のり。road_distance.py が引く)  
+# 関東の道路だけを抜き出した OSM ファイルを用意してから実行する。例:  
+#   osmium tags-filter kanto-latest.osm.pbf w/highway -o data/kanto-roads.osm.pbf  
+#   OSM_ROAD_EXTRACT  : 入力 (.osm / .osm.gz / .osm.bz2 は標準ライブラリで読む。.pbf は pyosmium が入っていれば読む)  
+#   ROAD_CELL_KM=1.0  : セルの大きさ (km)  
+#   ROAD_RADIUS_KM=30 : 駅ごとに道のりを持つ範囲。これより遠い目的地は従来の見積もり (直線 x 1.4)  
+#   ROAD_WORKERS      : プロセス数 (省略時はCPU数)  
+# 道路網は一方通行を考慮した有向グラフ。駅ごとの最短経路は scipy があれば scipy.sparse.csgraph.dijkstra、  
+# 無ければ heapq で求める (どちらも ROAD_RADIUS_KM x ROAD_LIMIT_FACTOR で打ち切る)。  
+  
+OSM_ROAD_EXTRACT = os.environ.get("OSM_ROAD_EXTRACT", f"{timetable.DATA_DIR}/kanto-roads.osm.pbf")  
+CELL_KM = float(os.environ.get("ROAD_CELL_KM", "1.0"))  
+RADIUS_KM = float(os.environ.get("ROAD_RADIUS_KM", "30"))  
+ROAD_LIMIT_FACTOR = 2.0   # 道のりはこれ以上 (半径 x 2) は探さない  
+MAX_SNAP_KM = 1.0         # 駅から一番近い道路上の点がこれより遠い駅は表に入れない (抽出範囲の外など)  
+  
+KANTO_BBOX = (34.85, 138.35, 37.20, 140.90)  # 南, 西, 北, 東  
+  
+# タクシーが走れる道  
+DRIVABLE = {  
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",  
+    "living_street", "service", "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",  
+}  
+  
+def way_direction(tags):  
+    """ 1 = 書かれた向きだけ / -1 = 逆向きだけ / 0 = 両方向。走れない道は None """  
+    if tags.get("highway") not in DRIVABLE: return None  
+    if tags.get("access") in ("no", "private") or tags.get("motor_vehicle") == "no" or tags.get("motorcar") == "no": return None  
+    oneway = tags.get("oneway")  
+    if oneway in ("yes", "1", "true"): return 1  
+    if oneway == "-1": return -1  
+    if oneway != "no" and (tags.get("highway") == "motorway" or tags.get("junction") == "roundabout"): return 1  
+    return 0  
+  
+class RoadData:  
+    """ 読み込んだ OSM: 全ノードの座標と、走れる道 (ノードIDの並び + 向き) """  
+  
+    def __init__(self):  
+        self.node_ids, self.node_lat, self.node_lon = array('q'), array('d'), array('d')  
+        self.way_refs, self.way_offsets, self.way_dir = array('q'), array('q', [0]), array('b')  
+  
+    def add_way(self, refs, tags):  
+        direction = way_direction(tags)  
+        if direction is None or len(refs) < 2: return  
+        self.way_refs.extend(refs)  
+        self.way_offsets.append(len(self.way_refs))  
+        self.way_dir.append(direction)  
+  
+def read_osm_xml(path):  
+    opener = gzip.open if path.endswith(".gz") else bz2.open if path.endswith(".bz2") else open  
+    osm = RoadData()  
+    with opener(path, "rb") as f:  
+        root = None  
+        for event, elem in ET.iterparse(f, events=("start", "end")):  
+            if root is None: root = elem  
+            if event != "end": continue  
+            if elem.tag == "node":  
+                osm.node_ids.append(int(elem.get("id")))  
+                osm.node_lat.append(float(elem.get("lat")))  
+                osm.node_lon.append(float(elem.get("lon")))  
+            elif elem.tag == "way":  
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}  
+                osm.add_way([int(nd.get("ref")) for nd in elem.iter("nd")], tags)  
+            else:  
+                continue  
+            root.clear()  # 読んだ要素を捨てる (関東全域だと数千万ノード)  
+    return osm  
+  
+def read_osm_pbf(path):  
+    try:  
+        import osmium  
+    except ImportError:  
+        raise SystemExit("❌ .pbf を読むには pyosmium が必要です (pip install osmium)。"  
+                         " または osmium cat で .osm に変換してください。")  
+    osm = RoadData()  
+  
+    class Handler(osmium.SimpleHandler):  
+        def node(self, n):  
+            osm.node_ids.append(n.id)  
+            osm.node_lat.append(n.location.lat)  
+            osm.node_lon.append(n.location.lon)  
+  
+        def way(self, w):  
+            osm.add_way([nd.ref for nd in w.nodes], {t.k: t.v for t in w.tags})  
+  
+    Handler().apply_file(path)  
+    return osm  
+  
+def read_osm(path):  
+    return read_osm_pbf(path) if path.endswith(".pbf") else read_osm_xml(path)  
+  
+def haversine_pairs(lat1, lon1, lat2, lon2):  
+    """ 2つの配列の対ごとの距離 (km)。spatial_index.haversine_np と同じ式 """  
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))  
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2  
+    return 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))  
+  
+def build_graph(osm):  
+    """ 道で使われるノードだけに番号を振り直した有向グラフ (CSR)。戻り値: (lat, lon, indptr, indices, weights) """  
+    ids = np.frombuffer(osm.node_ids, dtype=np.int64)  
+    order = np.argsort(ids, kind="stable")  
+    sorted_ids = ids[order]  
+    refs = np.frombuffer(osm.way_refs, dtype=np.int64)  
+    offsets = np.frombuffer(osm.way_offsets, dtype=np.int64)  
+    pos = np.minimum(np.searchsorted(sorted_ids, refs), len(sorted_ids) - 1)  
+    known = sorted_ids[pos] == refs  # 抽出範囲の外に出る道はノードが無い  
+  
+    # 同じ道の隣り合うノードの組が辺  
+    pair = np.ones(len(refs) - 1, dtype=bool)  
+    pair[offsets[1:-1] - 1] = False  
+    pair &= known[:-1] & known[1:]  
+    direction = np.repeat(np.frombuffer(osm.way_dir, dtype=np.int8), np.diff(offsets))[:-1]  
+    a, b, direction = order[pos[:-1][pair]], order[pos[1:][pair]], direction[pair]  
+  
+    used, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)  
+    a, b = inverse[:len(a)], inverse[len(a):]  
+    lat = np.frombuffer(osm.node_lat, dtype=np.float64)[used]  
+    lon = np.frombuffer(osm.node_lon, dtype=np.float64)[used]  
+    w = haversine_pairs(lat[a], lon[a], lat[b], lon[b])  
+  
+    forward, backward = direction >= 0, direction <= 0  
+    src = np.concatenate([a[forward], b[backward]])  
+    dst = np.concatenate([b[forward], a[backward]])  
+    w = np.concatenate([w[forward], w[backward]])  
+    # 同じ2点を結ぶ辺が複数あれば短い方だけ (scipy の csr_matrix は重複を足してしまう)  
+    order = np.lexsort((w, dst, src))  
+    src, dst, w = src[order], dst[order], w[order]  
+    first = np.ones(len(src), dtype=bool)  
+    first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])  
+    src, dst, w = src[first], dst[first], w[first]  
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(used)))])  
+    return lat, lon, indptr, dst, w  
+  
+class Grid:  
+    """ 関東を覆う固定の格子 (セルの大きさは km で指定し、経度方向は中央の緯度で換算する) """  
+  
+    def __init__(self, cell_km=CELL_KM, bbox=KANTO_BBOX):  
+        south, west, north, east = bbox  
+        self.lat0, self.lon0 = south, west  
+        self.dlat = cell_km / road_distance.KM_PER_DEG_LAT  
+        self.dlon = cell_km / (road_distance.KM_PER_DEG_LAT * math.cos(math.radians((south + north) / 2)))  
+        self.rows = math.ceil((north - south) / self.dlat)  
+        self.cols = math.ceil((east - west) / self.dlon)  
+  
+    def cell_of(self, lat, lon):  
+        return np.floor((lat - self.lat0) / self.dlat).astype(np.int64), np.floor((lon - self.lon0) / self.dlon).astype(np.int64)  
+  
+    def local_km(self, lat, lon, lat2, lon2):  
+        """ 近い2点の距離 (平面近似, km) """  
+        dy = (lat - lat2) * road_distance.KM_PER_DEG_LAT  
+        dx = (lon - lon2) * road_distance.KM_PER_DEG_LAT * np.cos(np.radians(lat))  
+        return np.sqrt(dx * dx + dy * dy)  
+  
+def cell_representatives(grid, lat, lon):  
+    """ 各セルの代表点 = セルの中心に一番近い道路上のノード (-1 = 道路の無いセル) """  
+    r, c = grid.cell_of(lat, lon)  
+    inside = (r >= 0) & (r < grid.rows) & (c >= 0) & (c < grid.cols)  
+    nodes = np.flatnonzero(inside)  
+    cell = r[nodes] * grid.cols + c[nodes]  
+    center_lat = grid.lat0 + (r[nodes] + 0.5) * grid.dlat  
+    center_lon = grid.lon0 + (c[nodes] + 0.5) * grid.dlon  
+    d = grid.local_km(lat[nodes], lon[nodes], center_lat, center_lon)  
+    order = np.lexsort((d, cell))  
+    cells, first = np.unique(cell[order], return_index=True)  
+    cell_node = np.full(grid.rows * grid.cols, -1, dtype=np.int64)  
+    cell_node[cells] = nodes[order[first]]  
+    return cell_node  
+  
+def snap_stations(grid, lat, lon, st_lat, st_lon):  
+    """ 各駅に一番近い道路上のノードとその距離 (周囲3x3セルの中から探す。無ければ -1) """  
+    r, c = grid.cell_of(lat, lon)  
+    cell = r * grid.cols + c  
+    order = np.argsort(cell, kind="stable")  
+    sorted_cell = cell[order]  
+    snap_node = np.full(len(st_lat), -1, dtype=np.int64)  
+    snap_km = np.full(len(st_lat), np.inf)  
+    sr, sc = grid.cell_of(np.asarray(st_lat), np.asarray(st_lon))  
+    for i in range(len(st_lat)):  
+        near = []  
+        for dr in (-1, 0, 1):  
+            row = sr[i] + dr  
+            lo = np.searchsorted(sorted_cell, row * grid.cols + sc[i] - 1)  
+            hi = np.searchsorted(sorted_cell, row * grid.cols + sc[i] + 2)  
+            near.append(order[lo:hi])  
+        near = np.concatenate(near)  
+        if not len(near): continue  
+        d = grid.local_km(st_lat[i], st_lon[i], lat[near], lon[near])  
+        k = int(np.argmin(d))  
+        snap_node[i], snap_km[i] = near[k], d[k]  
+    return snap_node, snap_km  
+  
+# --- 駅ごとの最短経路 (ワーカープロセス) ---  
+_worker = {}  
+  
+def _init_worker(indptr, indices, weights, cell_node, shape, limit_km):  
+    _worker.update(cell_node=cell_node, shape=shape, limit_km=limit_km)  
+    try:  
+        from scipy.sparse import csr_matrix  
+        from scipy.sparse.csgraph import dijkstra  
+        n = len(indptr) - 1  
+        _worker["csgraph"] = (csr_matrix((weights, indices, indptr), shape=(n, n)), dijkstra)  
+    except ImportError:  
+        # heapq 版は Python のリストの方が速い  
+        _worker["lists"] = (indptr.tolist(), indices.tolist(), weights.tolist())  
+  
+def shortest_paths(source, limit_km):  
+    """ source から limit_km 以内の各ノードまでの道のり。戻り値: ノード番号 -> km (dict か配列) """  
+    if "csgraph" in _worker:  
+        graph, dijkstra = _worker["csgraph"]  
+        return dijkstra(graph, indices=source, limit=limit_km)  
+    indptr, indices, weights = _worker["lists"]  
+    dist = {source: 0.0}  
+    heap = [(0.0, source)]  
+    while heap:  
+        d, u = heapq.heappop(heap)  
+        if d > dist[u]: continue  
+        for k in range(indptr[u], indptr[u + 1]):  
+            v, nd = indices[k], d + weights[k]  
+            if nd <= limit_km and nd < dist.get(v, math.inf):  
+                dist[v] = nd  
+                heapq.heappush(heap, (nd, v))  
+    return dist  
+  
+def station_window(args):  
+    """ 1駅ぶんの窓 ((2*半径+1)^2 セル) の道のり (UNIT_KM 単位の uint16) """  
+    row, cell_r, cell_c, source, snap_km = args  
+    rows, cols, half = _worker["shape"]  
+    width = 2 * half + 1  
+    rr = cell_r - half + np.arange(width)[:, None]  
+    cc = cell_c - half + np.arange(width)[None, :]  
+    inside = (rr >= 0) & (rr < rows) & (cc >= 0) & (cc < cols)  
+    nodes = np.where(inside, _worker["cell_node"][np.clip(rr * cols + cc, 0, rows * cols - 1)], -1).ravel()  
+  
+    dist = shortest_paths(source, _worker["limit_km"])  
+    km = np.full(len(nodes), np.inf)  
+    has = nodes >= 0  
+    if isinstance(dist, dict):  
+        km[has] = [dist.get(n, math.inf) for n in nodes[has].tolist()]  
+    else:  
+        km[has] = dist[nodes[has]]  
+    units = np.round((km + snap_km) / road_distance.UNIT_KM)  
+    window = np.where(np.isfinite(units) & (units < road_distance.ABSENT), units, road_distance.ABSENT).astype(np.uint16)  
+    return row, window  
+  
+def build_road_distances(extract=OSM_ROAD_EXTRACT, out_path=road_distance.ROAD_DISTANCE_BIN,  
+                         stops_path=timetable.STOPS_TXT, cell_km=CELL_KM, radius_km=RADIUS_KM, bbox=KANTO_BBOX):  
+    print("🚀 道路距離テーブルを作成します...")  
+    if not os.path.exists(extract):  
+        print(f"❌ {extract} が見つかりません。")  
+        return  
+  
+    t0 = time.time()  
+    osm = read_osm(extract)  
+    print(f"  {len(osm.node_ids)} nodes / {len(osm.way_dir)} roads ({time.time() - t0:.1f}s)")  
+    lat, lon, indptr, indices, weights = build_graph(osm)  
+    del osm  
+    print(f"  graph: {len(lat)} nodes / {len(indices)} edges")  
+  
+    grid = Grid(cell_km, bbox)  
+    half = math.ceil(radius_km / cell_km)  
+    width = 2 * half + 1  
+    cell_node = cell_representatives(grid, lat, lon)  
+    print(f"  grid: {grid.rows}x{grid.cols} cells ({cell_km}km), {int((cell_node >= 0).sum())} with roads, window {width}x{width}")  
+  
+    name_rows, st_lat, st_lon = station_store.read_stops(stops_path)  
+    st_lat, st_lon = np.asarray(st_lat), np.asarray(st_lon)  
+    snap_node, snap_km = snap_stations(grid, lat, lon, st_lat, st_lon)  
+    st_r, st_c = grid.cell_of(st_lat, st_lon)  
+    jobs = [(i, int(st_r[i]), int(st_c[i]), int(snap_node[i]), float(snap_km[i]))  
+            for i in range(len(st_lat)) if snap_km[i] <= MAX_SNAP_KM]  
+    print(f"  {len(jobs)}/{len(st_lat)} stations on the road network")  
+  
+    dist = np.full(len(st_lat) * width * width, road_distance.ABSENT, dtype=np.uint16)  
+    workers = int(os.environ.get("ROAD_WORKERS", "0")) or os.cpu_count()  
+    init = (indptr, indices, weights, cell_node, (grid.rows, grid.cols, half), radius_km * ROAD_LIMIT_FACTOR)  
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init) as pool:  
+        for n, (row, window) in enumerate(pool.map(station_window, jobs, chunksize=8), 1):  
+            dist[row * width * width:(row + 1) * width * width] = window  
+            if n % 200 == 0: print(f"  ... {n}/{len(jobs)} stations ({time.time() - t0:.0f}s)")  
+  
+    cell_lat = np.full(grid.rows * grid.cols, np.nan, dtype=np.float32)  
+    cell_lon = np.full(grid.rows * grid.cols, np.nan, dtype=np.float32)  
+    has = cell_node >= 0  
+    cell_lat[has], cell_lon[has] = lat[cell_node[has]], lon[cell_node[has]]  
+    columns = {  
+        "names": array('B', "\n".join(name_rows.keys()).encode("utf-8")),  
+        "name_rows": array('I', name_rows.values()),  
+        "grid": array('d', [grid.lat0, grid.lon0, grid.dlat, grid.dlon]),  
+        "shape": array('I', [grid.rows, grid.cols, half]),  
+        "station_cell": array('i', np.column_stack([st_r, st_c]).astype(np.int32).tobytes()),  
+        "cell_lat": array('f', cell_lat.tobytes()),  
+        "cell_lon": array('f', cell_lon.tobytes()),  
+        "dist": array('H', dist.tobytes()),  
+    }  
+    size = timetable.write_columns(out_path, columns, road_distance.TABLE_MAGIC, road_distance.TABLE_VERSION)  
+    print(f"💾 {out_path} ({size / 1024 / 1024:.1f} MB) {time.time() - t0:.1f}s")  
+    print("🎉 完了！")  
+  
+if __name__ == "__main__":  
+    build_road_distances()  
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os  
+import time  
+import timetable  
+import station_store  
+  
+# 時刻表 (シャードのマニフェスト or stop_times.txt) + stops.txt -> data/timetable.bin (mmap用バイナリスナップショット)  
+# stops.txt -> data/stations.bin (起動時に pandas を使わずに読む駅スナップショット)  
+# 時刻表を作り直したら (fetch_odpt.py の後に) 実行する。generate_full_timetable.py は timetable.bin も直接書く  
+  
+def compile_timetable(stop_times_path=None, stops_path=timetable.STOPS_TXT, out_path=timetable.TIMETABLE_BIN):  
+    print("🚀 時刻表スナップショットを作成します...")  
+  
+    if os.path.exists(stops_path):  
+        size = station_store.write_station_snapshot(station_store.STATIONS_BIN, stops_path)  
+        print(f"💾 {station_store.STATIONS_BIN} ({size / 1024:.0f} KB)")  
+  
+    stop_times_path = stop_times_path or timetable.stop_times_source()  
+    if not os.path.exists(stop_times_path):  
+        print(f"❌ {stop_times_path} が見つかりません。")  
+        return  
+  
+    t0 = time.time()  
+    tt = timetable.load_timetable(stop_times_path, stops_path if os.path.exists(stops_path) else None)  
+    size = timetable.write_snapshot(tt, out_path)  
+    print(f"💾 {out_path} ({size / 1024 / 1024:.1f} MB, CSV {sum(os.path.getsize(p) for p in timetable.stop_times_paths(stop_times_path)) / 1024 / 1024:.1f} MB) {time.time() - t0:.1f}s")  
+  
+    # 読み戻して中身が一致するか確認  
+    mapped = timetable.load_snapshot(out_path)  
+    for name in timetable.CONNECTION_COLUMNS + timetable.ROUTE_COLUMNS:  
+        if list(getattr(mapped, name)) != list(getattr(tt, name)):  
+            print(f"❌ 列 {name} が一致しません。")  
+            return  
+    print("🎉 完了！")  
+  
+if __name__ == "__main__":  
+    compile_timetable()  
\ No newline at end of file
@@ -1,35 +1,54 @@
-import pandas as pd  
-import requests  
-from bs4 import BeautifulSoup  
+import numpy as np  
+import asyncio  
 from datetime import datetime, timedelta  
 import math  
 import urllib.parse  
 import time  
 import re  
+import os  
+import threading  
+from collections import OrderedDict  
+import timetable  
+import station_store  
+import csa_engine  
+import raptor_engine  
+import spatial_index  
+import speculative_search  
+import route_cache  
+import last_reachable  
+import metrics  
+import yahoo_parser  
+import outbound_scheduler  
+import road_distance  
   
 # === 1. 駅位置データの読み込み ===  
+# 起動を速くするため pandas は使わない。requests・BeautifulSoup・httpx も使う関数の中で初めて import する  
 print("📂 Loading station data...")  
 try:  
-    df_stops = pd.read_csv("data/stops.txt")  
-    station_coords = {}  
-    for _, row in df_stops.iterrows():  
-        station_coords[row["stop_name"]] = {  
-            "lat": row["stop_lat"],  
-            "lon": row["stop_lon"]  
-        }  
-        if row["stop_name"].endswith("駅"):  
-            short = row["stop_name"][:-1]  
-            station_coords[short] = station_coords[row["stop_name"]]  
+    station_coords = station_store.load_station_coords()  
     print(f"✅ Loaded {len(station_coords)} stations.")  
 except:  
     print("❌ Error: data/stops.txt not found.")  
     station_coords = {}  
   
+# 候補駅の絞り込み用 空間インデックス  
+station_grid = spatial_index.StationGrid(station_coords)  
+  
 # === 2. Yahoo!乗換案内 スクレイピング (厳格モード) ===  
   
-def fetch_yahoo_route(start, goal, dt):  
-    base_url = "https://transit.yahoo.co.jp/search/print"  
-    params = {  
+# ローカルの代替サーバー (benchmarks/yahoo_stub_server.py) で試すときは URL と待ち時間を差し替える  
+YAHOO_PRINT_URL = os.environ.get("YAHOO_PRINT_URL", "https://transit.yahoo.co.jp/search/print")  
+YAHOO_DELAY_SEC = float(os.environ.get("YAHOO_DELAY_SEC", "0.5"))   # マナー待機 (全ワーカー合計で この秒数に1件)  
+YAHOO_RATE_BURST = int(os.environ.get("YAHOO_RATE_BURST", "1"))       # 空いていれば続けて送ってよい件数  
+YAHOO_RATE_STATE = os.environ.get("YAHOO_RATE_STATE", "var/yahoo_rate.state")  # ワーカー間で共有する状態 (空ならプロセス内だけ)  
+YAHOO_TIMEOUT_SEC = 5  
+  
+# 送出の間隔は問い合わせごとの sleep ではなく、全ワーカー共通の行列で守る (outbound_scheduler.py)  
+yahoo_scheduler = outbound_scheduler.OutboundScheduler(  
+    "yahoo", outbound_scheduler.SharedBucket(YAHOO_DELAY_SEC, YAHOO_RATE_BURST, YAHOO_RATE_STATE))  
+  
+def build_yahoo_params(start, goal, dt):  
+    return {  
         "from": start,  
         "to": goal,  
         "y": dt.year,  
@@ -43,69 +62,152 @@ def fetch_yahoo_route(start, goal, dt):
         "ws": "3",   # 標準  
         "no": "1",   # 1件  
     }  
+  
+def parse_yahoo_route(html, dt, backend=None):  
+    """  
+    印刷用ページのHTMLから 出発/到着/乗換回数 を取り出す。使えないルートなら None  
+    (ページから要約の文字列を取り出す部分は yahoo_parser。backend で切り替えられる)  
+    """  
+    summary = yahoo_parser.extract_summary(html, backend)  
+    if not summary: return None  
+  
+    time_text, transfer_text = summary  
+    if time_text is None: return None  
       
-    try:  
-        time.sleep(0.5)   
-        res = requests.get(base_url, params=params, timeout=5)  
-        if res.status_code != 200: return None  
-          
-        soup = BeautifulSoup(res.text, 'html.parser')  
-        summary = soup.find("div", class_="routeSummary")  
-        if not summary: return None  
+    times = re.findall(r'(\d{1,2}:\d{2})', time_text)  
+    if len(times) < 2: return None   
+      
+    dep_str = times[0]  
+    arr_str = times[1]  
+      
+    transfers = 0  
+    if transfer_text is not None:  
+        nums = re.findall(r'\d+', transfer_text)  
+        if nums: transfers = int(nums[0])  
   
-        time_li = summary.find("li", class_="time")  
-        if not time_li: return None  
-          
-        time_text = time_li.text   
-        times = re.findall(r'(\d{1,2}:\d{2})', time_text)  
-        if len(times) < 2: return None   
-          
-        dep_str = times[0]  
-        arr_str = times[1]  
-          
-        transfer_li = summary.find("li", class_="transfer")  
-        transfers = 0  
-        if transfer_li:  
-            nums = re.findall(r'\d+', transfer_li.text)  
-            if nums: transfers = int(nums[0])  
-  
-        # === ★修正: 厳密な時間チェック ===  
-        # 「検索した時間」と「実際の出発時間」の差を見る  
-        req_minutes = dt.hour * 60 + dt.minute  
-          
-        dep_h, dep_m = map(int, dep_str.split(':'))  
-        actual_dep_minutes = dep_h * 60 + dep_m  
+    # === ★修正: 厳密な時間チェック ===  
+    # 「検索した時間」と「実際の出発時間」の差を見る  
+    req_minutes = dt.hour * 60 + dt.minute  
+      
+    dep_h, dep_m = map(int, dep_str.split(':'))  
+    actual_dep_minutes = dep_h * 60 + dep_m  
+      
+    # 24時またぎの補正  
+    # 例: 検索23:50(1430分) -> 出発00:10(10分) の場合、出発は+1440して1450分とみなす  
+    if req_minutes > 1200 and actual_dep_minutes < 300: # 20時以降検索で、翌0~5時出発  
+        actual_dep_minutes += 1440  
+    elif req_minutes < 300 and actual_dep_minutes < req_minutes: # 深夜25時(1時)検索で、出発がそれより前(ありえないが)  
+         actual_dep_minutes += 1440  
+  
+    # 待ち時間 (分)  
+    wait_time = actual_dep_minutes - req_minutes  
+      
+    # 判定1: 待ち時間が120分(2時間)を超えるなら「始発待ち」とみなしてNG  
+    if wait_time > 120:   
+        # print(f"  [NG] Too long wait: {wait_time}min")  
+        return None  
           
-        # 24時またぎの補正  
-        # 例: 検索23:50(1430分) -> 出発00:10(10分) の場合、出発は+1440して1450分とみなす  
-        if req_minutes > 1200 and actual_dep_minutes < 300: # 20時以降検索で、翌0~5時出発  
-            actual_dep_minutes += 1440  
-        elif req_minutes < 300 and actual_dep_minutes < req_minutes: # 深夜25時(1時)検索で、出発がそれより前(ありえないが)  
-             actual_dep_minutes += 1440  
-  
-        # 待ち時間 (分)  
-        wait_time = actual_dep_minutes - req_minutes  
+    # 判定2: 日付またぎマーク [翌] があり、かつ深夜検索でない場合は警戒  
+    if "[翌]" in time_text and req_minutes < 1200:   
+         # 昼間に検索して翌日になるのはおかしい  
+         return None  
+  
+    return {  
+        "found": True,  
+        "dep": dep_str,  
+        "arr": arr_str,  
+        "transfers": transfers  
+    }  
+  
+# 1回の問い合わせ (probe) の結果を数える。probe はスパンの属性 (トレースに載る)  
+def _probe_done(probe, result):  
+    probe["result"] = result  
+    metrics.PROBES.inc(result=result)  
+  
+def _probe_error(probe, kind):  
+    _probe_done(probe, "error")  
+    metrics.OUTBOUND_ERRORS.inc(target="yahoo", kind=kind)  
+  
+def fetch_yahoo_route(start, goal, dt):  
+    import requests  
+    with metrics.span("probe", goal=goal) as probe:  
+        hit, cached = route_cache.lookup(start, goal, dt)  
+        if hit:  
+            _probe_done(probe, "cache_hit")  
+            return cached  
+        params = build_yahoo_params(start, goal, dt)  
           
-        # 判定1: 待ち時間が120分(2時間)を超えるなら「始発待ち」とみなしてNG  
-        if wait_time > 120:   
-            # print(f"  [NG] Too long wait: {wait_time}min")  
+        try:  
+            with metrics.span("yahoo_wait"):  
+                yahoo_scheduler.acquire()  
+            with metrics.span("yahoo_http"):  
+                res = requests.get(YAHOO_PRINT_URL, params=params, timeout=YAHOO_TIMEOUT_SEC)  
+            if res.status_code != 200:  
+                _probe_error(probe, f"http_{res.status_code}")  
+                return None  
+            with metrics.span("parse"):  
+                route = parse_yahoo_route(res.text, dt)  
+            route_cache.store(start, goal, dt, route)  
+            _probe_done(probe, "ok" if route else "no_route")  
+            return route  
+  
+        except Exception as e:  
+            print(f"Scraping Error: {e}")  
+            _probe_error(probe, type(e).__name__)  
             return None  
-              
-        # 判定2: 日付またぎマーク [翌] があり、かつ深夜検索でない場合は警戒  
-        if "[翌]" in time_text and req_minutes < 1200:   
-             # 昼間に検索して翌日になるのはおかしい  
-             return None  
-  
-        return {  
-            "found": True,  
-            "dep": dep_str,  
-            "arr": arr_str,  
-            "transfers": transfers  
-        }  
   
-    except Exception as e:  
-        print(f"Scraping Error: {e}")  
-        return None  
+# --- 非同期版 (コネクションプール付きクライアントで並列に問い合わせる) ---  
+  
+# "bisect" (1駅ずつ二分探索) / "speculative" (判定木を先読みして並列問い合わせ)  
+YAHOO_SEARCH_MODE = os.environ.get("YAHOO_SEARCH_MODE", "bisect")  
+YAHOO_PROBE_WIDTH = int(os.environ.get("YAHOO_PROBE_WIDTH", "3"))           # 1ラウンドで投げる候補数 (k = 1, 3, 7, 15...)  
+YAHOO_MAX_CONCURRENCY = int(os.environ.get("YAHOO_MAX_CONCURRENCY", "4"))   # 同時接続数の上限  
+  
+# 先読みは判定木を段ごとに投げるので、k は 2^段数 - 1 に切り下がる (k=2 は逐次の二分探索と同じ)。黙って丸めずに知らせる  
+_effective_width = speculative_search.effective_width(YAHOO_PROBE_WIDTH)  
+if _effective_width != YAHOO_PROBE_WIDTH:  
+    print(f"⚠️ YAHOO_PROBE_WIDTH={YAHOO_PROBE_WIDTH} is not 2^d-1 (1, 3, 7, 15...). Using {_effective_width}")  
+    YAHOO_PROBE_WIDTH = _effective_width  
+if YAHOO_SEARCH_MODE == "speculative":  
+    print(f"🔀 Speculative Yahoo search: {YAHOO_PROBE_WIDTH} probes per round, {YAHOO_MAX_CONCURRENCY} connections")  
+  
+def make_async_client():  
+    import httpx  
+    return httpx.AsyncClient(  
+        timeout=YAHOO_TIMEOUT_SEC,  
+        limits=httpx.Limits(max_connections=YAHOO_MAX_CONCURRENCY, max_keepalive_connections=YAHOO_MAX_CONCURRENCY),  
+    )  
+  
+async def fetch_yahoo_route_async(client, start, goal, dt):  
+    with metrics.span("probe", goal=goal) as probe:  
+        hit, cached = await route_cache.lookup_async(start, goal, dt)  
+        if hit:  
+            _probe_done(probe, "cache_hit")  
+            return cached  
+        params = build_yahoo_params(start, goal, dt)  
+          
+        try:  
+            with metrics.span("yahoo_wait"):  
+                await yahoo_scheduler.acquire_async()  
+            with metrics.span("yahoo_http"):  
+                res = await client.get(YAHOO_PRINT_URL, params=params)  
+            if res.status_code != 200:  
+                _probe_error(probe, f"http_{res.status_code}")  
+                return None  
+            with metrics.span("parse"):  
+                route = parse_yahoo_route(res.text, dt)  
+            await route_cache.store_async(start, goal, dt, route)  
+            _probe_done(probe, "ok" if route else "no_route")  
+            return route  
+  
+        except asyncio.CancelledError:  
+            # 先読みの外れ・締め切りで取り消された問い合わせ  
+            _probe_done(probe, "cancelled")  
+            raise  
+        except Exception as e:  
+            print(f"Scraping Error: {e}")  
+            _probe_error(probe, type(e).__name__)  
+            return None  
   
 # === 3. 距離・料金 ===  
   
@@ -117,76 +219,209 @@ def haversine_distance(c1, c2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))  
     return R * c  
   
-def calculate_taxi_fare(km):  
+def calculate_taxi_fare(km, road_km=None):  
+    """ km は直線距離。道のり road_km (road_distance の表) が分かっていればそれで、無ければ直線 x 1.4 で計算する """  
     if km < 0.1: return 0  
     fare = 500  
-    road_km = km * 1.4  
+    if road_km is None: road_km = km * 1.4  
     if road_km > 1.096:  
         fare += math.ceil(((road_km * 1000) - 1096) / 255) * 100  
     return round(fare * 1.2 * 1.1, -1)  
   
+def calculate_taxi_fare_np(km, road_km=None):  
+    """ calculate_taxi_fare の配列版 (road_km の NaN は直線 x 1.4) """  
+    road_km = km * 1.4 if road_km is None else np.where(np.isnan(road_km), km * 1.4, road_km)  
+    fare = 500 + np.where(road_km > 1.096, np.ceil(((road_km * 1000) - 1096) / 255) * 100, 0)  
+    return np.where(km < 0.1, 0, np.round(fare * 1.2 * 1.1, -1))  
+  
+def station_taxi_fare(station, km, target_coords):  
+    """ 駅から目的地までのタクシー料金 (道路距離の表があれば道のりで) """  
+    table = road_distance.get_table()  
+    if table is None or target_coords is None: return calculate_taxi_fare(km)  
+    return calculate_taxi_fare(km, table.road_km(station, target_coords["lat"], target_coords["lon"]))  
+  
+def station_taxi_fare_np(station_names, sid, km, target_coords):  
+    """ station_taxi_fare の配列版。station_names[sid] の各駅から目的地まで """  
+    table = road_distance.get_table()  
+    if table is None: return calculate_taxi_fare_np(km)  
+    road_km = table.road_km_np(table.rows_for(station_names)[sid], float(target_coords["lat"]), float(target_coords["lon"]))  
+    return calculate_taxi_fare_np(km, road_km)  
+  
 # === 4. 探索ロジック ===  
   
-def search_routes(start_name, current_time_str, target_name=None, target_lat=None, target_lon=None):  
-    start_coords = station_coords.get(start_name)  
-    target_coords = None  
-    if target_lat: target_coords = {"lat": target_lat, "lon": target_lon}  
-    elif target_name and target_name in station_coords: target_coords = station_coords[target_name]  
-      
-    if not start_coords or not target_coords:  
-        return {"error": "駅の場所が特定できません。"}  
+# 探索バックエンド:  
+#   "raptor" (時刻表RAPTOR: パレート集合) / "local" (時刻表CSA: 1駅) / "yahoo" (スクレイピング)  
+#   "auto" (raptorで答えられなければyahoo)  
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "auto")  
   
+def parse_search_time(current_time_str):  
+    """ "25:10" -> 検索日時(datetime) と 営業日の経過分(1510) """  
     now = datetime.now()  
     try:  
         h, m = map(int, current_time_str.split(':'))  
         target_date = now  
+        service_h = h  
         # 24時越え対応 (25:00 -> 明日の01:00)  
         if h >= 24:  
             h -= 24  
             target_date = now + timedelta(days=1)  
+        elif h < timetable.SERVICE_DAY_START_HOUR:  
+            service_h += 24  
           
         # 過去時刻補正は行わず、指定時刻で検索  
         search_dt = target_date.replace(hour=h, minute=m, second=0)  
     except:  
         search_dt = now  
+        service_h = now.hour if now.hour >= timetable.SERVICE_DAY_START_HOUR else now.hour + 24  
+        m = now.minute  
+    return search_dt, service_h * 60 + m  
   
-    print(f"🔎 Solving: {start_name} -> {target_name or 'Home'} @ {search_dt}")  
+def search_local(start_name, service_minutes, start_coords, target_coords):  
+    """  
+    時刻表(CSA)で到達できる駅のうち、目的地までのタクシー料金が最も安い駅 (同額なら近い駅) を返す。  
+    時刻表が無い・出発駅が時刻表に無い場合は None (=Yahoo!にフォールバック)  
+    """  
+    tt = timetable.get_timetable()  
+    if tt is None: return None  
+    reached = csa_engine.reachable_stations(tt, start_name, service_minutes)  
+    if reached is None: return None  
   
-    # 候補抽出  
-    candidates = []  
     total_dist = haversine_distance(start_coords, target_coords)  
-      
-    for name, coords in station_coords.items():  
-        if name == start_name: continue  
-        d_from_start = haversine_distance(start_coords, coords)  
+    best_station = None  
+    best_key = None  
+    for name, res in reached.items():  
+        coords = station_coords.get(name)  
+        if not coords: continue  
         d_to_goal = haversine_distance(coords, target_coords)  
-          
-        # 直進性チェック  
-        if (d_from_start + d_to_goal) < total_dist * 1.3:  
-            candidates.append({  
-                "name": name,  
-                "dist_start": d_from_start,  
-                "dist_goal": d_to_goal  
-            })  
-              
-    # 出発地から近い順  
-    candidates.sort(key=lambda x: x["dist_start"])  
+        if d_to_goal >= total_dist: continue # 出発地より遠ざかる駅は意味がない  
+        # 道路距離の表があれば道のりの料金で比べる (川の向こう側の駅は直線では近くても高い)  
+        key = (station_taxi_fare(name, d_to_goal, target_coords), d_to_goal, res["arr_min"], res["transfers"])  
+        if best_key is None or key < best_key:  
+            best_key = key  
+            best_station = {"station": name, "res": res, "dist": d_to_goal}  
+    print(f"  [local] reached {len(reached)} stations -> {best_station['station'] if best_station else 'None'}")  
+    return {"best_station": best_station}  
+  
+def search_pareto(start_name, service_minutes, start_coords, target_coords):  
+    """  
+    時刻表(RAPTOR)で (到着時刻, 乗換回数, タクシー料金) のパレート集合を求める。  
+    時刻表が無い・出発駅が時刻表に無い場合は None (=Yahoo!にフォールバック)  
+    """  
+    tt = timetable.get_timetable()  
+    if tt is None: return None  
+  
+    total_dist = haversine_distance(start_coords, target_coords)  
+    dists = {}  
+    def station_cost(name):  
+        coords = station_coords.get(name)  
+        if not coords: return None  
+        d_to_goal = haversine_distance(coords, target_coords)  
+        if d_to_goal >= total_dist: return None # 出発地より遠ざかる駅は意味がない  
+        dists[name] = d_to_goal  
+        return station_taxi_fare(name, d_to_goal, target_coords)  
+  
+    front = raptor_engine.pareto_search(tt, start_name, service_minutes, station_cost)  
+    if front is None: return None  
+    print(f"  [raptor] pareto front: {[(c['station'], c['arr'], c['transfers'], c['cost']) for c in front]}")  
+    return [{"station": c["station"], "res": c, "dist": dists[c["station"]]} for c in front]  
+  
+# 到達プロファイルの駅番号 -> 座標 (テーブルを初めて使うときに作る)  
+_table_coords = None  
+  
+def search_precomputed(start_name, service_minutes, start_coords, target_coords):  
+    """  
+    終電間際の到達プロファイル (build_last_reachable.py) を使って search_pareto と同じ答えを返す。  
+    RAPTOR は前計算済みなので、ここでは目的地までの料金でパレート集合を選ぶだけ。  
+    表に無い問い合わせ (出発駅・時刻が範囲外) は None (=その場で探索)  
+    """  
+    global _table_coords  
+    table = last_reachable.get_table()  
+    if table is None: return None  
+    labels = table.lookup(start_name, service_minutes)  
+    if labels is None: return None  
+    sid, transfers, arr, dep = labels  
+  
+    if _table_coords is None:  
+        nan = float("nan")  
+        _table_coords = (  
+            np.array([float(station_coords[n]["lat"]) if n in station_coords else nan for n in table.station_names]),  
+            np.array([float(station_coords[n]["lon"]) if n in station_coords else nan for n in table.station_names]),  
+        )  
+    total_dist = haversine_distance(start_coords, target_coords)  
+    d_to_goal = spatial_index.haversine_np(target_coords["lat"], target_coords["lon"], _table_coords[0][sid], _table_coords[1][sid])  
+    ok = d_to_goal < total_dist # 座標の無い駅(NaN)・出発地より遠ざかる駅は意味がない  
+    sid, transfers, arr, dep, d_to_goal = sid[ok], transfers[ok], arr[ok], dep[ok], d_to_goal[ok]  
+    cost = station_taxi_fare_np(table.station_names, sid, d_to_goal, target_coords)  
+  
+    stations = []  
+    for i in last_reachable.pareto_order(cost, transfers, arr):  
+        name = table.station_names[sid[i]]  
+        res = {  
+            "station": name,  
+            "dep": timetable.minutes_to_hhmm(int(dep[i])),  
+            "arr": timetable.minutes_to_hhmm(int(arr[i])),  
+            "arr_min": int(arr[i]),  
+            "transfers": int(transfers[i]),  
+            "cost": float(cost[i])  
+        }  
+        stations.append({"station": name, "res": res, "dist": float(d_to_goal[i])})  
+    print(f"  [table] pareto front: {[(c['station'], c['res']['arr'], c['res']['transfers'], c['res']['cost']) for c in stations]}")  
+    return stations  
+  
+# 直進性チェック: 出発地からの距離 + 目的地までの距離 が直線距離の1.3倍未満  
+DETOUR_RATIO = 1.3  
+MAX_CANDIDATES = 15  
+  
+def select_candidates(start_name, start_coords, target_coords):  
+    """ 直進性チェックを通った駅を出発地から近い順に返す (API制限対策で最大15駅程度に間引く) """  
+    total_dist = haversine_distance(start_coords, target_coords)  
+    limit = total_dist * DETOUR_RATIO  
+  
+    # どちらの端点からも limit 以上離れた駅は楕円に入らないので、その矩形内だけを見る  
+    ids = station_grid.query_radius_bbox([start_coords, target_coords], limit)  
+    lats, lons = station_grid.lats[ids], station_grid.lons[ids]  
+    d_from_start = spatial_index.haversine_np(start_coords["lat"], start_coords["lon"], lats, lons)  
+    d_to_goal = spatial_index.haversine_np(target_coords["lat"], target_coords["lon"], lats, lons)  
+  
+    mask = ((d_from_start + d_to_goal) < limit) & (ids != station_grid.ids.get(start_name, -1))  
+    ids, d_from_start, d_to_goal = ids[mask], d_from_start[mask], d_to_goal[mask]  
+    # 出発地から近い順 (同距離は従来どおり station_coords の順)  
+    order = np.argsort(d_from_start, kind="stable")  
       
     # API制限対策で間引く  
-    if len(candidates) > 15:  
-        step = len(candidates) // 15  
-        candidates = candidates[::step]  
+    if len(order) > MAX_CANDIDATES:  
+        step = len(order) // MAX_CANDIDATES  
+        order = order[::step]  
+  
+    candidates = []  
+    for k in order:  
+        candidates.append({  
+            "name": station_grid.names[ids[k]],  
+            "dist_start": float(d_from_start[k]),  
+            "dist_goal": float(d_to_goal[k])  
+        })  
+    return candidates  
+  
+def search_yahoo(start_name, search_dt, start_coords, target_coords):  
+    """ 直進性チェックで候補駅を絞り、Yahoo!乗換案内で二分探索する """  
+    with metrics.span("candidates"):  
+        candidates = select_candidates(start_name, start_coords, target_coords)  
           
     print(f"  Target Stations: {[c['name'] for c in candidates]}")  
   
+    if YAHOO_SEARCH_MODE == "speculative":  
+        return asyncio.run(search_yahoo_speculative(start_name, search_dt, candidates))  
+  
     # 二分探索  
     left = 0  
     right = len(candidates) - 1  
     best_station = None  
+    probes = 0  
       
     while left <= right:  
         mid = (left + right) // 2  
         target_cand = candidates[mid]  
+        probes += 1  
           
         print(f"  Checking: {target_cand['name']} ... ", end="")  
         res = fetch_yahoo_route(start_name, target_cand['name'], search_dt)  
@@ -203,10 +438,54 @@ def search_routes(start_name, current_time_str, target_name=None, target_lat=Non
             print("NG (Wait > 2h or No Route) ❌")  
             right = mid - 1  
   
+    metrics.PROBES_PER_SEARCH.observe(probes, mode="bisect")  
+    return best_station  
+  
+async def probe_yahoo_candidates(start_name, search_dt, candidates, client, width, concurrency, progress=None):  
+    """ 候補駅を speculative_bisect で調べる (width=1 なら逐次の二分探索と同じ) """  
+    async def probe(i):  
+        res = await fetch_yahoo_route_async(client, start_name, candidates[i]['name'], search_dt)  
+        print(f"  Checked: {candidates[i]['name']} ... {'OK ✅' if res else 'NG ❌'}")  
+        return res  
+  
+    return await speculative_search.speculative_bisect(len(candidates), probe, width, concurrency, progress)  
+  
+def to_best_station(candidates, idx, res):  
+    if idx < 0: return None  
+    return {  
+        "station": candidates[idx]['name'],  
+        "res": res,  
+        "dist": candidates[idx]['dist_goal']  
+    }  
+  
+async def search_yahoo_speculative(start_name, search_dt, candidates, client=None):  
+    """ 二分探索と同じ駅を、判定木を先読みした並列問い合わせで求める """  
+    own_client = client is None  
+    if own_client: client = make_async_client()  
+  
+    try:  
+        idx, res, launched = await probe_yahoo_candidates(  
+            start_name, search_dt, candidates, client, YAHOO_PROBE_WIDTH, YAHOO_MAX_CONCURRENCY)  
+    finally:  
+        if own_client: await client.aclose()  
+  
+    print(f"  [speculative] {launched} probes")  
+    metrics.PROBES_PER_SEARCH.observe(launched, mode="speculative")  
+    return to_best_station(candidates, idx, res)  
+  
+def resolve_coords(start_name, target_name, target_lat, target_lon):  
+    start_coords = station_coords.get(start_name)  
+    target_coords = None  
+    if target_lat: target_coords = {"lat": target_lat, "lon": target_lon}  
+    elif target_name and target_name in station_coords: target_coords = station_coords[target_name]  
+    return start_coords, target_coords  
+  
+def build_results(stations, start_name, start_coords, target_coords):  
+    total_dist = haversine_distance(start_coords, target_coords)  
     results = []  
       
-    if best_station:  
-        price = calculate_taxi_fare(best_station['dist'])  
+    for best_station in stations:  
+        price = station_taxi_fare(best_station['station'], best_station['dist'], target_coords)  
         results.append({  
             "station": best_station['station'],  
             "arrival_time": best_station['res']['arr'],  
@@ -215,14 +494,274 @@ def search_routes(start_name, current_time_str, target_name=None, target_lat=Non
             "taxi_price": price,  
             "last_stop_id": "LIMIT"  
         })  
-    else:  
+    # タクシー料金の安い順 (道のりで計算すると、目的地に近い順とは限らない)。同額なら元の順 (パレート集合の乗換・到着順)  
+    results.sort(key=lambda r: r["taxi_price"])  
+    if not results:  
         results.append({  
             "station": start_name,  
             "arrival_time": "移動不可",  
             "distance_to_target_km": round(total_dist, 2),  
             "route_count": 0,  
-            "taxi_price": calculate_taxi_fare(total_dist),  
+            "taxi_price": station_taxi_fare(start_name, total_dist, target_coords),  
             "last_stop_id": "START"  
         })  
   
-    return results  
\ No newline at end of file
+    return results  
+  
+def search_timetable(backend, start_name, service_minutes, start_coords, target_coords):  
+    """ 時刻表バックエンドで探索する。答えられなければ None """  
+    if backend in ("raptor", "auto"):  
+        precomputed = search_precomputed(start_name, service_minutes, start_coords, target_coords)  
+        if precomputed is not None: return precomputed  
+        return search_pareto(start_name, service_minutes, start_coords, target_coords)  
+    if backend == "local":  
+        local = search_local(start_name, service_minutes, start_coords, target_coords)  
+        if local is not None:  
+            return [local["best_station"]] if local["best_station"] else []  
+    return None  
+  
+def search_routes(start_name, current_time_str, target_name=None, target_lat=None, target_lon=None, backend=None):  
+    start_coords, target_coords = resolve_coords(start_name, target_name, target_lat, target_lon)  
+      
+    if not start_coords or not target_coords:  
+        return {"error": "駅の場所が特定できません。"}  
+  
+    search_dt, service_minutes = parse_search_time(current_time_str)  
+    backend = backend or SEARCH_BACKEND  
+  
+    print(f"🔎 Solving: {start_name} -> {target_name or 'Home'} @ {search_dt} [{backend}]")  
+    t0 = time.perf_counter()  
+  
+    with metrics.span("timetable"):  
+        stations = search_timetable(backend, start_name, service_minutes, start_coords, target_coords)  
+    source = "timetable"  
+    if stations is None:  
+        if backend in ("raptor", "local"):  
+            return {"error": "時刻表データにこの駅がありません。"}  
+        source = "yahoo"  
+        with metrics.span("yahoo"), outbound_scheduler.search_priority():  
+            best_station = search_yahoo(start_name, search_dt, start_coords, target_coords)  
+        stations = [best_station] if best_station else []  
+  
+    with metrics.span("build_results"):  
+        results = build_results(stations, start_name, start_coords, target_coords)  
+    metrics.SEARCH_SECONDS.observe(time.perf_counter() - t0, backend=source)  
+    return results  
+  
+# === 5. 非同期版の探索 (APIサーバー用) ===  
+# スレッドを塞がずに待つ版。1リクエストの締め切りを過ぎたら、それまでに確定した駅を返す。  
+  
+SEARCH_DEADLINE_SEC = float(os.environ.get("SEARCH_DEADLINE_SEC", "8"))  
+  
+# プロセス全体で共有するクライアント (イベントループごとに1つ)  
+_async_client = None  
+  
+def get_async_client():  
+    global _async_client  
+    if _async_client is None or _async_client.is_closed:  
+        _async_client = make_async_client()  
+    return _async_client  
+  
+async def close_async_client():  
+    global _async_client  
+    if _async_client is not None:  
+        await _async_client.aclose()  
+        _async_client = None  
+  
+async def search_yahoo_async(start_name, search_dt, start_coords, target_coords, deadline):  
+    """ 戻り値: (最良の駅 or None, 締め切りで打ち切ったか) """  
+    with metrics.span("candidates"):  
+        candidates = select_candidates(start_name, start_coords, target_coords)  
+    print(f"  Target Stations: {[c['name'] for c in candidates]}")  
+  
+    speculative = YAHOO_SEARCH_MODE == "speculative"  
+    width = YAHOO_PROBE_WIDTH if speculative else 1  
+    concurrency = YAHOO_MAX_CONCURRENCY if speculative else 1  
+    progress = {}  
+    partial = False  
+    remaining = deadline - asyncio.get_running_loop().time()  
+    try:  
+        await asyncio.wait_for(  
+            probe_yahoo_candidates(start_name, search_dt, candidates, get_async_client(), width, concurrency, progress),  
+            timeout=max(0.0, remaining),  
+        )  
+    except asyncio.TimeoutError:  
+        partial = True  
+        print(f"  ⏱️ Deadline exceeded after {progress.get('launched', 0)} probes")  
+    metrics.PROBES_PER_SEARCH.observe(progress.get("launched", 0), mode=YAHOO_SEARCH_MODE)  
+  
+    return to_best_station(candidates, progress.get("best_idx", -1), progress.get("best_res")), partial  
+  
+async def search_routes_async(start_name, current_time_str, target_name=None, target_lat=None, target_lon=None, backend=None, deadline_sec=None):  
+    """  
+    search_routes の非同期版。締め切り (deadline_sec, 既定 SEARCH_DEADLINE_SEC) で打ち切った場合は  
+    各候補に "partial": True を付けて、それまでに確定した最良の駅を返す  
+    """  
+    deadline = asyncio.get_running_loop().time() + (deadline_sec or SEARCH_DEADLINE_SEC)  
+    start_coords, target_coords = resolve_coords(start_name, target_name, target_lat, target_lon)  
+      
+    if not start_coords or not target_coords:  
+        return {"error": "駅の場所が特定できません。"}  
+  
+    search_dt, service_minutes = parse_search_time(current_time_str)  
+    backend = backend or SEARCH_BACKEND  
+  
+    print(f"🔎 Solving (async): {start_name} -> {target_name or 'Home'} @ {search_dt} [{backend}]")  
+  
+    t0 = time.perf_counter()  
+  
+    # 時刻表の探索はCPU処理 (初回は読み込みもある) なのでスレッドに逃がす  
+    stations = await metrics.to_thread("timetable", search_timetable, backend, start_name, service_minutes, start_coords, target_coords)  
+    partial = False  
+    source = "timetable"  
+    if stations is None:  
+        if backend in ("raptor", "local"):  
+            return {"error": "時刻表データにこの駅がありません。"}  
+        source = "yahoo"  
+        with metrics.span("yahoo"), outbound_scheduler.search_priority():  
+            best_station, partial = await search_yahoo_async(start_name, search_dt, start_coords, target_coords, deadline)  
+        stations = [best_station] if best_station else []  
+  
+    with metrics.span("build_results"):  
+        results = build_results(stations, start_name, start_coords, target_coords)  
+    if partial:  
+        for r in results: r["partial"] = True  
+    metrics.SEARCH_SECONDS.observe(time.perf_counter() - t0, backend=source)  
+    return results  
+  
+# === 6. 終電プロファイル (何時まで粘れるか) ===  
+# 目的駅ごとに「各駅から間に合う最終の出発時刻」を逆向きCSAで1回だけ求め、営業日ごとにキャッシュする。  
+  
+LATEST_CACHE_SIZE = int(os.environ.get("LATEST_CACHE_SIZE", "256"))  
+  
+_latest_cache = OrderedDict()  # (目的駅, 営業日) -> プロファイル  
+_latest_lock = threading.Lock()  
+  
+def search_latest_departures(target_name):  
+    """  
+    目的駅に間に合う各駅の最終出発時刻 {駅名: {"dep", "arr", "dep_min", "transfers"}} と営業日を返す。  
+    時刻表が無い・目的駅が時刻表に無い場合は {"error": ...}  
+    """  
+    tt = timetable.get_timetable()  
+    if tt is None: return {"error": "時刻表データがありません。"}  
+  
+    service_date = (datetime.now() - timedelta(hours=timetable.SERVICE_DAY_START_HOUR)).date().isoformat()  
+    key = (target_name, service_date)  
+    with _latest_lock:  
+        profile = _latest_cache.get(key)  
+        if profile is not None: _latest_cache.move_to_end(key)  
+    if profile is None:  
+        print(f"🔎 Latest departures: -> {target_name} ({service_date})")  
+        profile = csa_engine.latest_departure_profile(tt, target_name)  
+        if profile is None: return {"error": "時刻表データにこの駅がありません。"}  
+        with _latest_lock:  
+            _latest_cache[key] = profile  
+            while len(_latest_cache) > LATEST_CACHE_SIZE:  
+                _latest_cache.popitem(last=False)  
+    return {"service_date": service_date, "stations": profile}  
+# === 7. 到達できる駅の一覧 (地図用) ===  
+# 出発駅から今出て行ける全駅を、前向きCSAを1回なめて求める (目的地によらない)。  
+# 走査結果は (出発駅, 営業日, 時刻バケット) ごとにキャッシュし、目的地までのタクシー料金は問い合わせごとに付ける。  
+# バケットが2分以上のときは検索時刻をバケットの終わりに切り上げて走査する  
+# (遅く出るほど行ける駅は減るだけなので、行けない駅を「行ける」と出すことはない)。  
+  
+REACHABLE_CACHE_SIZE = int(os.environ.get("REACHABLE_CACHE_SIZE", "256"))  
+REACHABLE_BUCKET_MINUTES = int(os.environ.get("REACHABLE_BUCKET_MINUTES", "1"))  
+  
+_reachable_cache = OrderedDict()  # (出発駅, 営業日, バケット) -> 走査結果  
+_reachable_lock = threading.Lock()  
+_reachable_coords = (None, None)   # (時刻表, (緯度, 経度))  駅番号で引ける座標  
+  
+def _timetable_coords(tt):  
+    """ 時刻表の駅番号 -> 座標 (スナップショットに座標が無ければ station_coords から作る) """  
+    global _reachable_coords  
+    if _reachable_coords[0] is tt: return _reachable_coords[1]  
+    if tt.station_lat is not None:  
+        coords = (np.asarray(tt.station_lat, dtype=np.float64), np.asarray(tt.station_lon, dtype=np.float64))  
+    else:  
+        nan = float("nan")  
+        coords = (  
+            np.array([float(station_coords[n]["lat"]) if n in station_coords else nan for n in tt.station_names]),  
+            np.array([float(station_coords[n]["lon"]) if n in station_coords else nan for n in tt.station_names]),  
+        )  
+    _reachable_coords = (tt, coords)  
+    return coords  
+  
+def scan_reachable(tt, start_name, dep_min):  
+    """ 前向きCSA 1回ぶんの結果を配列で返す: (駅番号, 到着, 発車, 乗換回数) 到着の早い順。出発駅が無ければ None """  
+    origin_id = tt.station_ids.get(start_name)  
+    if origin_id is None: return None  
+    arrival, legs, first_dep = csa_engine.earliest_arrivals(tt, origin_id, dep_min)  
+    arrival = np.asarray(arrival, dtype=np.int64)  
+    sid = np.flatnonzero(arrival < csa_engine.INF)  
+    sid = sid[sid != origin_id]  
+    order = np.lexsort((sid, arrival[sid]))  
+    sid = sid[order]  
+    return sid, arrival[sid], np.asarray(first_dep, dtype=np.int64)[sid], np.asarray(legs, dtype=np.int64)[sid] - 1  
+  
+def search_reachable(start_name, current_time_str, target_lat=None, target_lon=None):  
+    """  
+    出発駅から行ける全駅を GeoJSON (FeatureCollection) で返す。  
+    目的地 (target_lat / target_lon) があれば、そこまでのタクシー料金の安い順 (同額は到着の早い順)。  
+    無ければ到着の早い順。時刻表が無い・出発駅が時刻表に無い場合は {"error": ...}  
+    """  
+    tt = timetable.get_timetable()  
+    if tt is None: return {"error": "時刻表データがありません。"}  
+  
+    search_dt, service_minutes = parse_search_time(current_time_str)  
+    bucket = -(-service_minutes // REACHABLE_BUCKET_MINUTES)  
+    scan_minutes = bucket * REACHABLE_BUCKET_MINUTES  
+    service_date = (search_dt - timedelta(hours=timetable.SERVICE_DAY_START_HOUR)).date().isoformat()  
+    key = (start_name, service_date, bucket)  
+    with _reachable_lock:  
+        scan = _reachable_cache.get(key)  
+        if scan is not None: _reachable_cache.move_to_end(key)  
+    if scan is None:  
+        print(f"🔎 Reachable: {start_name} @ {timetable.minutes_to_hhmm(scan_minutes)} ({service_date})")  
+        with metrics.span("reachable_scan"):  
+            scan = scan_reachable(tt, start_name, scan_minutes)  
+        if scan is None: return {"error": "時刻表データにこの駅がありません。"}  
+        with _reachable_lock:  
+            _reachable_cache[key] = scan  
+            while len(_reachable_cache) > REACHABLE_CACHE_SIZE:  
+                _reachable_cache.popitem(last=False)  
+  
+    sid, arr, dep, transfers = scan  
+    lats, lons = _timetable_coords(tt)  
+    lat, lon = lats[sid], lons[sid]  
+    located = ~np.isnan(lat)  # 座標の無い駅は地図に置けない  
+    sid, arr, dep, transfers, lat, lon = sid[located], arr[located], dep[located], transfers[located], lat[located], lon[located]  
+  
+    has_target = target_lat is not None and target_lon is not None  
+    target_coords = {"lat": target_lat, "lon": target_lon} if has_target else None  
+    if has_target:  
+        d_to_goal = spatial_index.haversine_np(target_lat, target_lon, lat, lon)  
+        fare = station_taxi_fare_np(tt.station_names, sid, d_to_goal, target_coords)  
+        order = np.lexsort((arr, fare))  
+    else:  
+        order = np.arange(len(sid))  
+  
+    features = []  
+    for i in order:  
+        props = {  
+            "station": tt.station_names[sid[i]],  
+            "dep": timetable.minutes_to_hhmm(int(dep[i])),  
+            "arr": timetable.minutes_to_hhmm(int(arr[i])),  
+            "transfers": int(transfers[i]),  
+        }  
+        if has_target:  
+            props["distance_to_target_km"] = round(float(d_to_goal[i]), 2)  
+            props["taxi_price"] = float(fare[i])  
+        features.append({  
+            "type": "Feature",  
+            "geometry": {"type": "Point", "coordinates": [round(float(lon[i]), 5), round(float(lat[i]), 5)]},  
+            "properties": props,  
+        })  
+  
+    collection = {"type": "FeatureCollection", "service_date": service_date,  
+                  "departure": timetable.minutes_to_hhmm(scan_minutes), "features": features}  
+    start_coords = station_coords.get(start_name)  
+    if has_target and start_coords:  
+        # 比較用: 今いる駅からそのままタクシーに乗った場合  
+        collection["start_taxi_price"] = station_taxi_fare(start_name, haversine_distance(start_coords, target_coords), target_coords)  
+    return collection  
\ No newline at end of file
@@ -0,0 +1,138 @@
+import timetable  
+  
+# === Connection Scan Algorithm (CSA) ===  
+# 出発時刻順に並んだ接続を1回なめるだけで、出発駅から全駅への最早到着時刻を求める。  
+  
+INF = 1 << 30  
+TRANSFER_MINUTES = 1      # 乗換に必要な最低時間  
+MAX_WAIT_MINUTES = 120    # 出発駅での待ち時間上限 (Yahoo!の判定と同じく2時間超は始発待ち)  
+MAX_JOURNEY_MINUTES = 300 # これ以上先の接続は見ない  
+  
+def earliest_arrivals(tt, origin_id, dep_min):  
+    """  
+    出発駅 origin_id を dep_min 以降に出たときの各駅の最早到着時刻を求める。  
+    戻り値: (arrival, legs, first_dep) いずれも駅IDで引けるリスト  
+      arrival[s]   : 最早到着時刻 (到達不可は INF)  
+      legs[s]      : そのときの乗車本数 (乗換回数 + 1)  
+      first_dep[s] : 出発駅を発車した時刻  
+    """  
+    n = len(tt.station_names)  
+    arrival = [INF] * n  
+    ready = [INF] * n      # 乗換時間込みで次の列車に乗れる時刻  
+    legs = [0] * n  
+    first_dep = [INF] * n  
+    arrival[origin_id] = dep_min  
+    ready[origin_id] = dep_min  
+  
+    conn_dep, conn_arr = tt.conn_dep, tt.conn_arr  
+    conn_from, conn_to, conn_trip = tt.conn_from, tt.conn_to, tt.conn_trip  
+    trip_state = {}  # 乗車済み列車 -> (乗車本数, 出発駅の発車時刻)  
+    last_board = dep_min + MAX_WAIT_MINUTES  
+    end = dep_min + MAX_JOURNEY_MINUTES  
+  
+    for i in range(tt.first_connection_at(dep_min), len(conn_dep)):  
+        d = conn_dep[i]  
+        if d > end: break  
+        t = conn_trip[i]  
+        state = trip_state.get(t)  
+        if state is None:  
+            f = conn_from[i]  
+            if ready[f] > d: continue  
+            if f == origin_id:  
+                if d > last_board: continue  
+                state = (1, d)  
+            else:  
+                state = (legs[f] + 1, first_dep[f])  
+            trip_state[t] = state  
+  
+        a = conn_arr[i]  
+        to = conn_to[i]  
+        if a < arrival[to] or (a == arrival[to] and state[0] < legs[to]):  
+            arrival[to] = a  
+            ready[to] = a + TRANSFER_MINUTES  
+            legs[to] = state[0]  
+            first_dep[to] = state[1]  
+  
+    return arrival, legs, first_dep  
+  
+def reachable_stations(tt, start_name, dep_min):  
+    """  
+    駅名ベースのラッパー。出発駅以外で到達できる駅を  
+    {駅名: {"dep", "arr", "transfers"}} で返す (fetch_yahoo_route と同じ形)。  
+    出発駅が時刻表に無ければ None  
+    """  
+    origin_id = tt.station_ids.get(start_name)  
+    if origin_id is None: return None  
+  
+    arrival, legs, first_dep = earliest_arrivals(tt, origin_id, dep_min)  
+    reached = {}  
+    for sid, a in enumerate(arrival):  
+        if a >= INF or sid == origin_id: continue  
+        reached[tt.station_names[sid]] = {  
+            "found": True,  
+            "dep": timetable.minutes_to_hhmm(first_dep[sid]),  
+            "arr": timetable.minutes_to_hhmm(a),  
+            "arr_min": a,  
+            "transfers": legs[sid] - 1  
+        }  
+    return reached  
+# === 逆向きの走査 (終電プロファイル) ===  
+# 接続を出発時刻の遅い順になめ、目的駅に間に合う「各駅の最終出発時刻」を1回で求める。  
+  
+def latest_departures(tt, target_id):  
+    """  
+    各駅から目的駅 target_id に着ける最も遅い出発時刻を求める。  
+    戻り値: (latest_dep, arrival, legs) いずれも駅IDで引けるリスト  
+      latest_dep[s] : 最終の出発時刻 (着けない駅は -1)  
+      arrival[s]    : そのとき目的駅に着く時刻  
+      legs[s]       : そのときの乗車本数 (乗換回数 + 1)  
+    """  
+    n = len(tt.station_names)  
+    latest_dep = [-1] * n  
+    arrival = [INF] * n  
+    legs = [0] * n  
+  
+    conn_dep, conn_arr = tt.conn_dep, tt.conn_arr  
+    conn_from, conn_to, conn_trip = tt.conn_from, tt.conn_to, tt.conn_trip  
+    trip_state = {}  # この先で目的駅に着ける列車 -> (目的駅の到着時刻, 乗車本数)  
+  
+    for i in range(len(conn_dep) - 1, -1, -1):  
+        t = conn_trip[i]  
+        to = conn_to[i]  
+        if to == target_id:  
+            state = (conn_arr[i], 1)  
+        elif t in trip_state:  
+            state = trip_state[t]  # そのまま乗り続ける  
+        elif conn_arr[i] + TRANSFER_MINUTES <= latest_dep[to]:  
+            state = (arrival[to], legs[to] + 1)  # 降りた駅で乗り換える  
+        else:  
+            continue  
+        if t not in trip_state: trip_state[t] = state  
+  
+        # 遅い順に見ているので、最初に見つかった接続がその駅の最終  
+        f = conn_from[i]  
+        if latest_dep[f] < 0 and f != target_id:  
+            latest_dep[f] = conn_dep[i]  
+            arrival[f], legs[f] = state  
+  
+    return latest_dep, arrival, legs  
+  
+def latest_departure_profile(tt, target_name):  
+    """  
+    駅名ベースのラッパー。目的駅に着ける駅を  
+    {駅名: {"dep", "arr", "dep_min", "transfers"}} で返す。目的駅が時刻表に無ければ None  
+    """  
+    target_id = tt.station_ids.get(target_name)  
+    if target_id is None: return None  
+  
+    latest_dep, arrival, legs = latest_departures(tt, target_id)  
+    profile = {}  
+    for sid, d in enumerate(latest_dep):  
+        if d < 0: continue  
+        profile[tt.station_names[sid]] = {  
+            "dep": timetable.minutes_to_hhmm(d),  
+            "arr": timetable.minutes_to_hhmm(arrival[sid]),  
+            "dep_min": d,  
+            "transfers": legs[sid] - 1  
+        }  
+    return profile  
\ No newline at end of file
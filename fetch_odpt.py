@@ -1,13 +1,12 @@
-import requests  
-import pandas as pd  
 import json  
 import os  
-import time  
 import math  # これが必須です  
+import http_crawler  
+import timetable_shards  
   
 # ==========================================  
 # ★ここにODPTのAPIキーを入れてください  
-API_KEY = "pvljcnxsfstd3z41mu5uiewsrryz36f5o66yn5axpmosqbt3jgm2ghn0boz5jsn3"  
+API_KEY = os.environ.get("ODPT_API_KEY", "pvljcnxsfstd3z41mu5uiewsrryz36f5o66yn5axpmosqbt3jgm2ghn0boz5jsn3")  
 # ==========================================  
     
       
@@ -22,7 +21,21 @@ TARGET_OPERATORS = [
     "odpt.Operator:YokohamaMunicipal", "odpt.Operator:MIR"  
 ]  
   
-API_BASE = "https://api.odpt.org/api/v4"  
+# ローカルの代替サーバーで試すときは ODPT_API_BASE=http://127.0.0.1:8001/api/v4 のように差し替える  
+API_BASE = os.environ.get("ODPT_API_BASE", "https://api.odpt.org/api/v4")  
+  
+# 取得した応答の保存先 (中断・再実行したときは、無いもの・変わったものだけ取り直す)  
+CACHE_DIR = os.environ.get("ODPT_CACHE_DIR", f"{DATA_DIR}/odpt_cache")  
+CACHE_MAX_AGE_SEC = int(os.environ.get("ODPT_CACHE_MAX_AGE_SEC", str(24 * 3600)))  # これより新しい応答は通信せずに使う  
+RATE_PER_SEC = float(os.environ.get("ODPT_RATE", "10"))       # 全スレッド合計のリクエスト数/秒  
+CONCURRENCY = int(os.environ.get("ODPT_CONCURRENCY", "8"))    # 同時接続数  
+RAILWAY_BATCH = 16  # TrainTimetable をまとめて取りに行く路線数 (応答を全部は抱えない)  
+  
+def make_crawler():  
+    return http_crawler.JsonCrawler(  
+        API_BASE, CACHE_DIR, rate=RATE_PER_SEC, concurrency=CONCURRENCY,  
+        max_age=CACHE_MAX_AGE_SEC, secret_params=["acl:consumerKey"],  
+    )  
   
 def safe_haversine(g1, g2):  
     try:  
@@ -42,8 +55,78 @@ def add_minutes(time_str, mins):
         return f"{h:02d}:{m:02d}:00"  
     except: return time_str  
   
+def train_station_ids(trains):  
+    return {stop.get("odpt:departureStation") or stop.get("odpt:arrivalStation")  
+            for train in trains for stop in train.get("odpt:trainTimetableObject", [])}  
+  
+def write_trains(writer, trains, station_map):  
+    """ Aプラン: TrainTimetable の各列車をそのまま書く """  
+    for train in trains:  
+        tid = train["owl:sameAs"]  
+        for i, stop in enumerate(train.get("odpt:trainTimetableObject", [])):  
+            sid = stop.get("odpt:departureStation") or stop.get("odpt:arrivalStation")  
+            t_str = stop.get("odpt:departureTime") or stop.get("odpt:arrivalTime")  
+            if sid and t_str and (sid in station_map):  
+                if len(t_str) == 5: t_str += ":00"  
+                writer.add(tid, station_map[sid], t_str, t_str, i+1)  
+  
+def write_station_tables(writer, targets, station_tables, station_map, station_geo_cache):  
+    """ Bプラン: 駅時刻表の各発車から「隣の駅までの1区間」を作って書く。戻り値: 区間数 """  
+    gen_count = 0  
+    # 駅ID -> 駅順での位置 (targets.index と同じく最初の位置)  
+    positions = {}  
+    for idx, sid in enumerate(targets): positions.setdefault(sid, idx)  
+    travel_cache = {}  # (位置, 向き) -> 隣の駅までの分  
+  
+    # 各駅についてループ  
+    for curr_idx, current_sid in enumerate(targets):  
+        if current_sid not in station_map: continue  
+          
+        try:  
+            st_tables = station_tables.get(current_sid)  
+            if st_tables is None: continue  
+              
+            for stt in st_tables:  
+                for obj in stt.get("odpt:stationTimetableObject", []):  
+                    dep_time = obj.get("odpt:departureTime")  
+                    if not dep_time: continue  
+                    if len(dep_time) == 5: dep_time += ":00"  
+                      
+                    dest = obj.get("odpt:destinationStation", [None])[0]  
+                    direction = 0  
+                    dest_idx = positions.get(dest) if dest else None  
+                    if dest_idx is not None:  
+                        if dest_idx > curr_idx: direction = 1  
+                        elif dest_idx < curr_idx: direction = -1  
+                      
+                    if direction == 0:  
+                        if curr_idx < len(targets) - 1: direction = 1  
+                        else: continue  
+  
+                    next_idx = curr_idx + direction  
+                    if 0 <= next_idx < len(targets):  
+                        next_sid = targets[next_idx]  
+                        if next_sid in station_map:  
+                            travel_min = travel_cache.get((curr_idx, direction))  
+                            if travel_min is None:  
+                                travel_min = 2  
+                                if current_sid in station_geo_cache and next_sid in station_geo_cache:  
+                                    dist = safe_haversine(station_geo_cache[current_sid], station_geo_cache[next_sid])  
+                                    travel_min = max(1, round((dist / 40) * 60))  
+                                travel_cache[(curr_idx, direction)] = travel_min  
+                              
+                            arr_time = add_minutes(dep_time, travel_min)  
+                            uid = f"t_{current_sid}_{dep_time}_{direction}"  
+                              
+                            writer.add(uid, station_map[current_sid], dep_time, dep_time, 1)  
+                            writer.add(uid, station_map[next_sid], arr_time, arr_time, 2)  
+                            gen_count += 1  
+        except: pass  
+    return gen_count  
+  
 def fetch_all_data():  
     print("🚀 ODPTから全路線のデータを取得します (確実性重視モード)...")  
+    crawler = make_crawler()  
       
     station_map = {}     # ID -> 漢字駅名  
     station_geo_cache = {} # ID -> {lat, lon}  
@@ -51,158 +134,105 @@ def fetch_all_data():
   
     # --- 1. 駅情報の取得 (事業者ごとに全件取得) ---  
     print("📡 駅定義を取得中...")  
-    for op in TARGET_OPERATORS:  
-        print(f"  ⏳ {op.split(':')[-1]} の駅を取得...", end="\r")  
-        try:  
-            # 事業者指定で全駅取る  
-            res = requests.get(f"{API_BASE}/odpt:Station", params={"acl:consumerKey": API_KEY, "odpt:operator": op})  
-            if res.status_code == 200:  
-                stations = res.json()  
-                for st in stations:  
-                    sid = st["owl:sameAs"]  
-                    title = st["dc:title"]  
-                    station_map[sid] = title  
-                    if "geo:lat" in st:  
-                        station_geo_cache[sid] = {"lat": st["geo:lat"], "lon": st["geo:long"]}  
-            else:  
-                print(f"  ❌ {op} 駅取得エラー: {res.status_code}")  
-        except Exception as e:  
-            print(f"  ❌ {op} 駅取得例外: {e}")  
-        time.sleep(0.1)  
+    # 事業者指定で全駅取る (事業者ごとに並列)  
+    jobs = [("odpt:Station", {"acl:consumerKey": API_KEY, "odpt:operator": op}) for op in TARGET_OPERATORS]  
+    for op, stations in zip(TARGET_OPERATORS, crawler.get_many(jobs)):  
+        if stations is None:  
+            print(f"  ❌ {op} 駅取得エラー")  
+            continue  
+        for st in stations:  
+            sid = st["owl:sameAs"]  
+            title = st["dc:title"]  
+            station_map[sid] = title  
+            if "geo:lat" in st:  
+                station_geo_cache[sid] = {"lat": st["geo:lat"], "lon": st["geo:long"]}  
       
     print(f"\n✅ 合計 {len(station_map)} 駅の定義をロードしました。")  
   
     # --- 2. 路線情報の取得 ---  
     print("📡 路線定義(駅順)を取得中...")  
-    for op in TARGET_OPERATORS:  
-        try:  
-            res = requests.get(f"{API_BASE}/odpt:Railway", params={"acl:consumerKey": API_KEY, "odpt:operator": op})  
-            if res.status_code == 200:  
-                for rw in res.json():  
-                    rid = rw["owl:sameAs"]  
-                    st_list = rw.get("odpt:stationOrder", [])  
-                    ordered_ids = [s["odpt:station"] if isinstance(s, dict) else s for s in st_list]  
-                    railway_map[rid] = ordered_ids  
-        except: pass  
+    jobs = [("odpt:Railway", {"acl:consumerKey": API_KEY, "odpt:operator": op}) for op in TARGET_OPERATORS]  
+    for railways in crawler.get_many(jobs):  
+        for rw in railways or []:  
+            rid = rw["owl:sameAs"]  
+            st_list = rw.get("odpt:stationOrder", [])  
+            ordered_ids = [s["odpt:station"] if isinstance(s, dict) else s for s in st_list]  
+            railway_map[rid] = ordered_ids  
       
     print(f"✅ {len(railway_map)} 路線の定義をロードしました。")  
   
     # --- 3. 時刻表データの生成 ---  
-    all_stop_times = []  
+    # 路線ごとのシャードに書く (timetable_shards.py)。ハッシュ = その路線の生の応答 + 使う駅の名前・座標 なので、  
+    # 応答が前回と同じ路線は作り直さない。行はメモリに溜めずに少しずつ書き出す (重複行はハッシュで弾く)  
+    builder = timetable_shards.ShardBuilder()  
+    railway_ids = list(railway_map.keys())  
+    train_tables = {}  
       
-    for rid, ordered_station_ids in railway_map.items():  
+    for pos, (rid, ordered_station_ids) in enumerate(railway_map.items()):  
         line_name = rid.split(':')[-1]  
           
-        # Aプラン: TrainTimetable  
-        trains_found = False  
-        try:  
-            # 平日のみ取得  
-            res = requests.get(f"{API_BASE}/odpt:TrainTimetable", params={  
-                "acl:consumerKey": API_KEY, "odpt:railway": rid, "odpt:calendar": "odpt.Calendar:Weekday"  
-            })  
-            if res.status_code == 200:  
-                trains = res.json()  
-                if len(trains) > 0:  
-                    trains_found = True  
-                    for train in trains:  
-                        tid = train["owl:sameAs"]  
-                        for i, stop in enumerate(train.get("odpt:trainTimetableObject", [])):  
-                            sid = stop.get("odpt:departureStation") or stop.get("odpt:arrivalStation")  
-                            t_str = stop.get("odpt:departureTime") or stop.get("odpt:arrivalTime")  
-                            if sid and t_str and (sid in station_map):  
-                                if len(t_str) == 5: t_str += ":00"  
-                                all_stop_times.append({  
-                                    "trip_id": tid, "stop_id": station_map[sid],  
-                                    "arrival_time": t_str, "departure_time": t_str, "stop_sequence": i+1  
-                                })  
-        except Exception as e:  
-            print(f"  ❌ Error fetching trains for {line_name}: {e}")  
+        # Aプラン: TrainTimetable (平日のみ。RAILWAY_BATCH 路線ずつ先回りして並列に取る)  
+        if rid not in train_tables:  
+            batch = railway_ids[pos:pos + RAILWAY_BATCH]  
+            jobs = [("odpt:TrainTimetable", {  
+                "acl:consumerKey": API_KEY, "odpt:railway": r, "odpt:calendar": "odpt.Calendar:Weekday"  
+            }) for r in batch]  
+            train_tables.update(zip(batch, crawler.get_many(jobs)))  
+        trains = train_tables.pop(rid)  
+        trains_found = bool(trains)  
   
         # Bプラン: StationTimetable  
+        station_tables = None  
         if not trains_found:  
-            gen_count = 0  
             # 駅リストがあれば、それに沿って取得  
-            if ordered_station_ids:  
-                targets = ordered_station_ids  
-            else:  
+            if not ordered_station_ids:  
                 # 路線図がない場合、station_mapにある駅のうち、路線IDが一致しそうなものを総当たり(非効率だが救済策)  
                 # 今回は station_map から逆引きは難しいのでスキップ  
                 print(f"  ⚠️ {line_name}: 路線図(駅順)が不明なためスキップ")  
                 continue  
   
-            # 各駅についてループ  
-            for curr_idx, current_sid in enumerate(targets):  
-                if current_sid not in station_map: continue  
-                  
+            # この路線の全駅の時刻表を並列に取得  
+            jobs = [("odpt:StationTimetable", {  
+                "acl:consumerKey": API_KEY,  
+                "odpt:station": sid,  
+                "odpt:railway": rid,  
+                "odpt:calendar": "odpt.Calendar:Weekday"  
+            }) for sid in ordered_station_ids if sid in station_map]  
+            station_tables = dict(zip([job[1]["odpt:station"] for job in jobs], crawler.get_many(jobs)))  
+  
+        used_ids = set(ordered_station_ids) | (train_station_ids(trains) if trains_found else set())  
+        digest = timetable_shards.content_hash(  
+            rid, ordered_station_ids, trains if trains_found else station_tables,  
+            {sid: [station_map.get(sid), station_geo_cache.get(sid)] for sid in used_ids},  
+        )  
+        if builder.reuse(rid, digest):  
+            print(f"  ♻️ {line_name}: 変更なし")  
+            continue  
+  
+        with builder.writer(rid, digest) as writer:  
+            if trains_found:  
                 try:  
-                    # この駅の時刻表を取得  
-                    res = requests.get(f"{API_BASE}/odpt:StationTimetable", params={  
-                        "acl:consumerKey": API_KEY,   
-                        "odpt:station": current_sid,   
-                        "odpt:railway": rid,  
-                        "odpt:calendar": "odpt.Calendar:Weekday"  
-                    })  
-                    if res.status_code != 200: continue  
-                      
-                    st_tables = res.json()  
-                    for stt in st_tables:  
-                        for obj in stt.get("odpt:stationTimetableObject", []):  
-                            dep_time = obj.get("odpt:departureTime")  
-                            if not dep_time: continue  
-                            if len(dep_time) == 5: dep_time += ":00"  
-                              
-                            dest = obj.get("odpt:destinationStation", [None])[0]  
-                            direction = 0  
-                            if dest and dest in targets:  
-                                dest_idx = targets.index(dest)  
-                                if dest_idx > curr_idx: direction = 1  
-                                elif dest_idx < curr_idx: direction = -1  
-                              
-                            if direction == 0:  
-                                if curr_idx < len(targets) - 1: direction = 1  
-                                else: continue  
-  
-                            next_idx = curr_idx + direction  
-                            if 0 <= next_idx < len(targets):  
-                                next_sid = targets[next_idx]  
-                                if next_sid in station_map:  
-                                    travel_min = 2  
-                                    if current_sid in station_geo_cache and next_sid in station_geo_cache:  
-                                        dist = safe_haversine(station_geo_cache[current_sid], station_geo_cache[next_sid])  
-                                        travel_min = max(1, round((dist / 40) * 60))  
-                                      
-                                    arr_time = add_minutes(dep_time, travel_min)  
-                                    uid = f"t_{current_sid}_{dep_time}_{direction}"  
-                                      
-                                    all_stop_times.append({  
-                                        "trip_id": uid, "stop_id": station_map[current_sid],  
-                                        "arrival_time": dep_time, "departure_time": dep_time, "stop_sequence": 1  
-                                    })  
-                                    all_stop_times.append({  
-                                        "trip_id": uid, "stop_id": station_map[next_sid],  
-                                        "arrival_time": arr_time, "departure_time": arr_time, "stop_sequence": 2  
-                                    })  
-                                    gen_count += 1  
-                    # 連続アクセス負荷軽減  
-                    # time.sleep(0.01)   
-                except: pass  
-              
-            if gen_count > 0:  
-                print(f"  ✅ {line_name}: {gen_count} 区間生成 (StationTimetable)")  
+                    write_trains(writer, trains, station_map)  
+                except Exception as e:  
+                    print(f"  ❌ Error fetching trains for {line_name}: {e}")  
+                print(f"  ✅ {line_name}: TrainTimetable 取得成功")  
             else:  
-                print(f"  ⚠️ {line_name}: データなし (API制限またはデータ未提供)")  
-        else:  
-            print(f"  ✅ {line_name}: TrainTimetable 取得成功")  
+                gen_count = write_station_tables(writer, ordered_station_ids, station_tables, station_map, station_geo_cache)  
+                if gen_count > 0:  
+                    print(f"  ✅ {line_name}: {gen_count} 区間生成 (StationTimetable)")  
+                else:  
+                    print(f"  ⚠️ {line_name}: データなし (API制限またはデータ未提供)")  
+  
+    crawler.close()  
+    print(f"📊 取得 {crawler.stats['fetched']} / キャッシュ {crawler.stats['cached']} / 未変更 {crawler.stats['not_modified']} / 再試行 {crawler.stats['retries']} / エラー {crawler.stats['errors']}")  
   
-    # 4. 保存  
-    if not all_stop_times:  
+    # 4. 保存 (マニフェストの差し替え)  
+    if not builder.rows:  
         print("❌ データが生成されませんでした。")  
         return  
   
-    print(f"\n💾 CSV保存中 ({len(all_stop_times)} 行)...")  
-    df = pd.DataFrame(all_stop_times)  
-    df = df.drop_duplicates()  
-    df.to_csv(f"{DATA_DIR}/stop_times.txt", index=False)  
+    changed = builder.commit()  
+    print(f"\n💾 {builder.manifest_path} ({builder.rows} 行, 作成 {builder.built} / 再利用 {builder.reused} 路線{'' if changed else ', 変更なし'})")  
     print("🎉 全路線のデータ構築が完了しました！")  
   
 if __name__ == "__main__":  
@@ -1,80 +1,105 @@
-import requests  
 import json  
 import pandas as pd  
 import time  
 import os  
+import functools  
 import pykakasi # 追加  
+import http_crawler  
+import station_asset  
   
 # 保存先  
 DATA_DIR = "data"  
 os.makedirs(DATA_DIR, exist_ok=True)  
   
+# HeartRails Express API (http_crawler.JsonCrawler で並列に取り、応答はディスクに保存して再実行時は通信しない)  
+# ローカルの代替サーバーで試すときは HEARTRAILS_API_BASE=http://127.0.0.1:8002/api のように差し替える  
+API_BASE = os.environ.get("HEARTRAILS_API_BASE", "https://express.heartrails.com/api")  
+CACHE_DIR = os.environ.get("HEARTRAILS_CACHE_DIR", f"{DATA_DIR}/heartrails_cache")  
+CACHE_MAX_AGE_SEC = int(os.environ.get("HEARTRAILS_CACHE_MAX_AGE_SEC", str(30 * 24 * 3600)))  # 駅はめったに変わらない  
+RATE_PER_SEC = float(os.environ.get("HEARTRAILS_RATE", "10"))     # 全スレッド合計のリクエスト数/秒 (旧: 1路線ごとに0.1秒待ち)  
+CONCURRENCY = int(os.environ.get("HEARTRAILS_CONCURRENCY", "4"))  # 同時接続数  
+  
 # 変換器の初期化  
 kks = pykakasi.kakasi()  
   
 # 対象エリア  
 PREFECTURES = ["東京都", "神奈川県", "埼玉県", "千葉県", "茨城県", "栃木県", "群馬県"]  
   
+@functools.lru_cache(maxsize=None)  
 def to_hiragana(text):  
-    """ 漢字をひらがなに変換する """  
+    """ 漢字をひらがなに変換する (同じ駅名は何路線にも出てくるので1回だけ変換する) """  
     result = kks.convert(text)  
     return "".join([item['hira'] for item in result])  
   
-def fetch_kanto_stations():  
+def make_crawler():  
+    return http_crawler.JsonCrawler(API_BASE, CACHE_DIR, rate=RATE_PER_SEC, concurrency=CONCURRENCY, max_age=CACHE_MAX_AGE_SEC)  
+  
+def response_items(data, key):  
+    """ {"response": {key: [...]}} の中身。エラー応答 ({"response": {"error": ...}}) や取得失敗なら None """  
+    try:  
+        return data['response'][key]  
+    except (TypeError, KeyError):  
+        return None  
+  
+def fetch_kanto_stations(crawler=None):  
     print("🚀 関東全域の駅データをダウンロード＆ひらがな変換中...")  
+    t0 = time.time()  
+    own_crawler = crawler is None  
+    crawler = crawler or make_crawler()  
       
     all_stations = []  
     seen_ids = set()   
   
-    for pref in PREFECTURES:  
-        print(f"📡 {pref} 取得中...")  
-          
-        # 1. 路線一覧  
-        url = "https://express.heartrails.com/api/json"  
-        try:  
-            res = requests.get(url, params={"method": "getLines", "prefecture": pref}).json()  
-            lines = res['response']['line']  
-        except:  
+    # 1. 路線一覧 (都県ごとに並列)。都県をまたぐ路線 (JR線など) は最初に出た1回だけ取る  
+    print(f"📡 {len(PREFECTURES)} 都県の路線一覧を取得中...")  
+    lines = []  
+    seen_lines = set()  
+    jobs = [("json", {"method": "getLines", "prefecture": pref}) for pref in PREFECTURES]  
+    for pref, res in zip(PREFECTURES, crawler.get_many(jobs)):  
+        pref_lines = response_items(res, 'line')  
+        if pref_lines is None:  
+            print(f"  ❌ {pref} 路線一覧の取得エラー")  
             continue  
+        for line in pref_lines:  
+            if line not in seen_lines:  
+                seen_lines.add(line)  
+                lines.append(line)  
   
-        for line in lines:  
-            # 2. 駅一覧  
-            try:  
-                res_st = requests.get(url, params={"method": "getStations", "line": line}).json()  
-                stations = res_st['response']['station']  
-            except:  
-                continue  
+    # 2. 駅一覧 (路線ごとに並列。結果は路線の順番どおりに返る)  
+    print(f"📡 {len(lines)} 路線の駅一覧を取得中...")  
+    jobs = [("json", {"method": "getStations", "line": line}) for line in lines]  
+    for line, res in zip(lines, crawler.get_many(jobs)):  
+        stations = response_items(res, 'station')  
+        if stations is None:  
+            print(f"  ❌ {line} 駅一覧の取得エラー")  
+            continue  
   
-            for st in stations:  
-                name = st['name']  
-                line_name = st['line']  
-                  
-                # ユニークID (駅名_路線名)  
-                # Backendの検索で使うIDと一致させる必要があります  
-                # 今回はシンプルに「駅名」をIDとしますが、同名駅（新宿のJRと小田急など）は  
-                # 本来区別すべきですが、検索の利便性重視で統合します  
-                  
-                # フロントエンド用データ作成  
-                # ひらがなを自動生成  
-                kana = to_hiragana(name)  
-                  
-                # 重複チェック（同じ駅名が別の路線で出てきても、リストには1つあれば良い場合と、分けたい場合がある）  
-                # ここでは「駅名+路線」をユニークキーとして全件保存します  
-                unique_key = f"{name}_{line_name}"  
-                  
-                if unique_key not in seen_ids:  
-                    all_stations.append({  
-                        "id": name,         # バックエンド検索用ID (漢字)  
-                        "n": name,          # 表示名  
-                        "k": kana,          # 検索用かな  
-                        "l": line_name,     # 路線名  
-                        "lat": float(st['y']),  
-                        "lon": float(st['x'])  
-                    })  
-                    seen_ids.add(unique_key)  
+        for st in stations:  
+            name = st['name']  
+            line_name = st['line']  
+              
+            # ユニークID (駅名_路線名)  
+            # Backendの検索で使うIDと一致させる必要があります  
+            # 今回はシンプルに「駅名」をIDとしますが、同名駅（新宿のJRと小田急など）は  
+            # 本来区別すべきですが、検索の利便性重視で統合します  
+              
+            # 重複チェック（同じ駅名が別の路線で出てきても、リストには1つあれば良い場合と、分けたい場合がある）  
+            # ここでは「駅名+路線」をユニークキーとして全件保存します  
+            unique_key = f"{name}_{line_name}"  
               
-            time.sleep(0.1) # マナー待機  
+            if unique_key not in seen_ids:  
+                all_stations.append({  
+                    "id": name,         # バックエンド検索用ID (漢字)  
+                    "n": name,          # 表示名  
+                    "k": to_hiragana(name),  # 検索用かな (自動生成)  
+                    "l": line_name,     # 路線名  
+                    "lat": float(st['y']),  
+                    "lon": float(st['x'])  
+                })  
+                seen_ids.add(unique_key)  
   
+    if own_crawler: crawler.close()  
+    print(f"  📊 {crawler.stats} / かな変換 {to_hiragana.cache_info().misses} 駅名 ({time.time() - t0:.1f}s)")  
     print(f"✅ 合計 {len(all_stations)} 駅のデータを生成しました！")  
     return all_stations  
   
@@ -94,6 +119,9 @@ if __name__ == "__main__":
     with open(f"{DATA_DIR}/stations_kanto.json", "w", encoding="utf-8") as f:  
         json.dump(frontend_data, f, ensure_ascii=False, separators=(',', ':'))  
     print(f"💾 {DATA_DIR}/stations_kanto.json (入力候補用)")  
+    # 配信用: 路線名を表引きにまとめ、gzip / brotli 済みの内容ハッシュ付きファイル (station_asset.py)  
+    asset_name, asset_sizes = station_asset.build_station_asset(f"{DATA_DIR}/stations_kanto.json")  
+    print(f"💾 {station_asset.ASSET_DIR}/{asset_name} ({', '.join(f'{k} {v / 1024:.1f} KB' for k, v in asset_sizes.items())})")  
   
     # 2. バックエンド用 (stops.txt)  
     # core_engine.py が読み込む  
@@ -1,27 +1,87 @@
-import pandas as pd  
 import json  
-import math  
 import os  
-from datetime import datetime, timedelta  
+import time  
+import numpy as np  
+from concurrent.futures import ProcessPoolExecutor  
+import timetable  
+import timetable_shards  
   
 DATA_DIR = "data"  
 INPUT_JSON = f"{DATA_DIR}/stations_kanto.json"  
-OUTPUT_TXT = f"{DATA_DIR}/stop_times.txt"  
+# 出力: 路線ごとのシャード + マニフェスト (timetable_shards.py)。入力 (駅リストと座標・下の設定) が  
+# 前回と同じ路線は作り直さない。CSVと同じ内容の mmap 用スナップショットも直接書く (compile_timetable.py 不要)  
+OUTPUT_BIN = timetable.TIMETABLE_BIN  
   
 START_HOUR = 5  
-END_HOUR = 25   
-INTERVAL_MINUTES = 12   
-TRAIN_SPEED_KMH = 45   
+END_HOUR = 25  
+INTERVAL_MINUTES = 12  
+TRAIN_SPEED_KMH = 45  
   
-def haversine(lat1, lon1, lat2, lon2):  
+def haversine_np(lat1, lon1, lat2, lon2):  
     R = 6371  
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)  
-    dphi = math.radians(lat2 - lat1)  
-    dlambda = math.radians(lon2 - lon1)  
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2  
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))  
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)  
+    dphi = np.radians(lat2 - lat1)  
+    dlambda = np.radians(lon2 - lon1)  
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2  
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))  
     return R * c  
   
+def minutes_str(minutes):  
+    """ 1510 -> "25:10:00" """  
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"  
+  
+_time_pairs = []  # 分 -> "着,発" の文字列 (ワーカーごとに1回だけ作る)  
+  
+def time_pair_table(max_minutes):  
+    while len(_time_pairs) <= max_minutes:  
+        t = minutes_str(len(_time_pairs))  
+        _time_pairs.append(f"{t},{t}")  
+    return _time_pairs  
+  
+def csv_field(value):  
+    """ csv.writer (QUOTE_MINIMAL) と同じ規則で1項目を書く """  
+    if any(c in value for c in ',"\r\n'): return '"' + value.replace('"', '""') + '"'  
+    return value  
+  
+def line_hash(line_name, st_list):  
+    """ シャードのハッシュ: 駅の並び・座標と、時刻の作り方の設定 """  
+    stops = [(s["n"], s.get('lat', 0), s.get('lon', 0)) for s in st_list]  
+    return timetable_shards.content_hash(line_name, stops, START_HOUR, END_HOUR, INTERVAL_MINUTES, TRAIN_SPEED_KMH)  
+  
+def generate_line(args):  
+    """  
+    1路線ぶんの全列車を作る。駅間の所要時間 (累積) は1回だけ計算し、  
+    全列車の時刻は「始発の発車分 (列) + 累積所要分 (行)」の配列の足し算で出す。  
+    戻り値: (CSV本文 (render=False なら None), [(方向の trip_id リスト, 駅名リスト, 時刻の2次元配列), ...])  
+    """  
+    line_name, st_list, render = args  
+    lat = np.array([s.get('lat', 0) for s in st_list], dtype=float)  
+    lon = np.array([s.get('lon', 0) for s in st_list], dtype=float)  
+    dist = haversine_np(lat[:-1], lon[:-1], lat[1:], lon[1:])  
+    travel = np.maximum(1, np.round((dist / TRAIN_SPEED_KMH) * 60)).astype(np.int64)  
+    first_departures = np.arange(START_HOUR * 60, END_HOUR * 60, INTERVAL_MINUTES)  
+  
+    names = [s["n"] for s in st_list]  
+    directions = []  
+    # A: 下り / B: 上り (上りは駅間の所要時間を逆順に積む)  
+    for kind, order, steps in (("D", names, travel), ("U", names[::-1], travel[::-1])):  
+        cumulative = np.concatenate([[0], np.cumsum(steps)])  
+        times = first_departures[:, None] + cumulative[None, :]  
+        trip_ids = [f"{line_name}_{kind}_{(m // 60) % 24:02d}{m % 60:02d}" for m in first_departures.tolist()]  
+        directions.append((trip_ids, order, times))  
+    if not render: return None, directions  
+  
+    # CSV本文。時刻の文字列 ("着,発") と「,駅名,」「,停車順\n」は1回ずつ作って連結するだけにする  
+    time_pairs = time_pair_table(int(max(t.max() for _, _, t in directions)))  
+    parts = []  
+    for trip_ids, order, times in directions:  
+        middles = [f",{csv_field(name)}," for name in order]  
+        tails = [f",{seq}\n" for seq in range(1, len(order) + 1)]  
+        for trip_id, row in zip(trip_ids, times.tolist()):  
+            head = csv_field(trip_id)  
+            parts.extend([head + mid + time_pairs[m] + tail for mid, m, tail in zip(middles, row, tails)])  
+    return "".join(parts), directions  
+  
 def generate_full_data():  
     print("🚀 関東全路線の時刻表データを生成します...")  
   
@@ -31,7 +91,7 @@ def generate_full_data():
   
     with open(INPUT_JSON, "r", encoding="utf-8") as f:  
         stations = json.load(f)  
-      
+  
     lines = {}  
     for s in stations:  
         line_name = s["l"]  
@@ -39,70 +99,44 @@ def generate_full_data():
             lines[line_name] = []  
         lines[line_name].append(s)  
   
-    all_stop_times = []  
-      
+    t0 = time.time()  
+    workers = int(os.environ.get("GENERATE_WORKERS", "0")) or os.cpu_count()  
+    builder = timetable_shards.ShardBuilder()  
+    jobs = []  
     for line_name, st_list in lines.items():  
         if len(st_list) < 2: continue  
-          
-        # 座標辞書  
-        coords = {s['n']: (s.get('lat',0), s.get('lon',0)) for s in st_list}  
-  
-        # A: 下り  
-        current_time = datetime(2000, 1, 1, START_HOUR, 0)  
-        end_time = datetime(2000, 1, 1, 0, 0) + timedelta(hours=END_HOUR)  
-          
-        while current_time < end_time:  
-            trip_id = f"{line_name}_D_{current_time.strftime('%H%M')}"  
-            train_time = current_time  
-              
-            for i, s in enumerate(st_list):  
-                travel_min = 0  
-                if i > 0:  
-                    prev = st_list[i-1]  
-                    dist = haversine(prev.get('lat',0), prev.get('lon',0), s.get('lat',0), s.get('lon',0))  
-                    travel_min = max(1, round((dist / TRAIN_SPEED_KMH) * 60))  
-                    train_time += timedelta(minutes=travel_min)  
-                  
-                day_diff = (train_time.date() - datetime(2000, 1, 1).date()).days  
-                h = train_time.hour + (24 * day_diff)  
-                # バグ修正: 秒まで含めない、またはコロンを確実に  
-                time_str = f"{h:02d}:{train_time.minute:02d}:00"  
-                  
-                all_stop_times.append({  
-                    "trip_id": trip_id, "stop_id": s["n"],   
-                    "arrival_time": time_str, "departure_time": time_str, "stop_sequence": i + 1  
-                })  
-            current_time += timedelta(minutes=INTERVAL_MINUTES)  
-  
-        # B: 上り  
-        current_time = datetime(2000, 1, 1, START_HOUR, 0)  
-        st_list_rev = st_list[::-1]  
-          
-        while current_time < end_time:  
-            trip_id = f"{line_name}_U_{current_time.strftime('%H%M')}"  
-            train_time = current_time  
-              
-            for i, s in enumerate(st_list_rev):  
-                travel_min = 0  
-                if i > 0:  
-                    prev = st_list_rev[i-1]  
-                    dist = haversine(prev.get('lat',0), prev.get('lon',0), s.get('lat',0), s.get('lon',0))  
-                    travel_min = max(1, round((dist / TRAIN_SPEED_KMH) * 60))  
-                    train_time += timedelta(minutes=travel_min)  
-                  
-                day_diff = (train_time.date() - datetime(2000, 1, 1).date()).days  
-                h = train_time.hour + (24 * day_diff)  
-                time_str = f"{h:02d}:{train_time.minute:02d}:00"  
-                  
-                all_stop_times.append({  
-                    "trip_id": trip_id, "stop_id": s["n"],  
-                    "arrival_time": time_str, "departure_time": time_str, "stop_sequence": i + 1  
-                })  
-            current_time += timedelta(minutes=INTERVAL_MINUTES)  
-  
-    print(f"💾 CSV保存中 ({len(all_stop_times)} 行)...")  
-    df = pd.DataFrame(all_stop_times)  
-    df.to_csv(OUTPUT_TXT, index=False)  
+        digest = line_hash(line_name, st_list)  
+        # 前回と同じ入力の路線はシャードをそのまま使う (スナップショット用に時刻の数値だけは作る)  
+        jobs.append((line_name, st_list, not builder.reuse(line_name, digest), digest))  
+  
+    if not any(render for _, _, render, _ in jobs):  
+        # どの路線も変わっていなければ、マニフェストもスナップショットも前回のまま  
+        changed = builder.commit()  
+        manifest = timetable.STOP_TIMES_MANIFEST  
+        if not changed and os.path.exists(OUTPUT_BIN) and os.path.getmtime(OUTPUT_BIN) >= os.path.getmtime(manifest):  
+            print(f"✅ 変更なし ({len(jobs)} 路線) {time.time() - t0:.1f}s")  
+            return  
+  
+    trips = []  
+    with ProcessPoolExecutor(workers) as pool:  
+        # 路線ごとにプロセスへ振り分け、届いた順 (= 路線順) に変わった路線のシャードを書く  
+        for (line_name, _, render, digest), (text, directions) in zip(jobs, pool.map(generate_line, [job[:3] for job in jobs], chunksize=8)):  
+            if render:  
+                builder.write_text(line_name, digest, text, sum(times.size for _, _, times in directions))  
+            for trip_ids, order, times in directions:  
+                trips.extend((trip_id, order, row, row) for trip_id, row in zip(trip_ids, times.tolist()))  
+    # 作り直した路線もマニフェスト上は元の順番に並べる  
+    order = {line_name: i for i, (line_name, _, _, _) in enumerate(jobs)}  
+    builder.shards.sort(key=lambda shard: order[shard["key"]])  
+    builder.commit()  
+    print(f"💾 {timetable.STOP_TIMES_MANIFEST} ({builder.rows} 行, {len(jobs)} 路線: 作成 {builder.built} / 再利用 {builder.reused}, {workers} workers) {time.time() - t0:.1f}s")  
+  
+    # 同じ内容のバイナリスナップショット (マニフェストの後に書くので、エンジンからは新しい方として読まれる)  
+    stops_path = timetable.STOPS_TXT if os.path.exists(timetable.STOPS_TXT) else None  
+    tt = timetable.timetable_from_trips(trips, stops_path)  
+    del trips  
+    size = timetable.write_snapshot(tt, OUTPUT_BIN)  
+    print(f"💾 {OUTPUT_BIN} ({size / 1024 / 1024:.1f} MB) {time.time() - t0:.1f}s")  
     print("🎉 完了！")  
   
 if __name__ == "__main__":  
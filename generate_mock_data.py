@@ -77,4 +77,6 @@ create_route("Chuo_Last", stops_chuo[:6], ["24:15"], times_chuo[:5])
   
 # 保存 (stops.txt は上書きしない！)  
 pd.DataFrame(stop_times).to_csv(f"{DATA_DIR}/stop_times.txt", index=False)  
-print("✅ stop_times.txt updated. (時刻表データのみ更新しました)")  
\ No newline at end of file
+print("✅ stop_times.txt updated. (時刻表データのみ更新しました)")  
+if os.path.exists(f"{DATA_DIR}/stop_times.manifest.json"):  
+    print("⚠️  data/stop_times.manifest.json があるとそちらが優先されます。モックを使うときは消してください。")  
\ No newline at end of file
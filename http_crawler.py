@@ -0,0 +1,151 @@
+import os  
+import json  
+import time  
+import random  
+import hashlib  
+import threading  
+from concurrent.futures import ThreadPoolExecutor  
+  
+# === 並列・再開可能な JSON API クローラ (fetch_odpt.py 用) ===  
+# - 1つの requests.Session (コネクションプール) を全スレッドで共有  
+# - 全スレッド合計で rate 件/秒 を超えないよう間隔を空ける  
+# - 接続エラー・429・5xx は指数バックオフ (+ゆらぎ) で再試行。Retry-After があれば従う  
+# - 成功した応答は cache_dir に1件1ファイルで保存する。中断・再実行しても  
+#   保存済みで新しいものは通信せず、古いものは ETag / Last-Modified で条件付きGETして  
+#   変わったものだけ取り直す (304 ならキャッシュを使う)  
+  
+RETRY_STATUS = {429, 500, 502, 503, 504}  
+  
+class RateLimiter:  
+    """ 全スレッド合計で rate 件/秒 まで (rate <= 0 なら無制限) """  
+  
+    def __init__(self, rate):  
+        self.interval = 1.0 / rate if rate > 0 else 0.0  
+        self.next_at = 0.0  
+        self.lock = threading.Lock()  
+  
+    def wait(self):  
+        if self.interval <= 0: return  
+        with self.lock:  
+            now = time.monotonic()  
+            at = max(now, self.next_at)  
+            self.next_at = at + self.interval  
+        if at > now: time.sleep(at - now)  
+  
+class JsonCrawler:  
+    def __init__(self, base_url, cache_dir, rate=10.0, concurrency=8, retries=4, backoff=0.5,  
+                 timeout=30, max_age=24 * 3600, secret_params=()):  
+        import requests  
+        from requests.adapters import HTTPAdapter  
+  
+        self.base_url = base_url.rstrip("/")  
+        self.cache_dir = cache_dir  
+        self.concurrency = concurrency  
+        self.retries = retries  
+        self.backoff = backoff  
+        self.timeout = timeout  
+        self.max_age = max_age                    # これより新しいキャッシュは通信せずに使う  
+        self.secret_params = set(secret_params)   # キャッシュのキーに含めない (APIキーなど)  
+        self.limiter = RateLimiter(rate)  
+        self.session = requests.Session()  
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)  
+        self.session.mount("http://", adapter)  
+        self.session.mount("https://", adapter)  
+        self.stats = {"fetched": 0, "cached": 0, "not_modified": 0, "retries": 0, "errors": 0}  
+        self._stats_lock = threading.Lock()  
+        os.makedirs(cache_dir, exist_ok=True)  
+  
+    def _count(self, name):  
+        with self._stats_lock:  
+            self.stats[name] += 1  
+  
+    def _cache_path(self, path, params):  
+        key = json.dumps([path, sorted((k, str(v)) for k, v in params.items() if k not in self.secret_params)], ensure_ascii=False)  
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()  
+        return os.path.join(self.cache_dir, digest[:2], digest + ".json")  
+  
+    def _read_cache(self, cache_path):  
+        try:  
+            with open(cache_path, "r", encoding="utf-8") as f:  
+                return json.load(f)  
+        except (OSError, ValueError):  
+            return None  
+  
+    def _write_cache(self, cache_path, entry):  
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)  
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"  
+        with open(tmp_path, "w", encoding="utf-8") as f:  
+            json.dump(entry, f, ensure_ascii=False)  
+        os.replace(tmp_path, cache_path)  
+  
+    def get_json(self, path, params=None):  
+        """ GET して JSON を返す。取れなければ None (エラーは stats に数える) """  
+        params = params or {}  
+        cache_path = self._cache_path(path, params)  
+        cached = self._read_cache(cache_path)  
+        if cached is not None and time.time() - cached["fetched_at"] < self.max_age:  
+            self._count("cached")  
+            return cached["data"]  
+  
+        headers = {}  
+        if cached is not None:  
+            if cached.get("etag"): headers["If-None-Match"] = cached["etag"]  
+            if cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]  
+  
+        res = self._request(path, params, headers)  
+        if res is None:  
+            self._count("errors")  
+            return cached["data"] if cached is not None else None  
+        if res.status_code == 304 and cached is not None:  
+            cached["fetched_at"] = time.time()  
+            self._write_cache(cache_path, cached)  
+            self._count("not_modified")  
+            return cached["data"]  
+        if res.status_code != 200:  
+            print(f"  ❌ {path} {res.status_code}")  
+            self._count("errors")  
+            return None  
+  
+        try:  
+            data = res.json()  
+        except ValueError:  
+            self._count("errors")  
+            return None  
+        self._write_cache(cache_path, {  
+            "fetched_at": time.time(),  
+            "etag": res.headers.get("ETag"),  
+            "last_modified": res.headers.get("Last-Modified"),  
+            "data": data,  
+        })  
+        self._count("fetched")  
+        return data  
+  
+    def _request(self, path, params, headers):  
+        """ 再試行つきの GET。再試行しても駄目なら最後の応答 (通信できなければ None) """  
+        import requests  
+  
+        res = None  
+        for attempt in range(self.retries + 1):  
+            if attempt > 0:  
+                self._count("retries")  
+                delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random())  
+                retry_after = res.headers.get("Retry-After") if res is not None else None  
+                if retry_after and retry_after.isdigit(): delay = max(delay, int(retry_after))  
+                time.sleep(delay)  
+            self.limiter.wait()  
+            try:  
+                res = self.session.get(f"{self.base_url}/{path}", params=params, headers=headers, timeout=self.timeout)  
+            except requests.RequestException as e:  
+                print(f"  ⚠️ {path}: {e}")  
+                res = None  
+                continue  
+            if res.status_code not in RETRY_STATUS: return res  
+        return res  
+  
+    def get_many(self, jobs):  
+        """ jobs: [(path, params), ...] を並列に取得し、同じ順で結果 (JSON or None) を返す """  
+        with ThreadPoolExecutor(self.concurrency) as pool:  
+            return list(pool.map(lambda job: self.get_json(*job), jobs))  
+  
+    def close(self):  
+        self.session.close()  
\ No newline at end of file
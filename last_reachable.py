@@ -0,0 +1,112 @@
+import os  
+import threading  
+import numpy as np  
+import timetable  
+from csa_engine import INF  
+  
+# === 終電間際の到達プロファイル (build_last_reachable.py が生成) ===  
+# 混雑する出発駅ごとに、出発時刻 23:00〜25:30 の1分刻みで RAPTOR を回した結果 (駅, 乗車本数, 到着, 発車) を  
+# 「(駅, 乗換回数) ごとの、出発時刻に対する階段関数」として持っておく。  
+# 目的地によらない部分だけを前計算しておき、問い合わせ時は目的地までの料金でパレート集合を選ぶだけにする  
+# (その場で RAPTOR を回すのと同じ結果になる)。  
+#  
+# ファイルは timetable.write_columns の形式 (magic "NGLR"):  
+#   station_names  : 駅名 ("\n" 連結, 'B')  
+#   meta           : [窓の開始分, 窓の終了分] ('i')  
+#   origins        : 出発駅の駅番号 ('I')  
+#   origin_keys    : 出発駅 -> key_* の範囲 ('I')  
+#   key_station / key_transfers : (駅, 乗換回数) の組  
+#   seg_code       : key番号 * 256 + 窓の先頭からの分。この分から次の段までは同じ結果 ('I', 昇順)  
+#   seg_arr / seg_dep : その段の到着時刻 / 出発駅の発車時刻 ('H', ABSENT = その時刻には着けない)  
+  
+LAST_REACHABLE_BIN = os.environ.get("LAST_REACHABLE_BIN", f"{timetable.DATA_DIR}/last_reachable.bin")  # 空なら使わない  
+TABLE_MAGIC = b"NGLR"  
+TABLE_VERSION = 1  
+  
+WINDOW_START = 23 * 60       # 23:00  
+WINDOW_END = 25 * 60 + 30    # 25:30 (= 翌1:30)  
+MINUTE_SLOTS = 256           # seg_code の分の桁 (窓の長さの上限)  
+ABSENT = 0xFFFF  
+  
+class LastReachableTable:  
+    def __init__(self, columns):  
+        self.station_names = bytes(columns["station_names"]).decode("utf-8").split("\n")  
+        self.window_start, self.window_end = columns["meta"]  
+        self.origin_rows = {self.station_names[sid]: i for i, sid in enumerate(columns["origins"])}  
+        # mmap 上の列をコピーせずに numpy で見る  
+        self.origin_keys = np.asarray(columns["origin_keys"])  
+        self.key_station = np.asarray(columns["key_station"])  
+        self.key_transfers = np.asarray(columns["key_transfers"])  
+        self.seg_code = np.asarray(columns["seg_code"])  
+        self.seg_arr = np.asarray(columns["seg_arr"])  
+        self.seg_dep = np.asarray(columns["seg_dep"])  
+        self._mmap = None  
+  
+    def lookup(self, start_name, service_minutes):  
+        """  
+        出発駅を service_minutes に出たときの到達ラベル (駅番号, 乗換回数, 到着時刻, 発車時刻) の配列。  
+        表に無い問い合わせ (出発駅・時刻が範囲外) なら None  
+        """  
+        o = self.origin_rows.get(start_name)  
+        if o is None: return None  
+        if not (self.window_start <= service_minutes <= self.window_end): return None  
+  
+        keys = np.arange(self.origin_keys[o], self.origin_keys[o + 1], dtype=np.int64)  
+        # 各 key の、その分を含む段 (どの key も窓の先頭に段があるので必ず見つかる)  
+        pos = np.searchsorted(self.seg_code, keys * MINUTE_SLOTS + (service_minutes - self.window_start), side="right") - 1  
+        arr = self.seg_arr[pos]  
+        found = arr != ABSENT  
+        return self.key_station[keys[found]], self.key_transfers[keys[found]], arr[found], self.seg_dep[pos[found]]  
+  
+def pareto_order(cost, transfers, arr):  
+    """  
+    raptor_engine.pareto_front の配列版。(費用, 乗換回数, 到着時刻) のどれも小さい方が良いとして、  
+    支配されない候補の添字を費用順で返す  
+    """  
+    order = np.lexsort((np.arange(len(cost)), arr, transfers, cost))  
+    t, a = transfers[order].astype(np.int64), arr[order].astype(np.int64)  
+    dominated = np.zeros(len(order), dtype=bool)  
+    for level in range(int(t.max(initial=-1)) + 1):  
+        # 乗換回数 level 以下の候補の、自分より前までの最早到着  
+        seen = np.minimum.accumulate(np.where(t <= level, a, INF))  
+        prev_min = np.concatenate([[INF], seen[:-1]])  
+        dominated |= (t == level) & (prev_min <= a)  
+    return order[~dominated]  
+  
+def load_table(path=LAST_REACHABLE_BIN):  
+    print(f"📂 Mapping last-reachable table {path} ...")  
+    mm, columns = timetable.map_columns(path, TABLE_MAGIC, TABLE_VERSION)  
+    table = LastReachableTable(columns)  
+    table._mmap = mm  
+    print(f"✅ Mapped {len(table.origin_rows)} origins / {len(table.key_station)} keys / {len(table.seg_code)} steps.")  
+    return table  
+  
+# プロセス内で1回だけ読み込む  
+_table = None  
+_table_loaded = False  
+_table_lock = threading.Lock()  
+  
+def _table_is_fresh():  
+    """ テーブルがあり、元の時刻表より新しいか """  
+    if not LAST_REACHABLE_BIN or not os.path.exists(LAST_REACHABLE_BIN): return False  
+    for source in (timetable.stop_times_source(), timetable.TIMETABLE_BIN):  
+        if os.path.exists(source) and os.path.getmtime(LAST_REACHABLE_BIN) < os.path.getmtime(source):  
+            print(f"⚠️ {LAST_REACHABLE_BIN} is older than {source}. Run build_last_reachable.py")  
+            return False  
+    return True  
+  
+def get_table():  
+    """ 読み込み済みのテーブルを返す。無ければ None (= 毎回その場で探索する) """  
+    global _table, _table_loaded  
+    if _table_loaded:  
+        return _table  
+    with _table_lock:  
+        if not _table_loaded:  
+            try:  
+                if _table_is_fresh():  
+                    _table = load_table(LAST_REACHABLE_BIN)  
+            except Exception as e:  
+                print(f"❌ Last-reachable Table Load Error: {e}")  
+                _table = None  
+            _table_loaded = True  
+    return _table  
\ No newline at end of file
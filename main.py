@@ -1,10 +1,16 @@
-from fastapi import FastAPI  
-from fastapi.responses import FileResponse  
-from fastapi.staticfiles import StaticFiles # これを使います  
-from pydantic import BaseModel  
+from fastapi import FastAPI, Request  
+from fastapi.responses import FileResponse, JSONResponse, Response, PlainTextResponse  
+from pydantic import BaseModel, Field  
 from fastapi.middleware.cors import CORSMiddleware  
 import core_engine  
+import route_cache  
+import station_suggest  
+import station_asset  
+import metrics  
 import os  
+import json  
+import gzip  
+import asyncio  
 from typing import Optional  
   
 app = FastAPI(title="Never!諦めない案内 API")  
@@ -17,16 +23,28 @@ app.add_middleware(
     allow_headers=["*"],  
 )  
   
-# === ★ここが修正ポイント: dataフォルダの中身を配信できるようにする ===  
-# これがないと stations_kanto.json が読み込めません  
-app.mount("/data", StaticFiles(directory="data"), name="data")  
-  
 class SearchRequest(BaseModel):  
     start_station: str  
     target_station: str  
     current_time: str  
     target_lat: Optional[float] = None  
     target_lon: Optional[float] = None  
+    deadline_sec: Optional[float] = Field(None, gt=0)  # 検索の締め切り (秒)。超えたらそこまでの結果を返す  
+    debug: bool = False  # True なら段階ごとの所要時間 (trace) を応答に付ける  
+  
+class ReachableRequest(BaseModel):  
+    start_station: str  
+    current_time: str  
+    target_lat: Optional[float] = None  # 自宅など。あればタクシー料金の安い順に並べる  
+    target_lon: Optional[float] = None  
+  
+class LatestRequest(BaseModel):  
+    target_station: str  
+    start_station: Optional[str] = None  # 省略時は目的駅に間に合う全駅を返す  
+  
+@app.on_event("shutdown")  
+async def shutdown():  
+    await core_engine.close_async_client()  
   
 # --- 個別ファイルの配信設定 ---  
 @app.get("/")  
@@ -44,31 +62,123 @@ def read_favicon():
     if os.path.exists("icon.png"): return FileResponse("icon.png", media_type="image/png")  
     return FileResponse("index.html")  
   
+# --- data フォルダからは駅データ (古い画面が読む stations_kanto.json) だけを配信する ---  
+# data/ には時刻表のスナップショットなど大きな生成物もあるので、フォルダごとは公開しない  
+@app.get("/data/stations_kanto.json")  
+def read_stations_json():  
+    if os.path.exists(station_asset.STATIONS_JSON): return FileResponse(station_asset.STATIONS_JSON, media_type="application/json")  
+    return JSONResponse({"error": "not found"}, status_code=404)  
+  
+# --- 駅データ (内容ハッシュ付きファイル名・圧縮済み。station_asset.py が作る) ---  
+# /assets/stations.json は「今のファイル名」だけを返す (毎回確認させる)。  
+# /assets/stations.<ハッシュ>.json は中身が変わらないので、1年間 immutable でキャッシュさせる  
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"  
+  
+@app.get("/assets/stations.json")  
+def read_station_asset_pointer(request: Request):  
+    current = station_asset.current_asset()  
+    if current is None:  
+        return JSONResponse({"error": "not found"}, status_code=404)  
+    headers = {"ETag": f'"{current["hash"]}"', "Cache-Control": "no-cache"}  
+    if request.headers.get("if-none-match") == headers["ETag"]:  
+        return Response(status_code=304, headers=headers)  
+    return JSONResponse({"url": f"/assets/{current['file']}", "hash": current["hash"]}, headers=headers)  
+  
+@app.get("/assets/{name}")  
+def read_station_asset(name: str, request: Request):  
+    variant = station_asset.select_variant(name, request.headers.get("accept-encoding"))  
+    if variant is None:  
+        return JSONResponse({"error": "not found"}, status_code=404)  
+    path, encoding, etag = variant  
+    headers = {"ETag": etag, "Cache-Control": ASSET_CACHE_CONTROL, "Vary": "Accept-Encoding"}  
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:  
+        return Response(status_code=304, headers=headers)  
+    if encoding: headers["Content-Encoding"] = encoding  
+    return FileResponse(path, media_type="application/json", headers=headers)  
+  
+# --- 同一リクエストのまとめ (single-flight) ---  
+# 運休時などに同じ条件の検索が一斉に来たら、最初の1件だけ検索して残りはその結果を待つ  
+COALESCE_ROUND_MINUTES = int(os.environ.get("COALESCE_ROUND_MINUTES", "1"))  
+  
+MAX_DEADLINE_SEC = 30  
+  
+_inflight = {}  # key -> 実行中の検索タスク (イベントループ上でのみ触るのでロック不要)  
+coalesce_stats = {"requests": 0, "leaders": 0, "coalesced": 0}  
+  
+def normalize_request(req):  
+    """  
+    検索条件を正規化する (駅名の「駅」を外す・時刻を丸める・座標を約10mに丸める)。  
+    まとめた検索は丸めた時刻で行うので、時刻は切り上げる (切り捨てると、もう出た列車を案内してしまう)  
+    """  
+    start = route_cache.normalize_station(req.start_station)  
+    target = route_cache.normalize_station(req.target_station)  
+    current_time = req.current_time.strip()  
+    try:  
+        h, m = map(int, current_time.split(':'))  
+        minutes = -(-(h * 60 + m) // COALESCE_ROUND_MINUTES) * COALESCE_ROUND_MINUTES  
+        # 3:58 -> 4:00 だと営業日が変わってしまうので、営業日の始まりをまたぐときは丸めない  
+        if h * 60 + m < route_cache.SERVICE_DAY_START_HOUR * 60 <= minutes: minutes = h * 60 + m  
+        current_time = f"{minutes // 60}:{minutes % 60:02d}"  
+    except ValueError:  
+        pass  
+    target_lat = round(req.target_lat, 4) if req.target_lat is not None else None  
+    target_lon = round(req.target_lon, 4) if req.target_lon is not None else None  
+    return (start, target, current_time, target_lat, target_lon)  
+  
+async def coalesced(key, make_coro):  
+    """ 同じ key の検索が実行中ならその結果を待ち、無ければ自分で開始する """  
+    coalesce_stats["requests"] += 1  
+    task = _inflight.get(key)  
+    if task is None:  
+        coalesce_stats["leaders"] += 1  
+        task = asyncio.ensure_future(make_coro())  
+        _inflight[key] = task  
+        task.add_done_callback(lambda _: _inflight.pop(key, None))  
+    else:  
+        coalesce_stats["coalesced"] += 1  
+    # 先頭のリクエストが切断されても、待っている他のリクエストのために検索は続ける  
+    return await asyncio.shield(task)  
+  
 # --- 検索API ---  
 @app.post("/search")  
-def search_route(req: SearchRequest):  
-    results = core_engine.search_routes(  
-        start_name=req.start_station,  
-        current_time_str=req.current_time,  
-        target_name=req.target_station,  
-        target_lat=req.target_lat,  
-        target_lon=req.target_lon  
+async def search_route(req: SearchRequest):  
+    start, target, current_time, target_lat, target_lon = normalize_request(req)  
+    deadline_sec = min(req.deadline_sec, MAX_DEADLINE_SEC) if req.deadline_sec else None  
+    # 締め切りの短い検索の途中結果 (partial) を、長く待てる検索に渡さないよう締め切りもキーに入れる  
+    key = (start, target, current_time, target_lat, target_lon, deadline_sec)  
+    make_search = lambda: core_engine.search_routes_async(  
+        start_name=start,  
+        current_time_str=current_time,  
+        target_name=target,  
+        target_lat=target_lat,  
+        target_lon=target_lon,  
+        deadline_sec=deadline_sec  
     )  
+    trace = None  
+    if req.debug:  
+        # 他の検索の結果を待つとトレースが取れないので、debug のときはまとめずに自分で検索する  
+        trace = metrics.start_trace()  
+        results = await make_search()  
+    else:  
+        results = await coalesced(key, make_search)  
       
     if isinstance(results, dict) and "error" in results:  
-        return {  
+        response = {  
             "status": "error",  
             "message": results["error"],  
             "candidates": []  
         }  
+        if trace is not None: response["trace"] = trace.to_list()  
+        return response  
       
+    partial = any(r.get("partial") for r in results)  
     is_reachable = False  
     if results:  
         top = results[0]  
         if top["distance_to_target_km"] < 1.0:  
             is_reachable = True  
   
-    return {  
+    response = {  
         "status": "success",  
         "is_target_reachable": is_reachable,  
         "search_condition": {  
@@ -77,5 +187,102 @@ def search_route(req: SearchRequest):
             "time": req.current_time  
         },  
         "candidates": results,  
-        "message": "検索完了しました"  
-    }  
\ No newline at end of file
+        "partial": partial,  
+        "message": "時間内に探索が終わらなかったため、途中までの結果です" if partial else "検索完了しました"  
+    }  
+    if trace is not None: response["trace"] = trace.to_list()  
+    return response  
+  
+# --- 終電プロファイルAPI (何時まで粘れるか) ---  
+@app.post("/latest")  
+async def latest_departures(req: LatestRequest):  
+    target = route_cache.normalize_station(req.target_station)  
+    profile = await asyncio.to_thread(core_engine.search_latest_departures, target)  
+  
+    if "error" in profile:  
+        return {  
+            "status": "error",  
+            "message": profile["error"],  
+            "departures": []  
+        }  
+  
+    stations = profile["stations"]  
+    if req.start_station:  
+        start = route_cache.normalize_station(req.start_station)  
+        stations = {start: stations[start]} if start in stations else {}  
+    # 遅くまで粘れる駅から順に並べる  
+    departures = []  
+    for name, res in sorted(stations.items(), key=lambda x: -x[1]["dep_min"]):  
+        departures.append({  
+            "station": name,  
+            "latest_departure": res["dep"],  
+            "arrival_time": res["arr"],  
+            "route_count": res["transfers"] + 1  
+        })  
+  
+    return {  
+        "status": "success",  
+        "target": req.target_station,  
+        "service_date": profile["service_date"],  
+        "departures": departures,  
+        "message": "検索完了しました" if departures else "目的地に間に合う列車がありません"  
+    }  
+  
+# --- 到達できる駅の一覧API (地図用 GeoJSON) ---  
+# 全駅ぶんだと数百KBになるので、受け取れるなら gzip で返す  
+REACHABLE_GZIP_MIN_BYTES = 1024  
+  
+@app.post("/reachable")  
+async def reachable_stations(req: ReachableRequest, request: Request):  
+    start = route_cache.normalize_station(req.start_station)  
+    collection = await metrics.to_thread("reachable", core_engine.search_reachable,  
+                                         start, req.current_time.strip(), req.target_lat, req.target_lon)  
+  
+    if "error" in collection:  
+        return {  
+            "status": "error",  
+            "message": collection["error"],  
+            "type": "FeatureCollection",  
+            "features": []  
+        }  
+  
+    collection["status"] = "success"  
+    collection["start"] = req.start_station  
+    body = json.dumps(collection, ensure_ascii=False, separators=(",", ":")).encode("utf-8")  
+    headers = {"Vary": "Accept-Encoding"}  
+    if len(body) >= REACHABLE_GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):  
+        body = gzip.compress(body, compresslevel=5)  
+        headers["Content-Encoding"] = "gzip"  
+    return Response(body, media_type="application/geo+json", headers=headers)  
+  
+# --- 駅名の入力候補API (漢字 / かなの前方一致) ---  
+@app.get("/suggest")  
+async def suggest_stations(q: str = "", limit: int = station_suggest.DEFAULT_LIMIT):  
+    index = station_suggest.get_index()  
+    if index is None:  
+        return {"status": "error", "message": "駅データがありません", "stations": []}  
+    limit = max(1, min(limit, station_suggest.MAX_LIMIT))  
+    return {"status": "success", "query": q, "stations": index.suggest(q, limit)}  
+  
+# --- 稼働状況 ---  
+@app.get("/stats")  
+def read_stats():  
+    coalesce = dict(coalesce_stats, inflight=len(_inflight))  
+    return {"route_cache": route_cache.stats(), "coalesce": coalesce, "outbound": {"yahoo": core_engine.yahoo_scheduler.stats()}}  
+  
+# --- Prometheus 形式の指標 (このワーカーの値) ---  
+@app.get("/metrics")  
+def read_metrics():  
+    cache = route_cache.stats()  
+    extra = []  
+    extra += metrics.gauge_lines("ngu_route_cache_events_total", "Route cache lookups and stores since start",  
+                                 [({"event": k}, cache[k]) for k in ("l1_hit", "l2_hit", "negative_hit", "miss", "store", "negative_store")],  
+                                 kind="counter")  
+    extra += metrics.gauge_lines("ngu_route_cache_hit_rate", "Route cache hit rate since start", [({}, cache["hit_rate"])])  
+    extra += metrics.gauge_lines("ngu_route_cache_l1_size", "Entries in the in-process route cache", [({}, cache["l1_size"])])  
+    extra += metrics.gauge_lines("ngu_search_coalesce_total", "Coalesced search requests since start",  
+                                 [({"kind": k}, v) for k, v in coalesce_stats.items()], kind="counter")  
+    extra += metrics.gauge_lines("ngu_search_inflight", "Searches running now", [({}, len(_inflight))])  
+    extra += metrics.gauge_lines("ngu_outbound_queue_depth", "Outbound requests waiting for the rate limit",  
+                                 [({"target": "yahoo"}, core_engine.yahoo_scheduler.queue_depth())])  
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")  
\ No newline at end of file
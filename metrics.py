@@ -0,0 +1,151 @@
+import os  
+import time  
+import asyncio  
+import threading  
+import contextvars  
+from contextlib import contextmanager  
+  
+# === 処理時間の計測 (スパン) と Prometheus 形式の集計 (/metrics) ===  
+# 検索の各段階 (候補駅の抽出・マナー待機・通信・HTML解析・スレッドプールの待ち など) を  
+#   with metrics.span("parse"): ...  
+# で囲むと、段階ごとの所要時間がヒストグラム ngu_stage_seconds{stage="parse"} に入る。  
+# リクエスト側で start_trace() しておけば、同じリクエストの中 (別タスク・to_thread 先も含む) の  
+# スパンがそのトレースにも記録される (/search の debug: true で応答に付ける)。  
+# 集計はプロセスごと (uvicorn のワーカーが複数なら、/metrics はそのリクエストを受けたワーカーの値)。  
+# 各行には worker="<pid>" を付けるので、複数ワーカーの値は足し合わせればよい。  
+  
+WORKER = str(os.getpid())  
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  
+  
+_registry = []  
+_lock = threading.Lock()  
+  
+def _label_str(names, values, extra=()):  
+    pairs = [(k, v) for k, v in zip(names, values)] + list(extra)  
+    if not pairs: return ""  
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"  
+  
+def _fmt(value):  
+    if value == float("inf"): return "+Inf"  
+    return repr(float(value)) if isinstance(value, float) else str(value)  
+  
+class Counter:  
+    def __init__(self, name, help, labels=()):  
+        self.name, self.help, self.labels = name, help, tuple(labels)  
+        self.values = {}  
+        _registry.append(self)  
+  
+    def inc(self, amount=1, **labels):  
+        key = tuple(labels.get(k, "") for k in self.labels)  
+        with _lock:  
+            self.values[key] = self.values.get(key, 0) + amount  
+  
+    def render(self):  
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]  
+        for key, value in sorted(self.values.items()):  
+            lines.append(f"{self.name}{_label_str(self.labels, key, [('worker', WORKER)])} {_fmt(value)}")  
+        return lines  
+  
+class Histogram:  
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):  
+        self.name, self.help, self.labels = name, help, tuple(labels)  
+        self.buckets = tuple(buckets) + (float("inf"),)  
+        self.values = {}  # ラベル -> [各バケットの件数..., 合計, 件数]  
+        _registry.append(self)  
+  
+    def observe(self, value, **labels):  
+        key = tuple(labels.get(k, "") for k in self.labels)  
+        with _lock:  
+            v = self.values.get(key)  
+            if v is None: v = self.values[key] = [0] * len(self.buckets) + [0.0, 0]  
+            for i, b in enumerate(self.buckets):  
+                if value <= b:  
+                    v[i] += 1  
+                    break  
+            v[-2] += value  
+            v[-1] += 1  
+  
+    def render(self):  
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]  
+        for key, v in sorted(self.values.items()):  
+            cumulative = 0  
+            for b, n in zip(self.buckets, v):  
+                cumulative += n  
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', _fmt(b)), ('worker', WORKER)])} {cumulative}")  
+            base = _label_str(self.labels, key, [("worker", WORKER)])  
+            lines.append(f"{self.name}_sum{base} {_fmt(v[-2])}")  
+            lines.append(f"{self.name}_count{base} {v[-1]}")  
+        return lines  
+  
+def gauge_lines(name, help, samples, kind="gauge"):  
+    """ その場で値を読むゲージ。samples: [({ラベル}, 値), ...]。起動からの累計なら kind="counter" (名前は _total で終える) """  
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]  
+    for labels, value in samples:  
+        lines.append(f"{name}{_label_str(labels.keys(), labels.values(), [('worker', WORKER)])} {_fmt(value)}")  
+    return lines  
+  
+def render(extra_lines=()):  
+    """ Prometheus のテキスト形式 (text/plain; version=0.0.4) """  
+    with _lock:  
+        lines = [line for metric in _registry for line in metric.render()]  
+    return "\n".join(lines + list(extra_lines)) + "\n"  
+  
+# --- 検索まわりの指標 ---  
+STAGE_SECONDS = Histogram("ngu_stage_seconds", "Time spent per search stage", ["stage"])  
+SEARCH_SECONDS = Histogram("ngu_search_seconds", "End-to-end search time", ["backend"])  
+PROBES_PER_SEARCH = Histogram("ngu_probes_per_search", "Yahoo probes per search", ["mode"], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15))  
+PROBES = Counter("ngu_yahoo_probes_total", "Yahoo probes by outcome", ["result"])  
+OUTBOUND_ERRORS = Counter("ngu_outbound_errors_total", "Outbound request errors", ["target", "kind"])  
+OUTBOUND_WAIT_SECONDS = Histogram("ngu_outbound_wait_seconds", "Time spent waiting for the outbound rate limit", ["target"])  
+  
+# --- リクエストごとのトレース ---  
+_trace = contextvars.ContextVar("ngu_trace", default=None)  
+  
+class Trace:  
+    def __init__(self):  
+        self.t0 = time.perf_counter()  
+        self.spans = []  
+        self.lock = threading.Lock()  
+  
+    def add(self, name, start, seconds, attrs):  
+        entry = {"name": name, "start_ms": round((start - self.t0) * 1000, 2), "ms": round(seconds * 1000, 2)}  
+        entry.update(attrs)  
+        with self.lock:  
+            self.spans.append(entry)  
+  
+    def to_list(self):  
+        with self.lock:  
+            return sorted(self.spans, key=lambda s: s["start_ms"])  
+  
+def start_trace():  
+    """ このリクエスト (と、そこから作るタスク・スレッド) のスパンを記録し始める """  
+    trace = Trace()  
+    _trace.set(trace)  
+    return trace  
+  
+@contextmanager  
+def span(name, **attrs):  
+    """ 囲んだ処理の時間を記録する。yield した dict に書いた値はトレースに付く (結果など) """  
+    t0 = time.perf_counter()  
+    try:  
+        yield attrs  
+    finally:  
+        seconds = time.perf_counter() - t0  
+        STAGE_SECONDS.observe(seconds, stage=name)  
+        trace = _trace.get()  
+        if trace is not None: trace.add(name, t0, seconds, attrs)  
+  
+async def to_thread(name, fn, *args):  
+    """ asyncio.to_thread と同じ。スレッドプールの空き待ち (threadpool_wait) と実行時間 (name) を分けて記録する """  
+    submitted = time.perf_counter()  
+  
+    def run():  
+        started = time.perf_counter()  
+        wait = started - submitted  
+        STAGE_SECONDS.observe(wait, stage="threadpool_wait")  
+        trace = _trace.get()  
+        if trace is not None: trace.add("threadpool_wait", submitted, wait, {})  
+        with span(name):  
+            return fn(*args)  
+  
+    return await asyncio.to_thread(run)  
\ No newline at end of file
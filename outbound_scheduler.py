@@ -0,0 +1,196 @@
+import os  
+import time  
+import heapq  
+import struct  
+import asyncio  
+import threading  
+import itertools  
+import contextvars  
+from contextlib import contextmanager  
+import metrics  
+  
+try:  
+    import fcntl  
+except ImportError:  # Windows では共有ファイルを使わず、プロセスの中だけで間隔を守る  
+    fcntl = None  
+  
+# === 外部サイトへの問い合わせの送出スケジューラ (Yahoo!用) ===  
+# 以前は問い合わせごとに sleep(YAHOO_DELAY_SEC) していたので、検索が同時に走ると全体では  
+# 何倍もの頻度で送ってしまい、しかも待っている間ずっとスレッドを塞いでいた。ここでは  
+# - 全 uvicorn ワーカー合計で「interval 秒に1件 (空いていれば burst 件まで続けて可)」のトークンバケットにする。  
+#   バケットの状態 (次の理論送出時刻 1つ = GCRA) は state_path のファイルに置き、flock で共有する  
+# - 送出待ちの問い合わせは優先度順に並べる。優先度 = その検索が始まった時刻 (search_priority)。  
+#   先に始まった (途中まで進んでいる) 検索の続きが、後から来た検索より先に出るので、検索が早く終わる。  
+#   (優先度はワーカーの中だけで効く。ワーカーをまたいでは早く取りに来た方が先)  
+# - 待ち行列の長さ (queue_depth) と待ち時間 (ngu_outbound_wait_seconds) は /metrics・/stats で見られる  
+# スレッドからは acquire()、イベントループからは await acquire_async() で待つ (どちらも同じ行列に並ぶ)。  
+# 状態ファイルのロックは待たずに取る (LOCK_NB)。他のワーカーが持っていれば LOCK_RETRY_SEC 後に取り直すので、  
+# イベントループが flock で止まることはない。  
+  
+LOCK_RETRY_SEC = 0.001  # 状態ファイルのロックが取れなかったときに取り直すまでの秒数  
+  
+_priority = contextvars.ContextVar("ngu_outbound_priority", default=None)  
+  
+@contextmanager  
+def search_priority():  
+    """ この中 (そこから作るタスク・to_thread 先も含む) の問い合わせを「この検索の開始時刻」の優先度で並べる """  
+    token = _priority.set(time.monotonic())  
+    try:  
+        yield  
+    finally:  
+        _priority.reset(token)  
+  
+class SharedBucket:  
+    """ GCRA のトークンバケット。tat (次の理論送出時刻, UNIX時刻) を state_path で全プロセスと共有する """  
+  
+    def __init__(self, interval, burst=1, state_path=None):  
+        self.interval = max(0.0, interval)  
+        self.tolerance = self.interval * (max(1, burst) - 1)  
+        self.state_path = state_path if fcntl else None  
+        self.tat = 0.0  
+        self.lock = threading.Lock()  
+        self._fd = None  
+  
+    def _open(self):  
+        if self._fd is None:  
+            directory = os.path.dirname(self.state_path)  
+            if directory: os.makedirs(directory, exist_ok=True)  
+            self._fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)  
+        return self._fd  
+  
+    def _take(self, now):  
+        # 時計が戻った・古い状態ファイルが残っていた場合でも、先の予約は最大1周期ぶんまで  
+        tat = min(max(self.tat, now), now + self.tolerance + self.interval)  
+        wait = tat - self.tolerance - now  
+        if wait > 0:  
+            self.tat = tat  
+            return wait  
+        self.tat = tat + self.interval  
+        return 0.0  
+  
+    def try_take(self):  
+        """ 今送ってよければ1つ取って 0 を、まだなら空くまでの秒数 (ロックが取れなければ LOCK_RETRY_SEC) を返す """  
+        if self.interval <= 0: return 0.0  
+        with self.lock:  
+            if not self.state_path: return self._take(time.time())  
+            fd = self._open()  
+            try:  
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)  
+            except BlockingIOError:  
+                return LOCK_RETRY_SEC  
+            try:  
+                raw = os.pread(fd, 8, 0)  
+                self.tat = struct.unpack("d", raw)[0] if len(raw) == 8 else 0.0  
+                wait = self._take(time.time())  
+                if wait == 0: os.pwrite(fd, struct.pack("d", self.tat), 0)  
+                return wait  
+            finally:  
+                fcntl.flock(fd, fcntl.LOCK_UN)  
+  
+class _Waiter:  
+    """ 行列に並んでいる1件。先頭になった・先頭が空いたら wake() で起こされる """  
+  
+    def __init__(self, priority, seq, loop=None):  
+        self.key = (priority, seq)  
+        self.loop = loop  
+        self.event = asyncio.Event() if loop is not None else threading.Event()  
+  
+    def __lt__(self, other):  
+        return self.key < other.key  
+  
+    def wake(self):  
+        if self.loop is None:  
+            self.event.set()  
+            return  
+        try:  
+            self.loop.call_soon_threadsafe(self.event.set)  
+        except RuntimeError:  # ループが既に閉じている (その待ちは取り消し済み)  
+            pass  
+  
+class OutboundScheduler:  
+    def __init__(self, target, bucket):  
+        self.target = target  
+        self.bucket = bucket  
+        self.queue = []  # _Waiter のヒープ (優先度の小さい = 古い検索が先頭)  
+        self.lock = threading.Lock()  
+        self.seq = itertools.count()  
+        self.counts = {"granted": 0, "waited": 0}  
+  
+    def _enter(self, loop=None):  
+        priority = _priority.get()  
+        waiter = _Waiter(time.monotonic() if priority is None else priority, next(self.seq), loop)  
+        with self.lock:  
+            heapq.heappush(self.queue, waiter)  
+        return waiter  
+  
+    def _poll(self, waiter):  
+        """ 0 = 送ってよい (行列から抜けた) / 秒数 = そのあと取り直す / None = 先頭になるまで待つ """  
+        with self.lock:  
+            if self.queue[0] is not waiter:  
+                waiter.event.clear()  
+                return None  
+            wait = self.bucket.try_take()  
+            if wait == 0:  
+                heapq.heappop(self.queue)  
+                if self.queue: self.queue[0].wake()  
+            else:  
+                waiter.event.clear()  
+            return wait  
+  
+    def _leave(self, waiter):  
+        """ 取り消された (キャンセル・例外) 待ちを行列から外す """  
+        with self.lock:  
+            if waiter not in self.queue: return  
+            was_head = self.queue[0] is waiter  
+            self.queue.remove(waiter)  
+            heapq.heapify(self.queue)  
+            if was_head and self.queue: self.queue[0].wake()  
+  
+    def _granted(self, t0):  
+        waited = time.perf_counter() - t0  
+        metrics.OUTBOUND_WAIT_SECONDS.observe(waited, target=self.target)  
+        with self.lock:  
+            self.counts["granted"] += 1  
+            if waited > 0.001: self.counts["waited"] += 1  
+        return waited  
+  
+    def acquire(self):  
+        """ 送ってよくなるまでスレッドで待つ。待った秒数を返す """  
+        t0 = time.perf_counter()  
+        if self.bucket.interval > 0:  
+            waiter = self._enter()  
+            try:  
+                while True:  
+                    wait = self._poll(waiter)  
+                    if wait == 0: break  
+                    waiter.event.wait(wait)  
+            finally:  
+                self._leave(waiter)  
+        return self._granted(t0)  
+  
+    async def acquire_async(self):  
+        """ acquire の非同期版 (イベントループを塞がずに待つ) """  
+        t0 = time.perf_counter()  
+        if self.bucket.interval > 0:  
+            waiter = self._enter(asyncio.get_running_loop())  
+            try:  
+                while True:  
+                    wait = self._poll(waiter)  
+                    if wait == 0: break  
+                    try:  
+                        await asyncio.wait_for(waiter.event.wait(), wait)  
+                    except asyncio.TimeoutError:  
+                        pass  
+            finally:  
+                self._leave(waiter)  
+        return self._granted(t0)  
+  
+    def queue_depth(self):  
+        with self.lock:  
+            return len(self.queue)  
+  
+    def stats(self):  
+        with self.lock:  
+            return dict(self.counts, queue_depth=len(self.queue), interval_sec=self.bucket.interval,  
+                        burst=round(self.bucket.tolerance / self.bucket.interval) + 1 if self.bucket.interval > 0 else None,  
+                        shared=bool(self.bucket.state_path))  
\ No newline at end of file
@@ -0,0 +1,127 @@
+import timetable  
+from csa_engine import INF, TRANSFER_MINUTES, MAX_WAIT_MINUTES, MAX_JOURNEY_MINUTES  
+  
+# === RAPTOR (Round-bAsed Public Transit Optimized Router) ===  
+# ラウンドk = 「k本目の列車に乗った時点」の最早到着時刻を系統(route)単位でまとめて更新する。  
+# 各ラウンドで改善した駅だけがラベルとして残るので、(到着時刻, 乗換回数) のパレート集合が1回の探索で得られる。  
+  
+MAX_ROUNDS = 4  # 乗車本数の上限 (= 乗換3回まで)  
+  
+def _earliest_trip(tt, base, stop_count, trip_count, pos, ready):  
+    """ 系統内で、位置 pos を ready 以降に発車する最初の列車 (見つからなければ trip_count) """  
+    st_dep = tt.st_dep  
+    lo, hi = 0, trip_count  
+    while lo < hi:  
+        mid = (lo + hi) // 2  
+        if st_dep[base + mid * stop_count + pos] < ready: lo = mid + 1  
+        else: hi = mid  
+    return lo  
+  
+def raptor_labels(tt, origin_id, dep_min, max_rounds=MAX_ROUNDS):  
+    """  
+    戻り値: [(駅ID, 乗車本数, 到着時刻, 出発駅の発車時刻), ...]  
+    同じ駅でも乗車本数が増えるほど到着が早いラベルだけが並ぶ  
+    """  
+    n = len(tt.station_names)  
+    best = [INF] * n  
+    prev = [INF] * n  
+    prev_fd = [INF] * n  
+    best[origin_id] = prev[origin_id] = dep_min  
+    last_board = dep_min + MAX_WAIT_MINUTES  
+    end = dep_min + MAX_JOURNEY_MINUTES  
+  
+    rso, rs = tt.route_stop_offsets, tt.route_stops  
+    rto, rtime = tt.route_trip_offsets, tt.route_time_offsets  
+    sro, s_routes, s_pos = tt.station_route_offsets, tt.station_routes, tt.station_route_pos  
+    st_arr, st_dep = tt.st_arr, tt.st_dep  
+  
+    labels = []  
+    marked = {origin_id}  
+    for k in range(1, max_rounds + 1):  
+        # 前ラウンドで改善した駅を通る系統と、乗り始められる最初の位置  
+        queue = {}  
+        for s in marked:  
+            for j in range(sro[s], sro[s + 1]):  
+                r, p = s_routes[j], s_pos[j]  
+                if p < queue.get(r, INF): queue[r] = p  
+  
+        cur = list(prev)  
+        cur_fd = list(prev_fd)  
+        improved = set()  
+        for r, p0 in queue.items():  
+            s0 = rso[r]  
+            stop_count = rso[r + 1] - s0  
+            trip_count = rto[r + 1] - rto[r]  
+            base = rtime[r]  
+            trip = -1  
+            board_fd = INF  
+            for p in range(p0, stop_count):  
+                s = rs[s0 + p]  
+                if trip >= 0:  
+                    a = st_arr[base + trip * stop_count + p]  
+                    if a < best[s] and a <= end:  
+                        best[s] = cur[s] = a  
+                        cur_fd[s] = board_fd  
+                        improved.add(s)  
+  
+                # この駅でもっと早い列車に乗り換えられるか  
+                ps = prev[s]  
+                if ps >= INF: continue  
+                ready = ps if s == origin_id else ps + TRANSFER_MINUTES  
+                if trip >= 0 and st_dep[base + trip * stop_count + p] < ready: continue  
+                j = _earliest_trip(tt, base, stop_count, trip if trip >= 0 else trip_count, p, ready)  
+                if j >= (trip if trip >= 0 else trip_count): continue  
+                d = st_dep[base + j * stop_count + p]  
+                if s == origin_id:  
+                    if d > last_board: continue  
+                    board_fd = d  
+                else:  
+                    board_fd = prev_fd[s]  
+                trip = j  
+  
+        for s in improved:  
+            labels.append((s, k, cur[s], cur_fd[s]))  
+        if not improved: break  
+        prev, prev_fd = cur, cur_fd  
+        marked = improved  
+  
+    return labels  
+  
+def pareto_front(candidates):  
+    """  
+    candidates: [{"arr_min", "transfers", "cost", ...}, ...]  
+    3基準 (到着時刻, 乗換回数, 費用) のどれも小さい方が良いとして、支配されない候補だけを費用順で返す  
+    """  
+    candidates = sorted(candidates, key=lambda c: (c["cost"], c["transfers"], c["arr_min"]))  
+    front = []  
+    for c in candidates:  
+        # 先に残った候補は費用が同じか安いので、残り2基準だけ比べればよい  
+        if any(f["transfers"] <= c["transfers"] and f["arr_min"] <= c["arr_min"] for f in front):  
+            continue  
+        front.append(c)  
+    return front  
+  
+def pareto_search(tt, start_name, dep_min, station_cost, max_rounds=MAX_ROUNDS):  
+    """  
+    出発駅から到達できる駅の (到着時刻, 乗換回数, station_cost(駅名)) パレート集合。  
+    station_cost が None を返す駅は候補にしない。出発駅が時刻表に無ければ None  
+    """  
+    origin_id = tt.station_ids.get(start_name)  
+    if origin_id is None: return None  
+  
+    candidates = []  
+    cost_cache = {}  
+    for sid, rounds, arr, fd in raptor_labels(tt, origin_id, dep_min, max_rounds):  
+        name = tt.station_names[sid]  
+        if name not in cost_cache: cost_cache[name] = station_cost(name)  
+        cost = cost_cache[name]  
+        if cost is None: continue  
+        candidates.append({  
+            "station": name,  
+            "dep": timetable.minutes_to_hhmm(fd),  
+            "arr": timetable.minutes_to_hhmm(arr),  
+            "arr_min": arr,  
+            "transfers": rounds - 1,  
+            "cost": cost  
+        })  
+    return pareto_front(candidates)  
\ No newline at end of file
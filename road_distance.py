@@ -0,0 +1,145 @@
+import os  
+import math  
+import threading  
+import numpy as np  
+import timetable  
+  
+# === 駅 -> 地点 の道路距離テーブル (build_road_distances.py が OSM の道路データから生成) ===  
+# タクシー料金は「直線距離 x 1.4」で道のりを見積もっていたが、川・東京湾まわりでは大きく外れる。  
+# ここでは関東を固定の格子 (セル) に分け、駅ごとに周囲 (半径 ROAD_RADIUS_KM) の各セルまでの道のりを前計算しておく。  
+# 問い合わせは「駅の行 x セル」を1つ引いて、セルの代表点 (道路上の点) から目的地までの残りを足すだけ。  
+# 速さ: 目標は「従来の式 (直線 x 1.4) と同じくらい」だったが届いていない。料金の式に表を引く分が足されるので、  
+# station_taxi_fare は calculate_taxi_fare の約2.5倍 (1件 約1.8µs / 0.7µs。benchmarks/bench_road_distance.py が3倍で止める)。  
+# 多くの駅をまとめて計算する経路 (search_precomputed・/reachable) は配列版 road_km_np を使う。  
+#  
+# ファイルは timetable.write_columns の形式 (magic "NGRD"):  
+#   names         : 駅名と別名 ("\n" 連結, 'B')。name_rows で駅の行に対応させる (station_store の stations.bin と同じ)  
+#   name_rows     : 名前 -> 駅の行 ('I')  
+#   grid          : [格子の南端の緯度, 西端の経度, セルの緯度幅, セルの経度幅] ('d')  
+#   shape         : [格子の行数, 列数, 窓の半径 (セル数)] ('I')  
+#   station_cell  : 駅 i のセル = (station_cell[2i], station_cell[2i+1]) (行, 列) ('i')  
+#   cell_lat / cell_lon : セルの代表点 (そのセルで中心に一番近い道路上の点)。道路の無いセルは NaN ('f')  
+#   dist          : 駅 i の窓 ((2*半径+1)^2 セル, 行優先) の道のり。UNIT_KM 単位、ABSENT = 不明 ('H')  
+  
+ROAD_DISTANCE_BIN = os.environ.get("ROAD_DISTANCE_BIN", f"{timetable.DATA_DIR}/road_distances.bin")  # 空なら使わない  
+TABLE_MAGIC = b"NGRD"  
+TABLE_VERSION = 1  
+  
+ABSENT = 0xFFFF  
+UNIT_KM = 0.01            # 10m 単位 (最大 655km)  
+RESIDUAL_DETOUR = 1.4     # セルの代表点から目的地までの残り (1セル以内) は従来どおり直線 x 1.4  
+KM_PER_DEG_LAT = 6371 * math.pi / 180  
+  
+class RoadDistanceTable:  
+    def __init__(self, columns):  
+        names = bytes(columns["names"]).decode("utf-8").split("\n")  
+        self.ids = dict(zip(names, columns["name_rows"].tolist()))  
+        self.lat0, self.lon0, self.dlat, self.dlon = columns["grid"]  
+        self.rows, self.cols, self.half = columns["shape"]  
+        self.width = 2 * self.half + 1  
+        self.block = self.width * self.width  
+        self.station_cell = columns["station_cell"]  
+        self.station_count = len(self.station_cell) // 2  
+        # 1件ずつ引くとき (calculate_taxi_fare と同じくらいの速さにしたい) 用に、名前 -> (dist の窓の先頭, 窓の左上のセル)  
+        # を1回の dict 参照で引けるようにしておく  
+        cells = self.station_cell.tolist()  
+        self.windows = {name: (i * self.block, cells[2 * i] - self.half, cells[2 * i + 1] - self.half)  
+                        for name, i in self.ids.items()}  
+        self.cell_lat = columns["cell_lat"]  
+        self.cell_lon = columns["cell_lon"]  
+        self.dist = columns["dist"]  
+        self._rows_cache = {}  
+        self._mmap = None  
+  
+    def road_km(self, station, lat, lon):  
+        """ 駅から (lat, lon) までの道のり (km)。表に無ければ None (= 従来の見積もりを使う) """  
+        window = self.windows.get(station)  
+        if window is None: return None  
+        base, r0, c0 = window  
+        r = math.floor((lat - self.lat0) / self.dlat)  
+        c = math.floor((lon - self.lon0) / self.dlon)  
+        width = self.width  
+        dr, dc = r - r0, c - c0  
+        if not (0 <= dr < width and 0 <= dc < width and 0 <= r < self.rows and 0 <= c < self.cols): return None  
+        v = self.dist[base + dr * width + dc]  
+        if v == ABSENT: return None  
+        cell = r * self.cols + c  
+        # 代表点から目的地まで (1セル以内なので平面近似で十分)  
+        dy = (lat - self.cell_lat[cell]) * KM_PER_DEG_LAT  
+        dx = (lon - self.cell_lon[cell]) * KM_PER_DEG_LAT * math.cos(math.radians(lat))  
+        return v * UNIT_KM + math.sqrt(dx * dx + dy * dy) * RESIDUAL_DETOUR  
+  
+    def rows_for(self, names):  
+        """ 駅名のリスト -> この表の行番号の配列 (-1 = 表に無い)。同じリストなら作り直さない """  
+        cached = self._rows_cache.get(id(names))  
+        if cached is not None and cached[0] is names: return cached[1]  
+        rows = np.array([self.ids.get(n, -1) for n in names], dtype=np.int64)  
+        self._rows_cache[id(names)] = (names, rows)  
+        return rows  
+  
+    def road_km_np(self, rows, lat, lon):  
+        """ road_km の配列版 (1地点 -> 複数の駅)。rows は rows_for の行番号。表に無いものは NaN """  
+        rows = np.asarray(rows, dtype=np.int64)  
+        out = np.full(len(rows), np.nan)  
+        r = math.floor((lat - self.lat0) / self.dlat)  
+        c = math.floor((lon - self.lon0) / self.dlon)  
+        if not (0 <= r < self.rows and 0 <= c < self.cols): return out  
+        cell = r * self.cols + c  
+        cell_lat, cell_lon = float(self.cell_lat[cell]), float(self.cell_lon[cell])  
+        if math.isnan(cell_lat): return out  
+  
+        station_cell = np.asarray(self.station_cell).reshape(-1, 2)  
+        ok = rows >= 0  
+        safe = np.where(ok, rows, 0)  
+        dr = r - station_cell[safe, 0] + self.half  
+        dc = c - station_cell[safe, 1] + self.half  
+        ok &= (dr >= 0) & (dr < self.width) & (dc >= 0) & (dc < self.width)  
+        idx = safe[ok] * self.block + dr[ok] * self.width + dc[ok]  
+        v = np.asarray(self.dist)[idx]  
+        dy = (lat - cell_lat) * KM_PER_DEG_LAT  
+        dx = (lon - cell_lon) * KM_PER_DEG_LAT * math.cos(math.radians(lat))  
+        out[ok] = np.where(v == ABSENT, np.nan, v * UNIT_KM + math.sqrt(dx * dx + dy * dy) * RESIDUAL_DETOUR)  
+        return out  
+  
+def load_table(path=ROAD_DISTANCE_BIN):  
+    print(f"📂 Mapping road distance table {path} ...")  
+    mm, columns = timetable.map_columns(path, TABLE_MAGIC, TABLE_VERSION)  
+    table = RoadDistanceTable(columns)  
+    table._mmap = mm  
+    print(f"✅ Mapped {table.station_count} stations x {table.block} cells ({table.rows}x{table.cols} grid).")  
+    return table  
+  
+# プロセス内で1回だけ読み込む  
+_table = None  
+_table_loaded = False  
+_table_lock = threading.Lock()  
+  
+def _table_is_fresh():  
+    """ テーブルがあり、駅データ (stops.txt) より新しいか """  
+    if not ROAD_DISTANCE_BIN or not os.path.exists(ROAD_DISTANCE_BIN): return False  
+    if os.path.exists(timetable.STOPS_TXT) and os.path.getmtime(ROAD_DISTANCE_BIN) < os.path.getmtime(timetable.STOPS_TXT):  
+        print(f"⚠️ {ROAD_DISTANCE_BIN} is older than {timetable.STOPS_TXT}. Run build_road_distances.py")  
+        return False  
+    return True  
+  
+def get_table():  
+    """ 読み込み済みのテーブルを返す。無ければ None (= 直線距離 x 1.4 で見積もる) """  
+    global _table, _table_loaded  
+    if _table_loaded:  
+        return _table  
+    with _table_lock:  
+        if not _table_loaded:  
+            try:  
+                if _table_is_fresh():  
+                    _table = load_table(ROAD_DISTANCE_BIN)  
+            except Exception as e:  
+                print(f"❌ Road Distance Table Load Error: {e}")  
+                _table = None  
+            _table_loaded = True  
+    return _table  
+  
+def lookup(station, coords):  
+    """ 駅から coords ({"lat", "lon"}) までの道のり (km)。分からなければ None """  
+    table = get_table()  
+    if table is None or coords is None: return None  
+    return table.road_km(station, float(coords["lat"]), float(coords["lon"]))  
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os  
+import json  
+import time  
+import asyncio  
+import sqlite3  
+import threading  
+from collections import OrderedDict  
+from datetime import timedelta  
+  
+# === fetch_yahoo_route の結果キャッシュ (2段) ===  
+# 1段目: プロセス内 LRU  
+# 2段目: SQLite (全 uvicorn ワーカーで共有)  
+#  
+# キー = 正規化した駅名 x 営業日 x 時刻バケット (BUCKET_MINUTES 分単位)。  
+# 同じバケット内の別の時刻の問い合わせでも、次の条件なら結果を使い回せる:  
+#   OK (ルートあり) : 保存時の検索時刻 <= 今回の検索時刻 <= その列車の出発時刻  
+#                     (まだ出発していない = 今回検索しても同じ列車が最初に来る)  
+#   NG (ルートなし) : 保存時の検索時刻 == 今回の検索時刻 (1分単位)  
+#                     (「始発待ち (2時間超の待ち)」で弾いた結果は、数分後に検索すると使えるルートになることがある)  
+# 通信エラーなど結果が確定しなかったものは保存しない。  
+# イベントループからは lookup_async / store_async を使う (SQLite の読み書きはスレッドで行う)。  
+  
+# 利用者の検索条件が入るので data/ ではなく var/ (実行中の状態の置き場。配信しない) に置く  
+CACHE_DB = os.environ.get("ROUTE_CACHE_DB", "var/route_cache.sqlite3")  # 空なら2段目を使わない  
+LRU_SIZE = int(os.environ.get("ROUTE_CACHE_LRU_SIZE", "4096"))  
+BUCKET_MINUTES = int(os.environ.get("ROUTE_CACHE_BUCKET_MINUTES", "10"))  
+POSITIVE_TTL_SEC = int(os.environ.get("ROUTE_CACHE_TTL_SEC", str(6 * 3600)))  
+NEGATIVE_TTL_SEC = int(os.environ.get("ROUTE_CACHE_NEGATIVE_TTL_SEC", "300"))  
+SERVICE_DAY_START_HOUR = 4  # これより前は前日の営業日 (timetable.SERVICE_DAY_START_HOUR と同じ)  
+PURGE_EVERY = 1000  # この回数保存するごとに期限切れ行を消す  
+  
+_lock = threading.Lock()  
+_lru = OrderedDict()  
+_local = threading.local()  
+_stats = {"l1_hit": 0, "l2_hit": 0, "negative_hit": 0, "miss": 0, "store": 0, "negative_store": 0}  
+  
+def normalize_station(name):  
+    """ 表記揺れを吸収する ("新宿駅 " -> "新宿") """  
+    name = name.strip()  
+    if name.endswith("駅") and len(name) > 1: name = name[:-1]  
+    return name  
+  
+def _service_minutes(hour, minute):  
+    if hour < SERVICE_DAY_START_HOUR: hour += 24  
+    return hour * 60 + minute  
+  
+def _key(start, goal, dt):  
+    q = _service_minutes(dt.hour, dt.minute)  
+    service_date = (dt - timedelta(hours=SERVICE_DAY_START_HOUR)).date()  
+    key = f"{normalize_station(start)}|{normalize_station(goal)}|{service_date.isoformat()}|{q // BUCKET_MINUTES}"  
+    return key, q  
+  
+def _usable(entry, q):  
+    query_min, result, expires = entry  
+    if expires < time.time(): return False  
+    if q < query_min: return False  
+    if result is None: return q == query_min  
+    h, m = map(int, result["dep"].split(':'))  
+    return q <= _service_minutes(h, m)  
+  
+def _db():  
+    if not CACHE_DB: return None  
+    conn = getattr(_local, "conn", None)  
+    if conn is None:  
+        directory = os.path.dirname(CACHE_DB)  
+        if directory: os.makedirs(directory, exist_ok=True)  
+        conn = sqlite3.connect(CACHE_DB, timeout=1.0, isolation_level=None)  
+        conn.execute("PRAGMA journal_mode=WAL")  
+        conn.execute("PRAGMA synchronous=NORMAL")  
+        conn.execute(  
+            "CREATE TABLE IF NOT EXISTS route_cache ("  
+            " key TEXT PRIMARY KEY, query_min INTEGER, result TEXT, expires REAL)"  
+        )  
+        _local.conn = conn  
+    return conn  
+  
+def _count(name):  
+    with _lock:  
+        _stats[name] += 1  
+  
+def _lookup_l1(key, q):  
+    with _lock:  
+        entry = _lru.get(key)  
+        if entry is not None:  
+            _lru.move_to_end(key)  
+    if entry is not None and _usable(entry, q):  
+        _count("l1_hit")  
+        if entry[1] is None: _count("negative_hit")  
+        return True, entry[1]  
+    return False, None  
+  
+def _lookup_l2(key, q):  
+    try:  
+        conn = _db()  
+        row = conn.execute(  
+            "SELECT query_min, result, expires FROM route_cache WHERE key = ?", (key,)  
+        ).fetchone() if conn else None  
+    except sqlite3.Error as e:  
+        print(f"Route Cache Error: {e}")  
+        row = None  
+    if row is not None:  
+        entry = (row[0], json.loads(row[1]) if row[1] else None, row[2])  
+        if _usable(entry, q):  
+            _put_lru(key, entry)  
+            _count("l2_hit")  
+            if entry[1] is None: _count("negative_hit")  
+            return True, entry[1]  
+  
+    _count("miss")  
+    return False, None  
+  
+def lookup(start, goal, dt):  
+    """ 戻り値: (ヒットしたか, 結果 or None) """  
+    key, q = _key(start, goal, dt)  
+    hit = _lookup_l1(key, q)  
+    return hit if hit[0] else _lookup_l2(key, q)  
+  
+async def lookup_async(start, goal, dt):  
+    """ lookup のイベントループ版。2段目 (SQLite は他のワーカーの書き込み中に待たされる) はスレッドで引く """  
+    key, q = _key(start, goal, dt)  
+    hit = _lookup_l1(key, q)  
+    if hit[0] or not CACHE_DB: return hit if hit[0] else _lookup_l2(key, q)  
+    return await asyncio.to_thread(_lookup_l2, key, q)  
+  
+def _store_entry(start, goal, dt, result):  
+    key, q = _key(start, goal, dt)  
+    ttl = POSITIVE_TTL_SEC if result else NEGATIVE_TTL_SEC  
+    entry = (q, result, time.time() + ttl)  
+    _put_lru(key, entry)  
+    _count("store" if result else "negative_store")  
+    return key, entry  
+  
+def store(start, goal, dt, result):  
+    """ 確定した結果 (ルート or None=ルートなし) を保存する """  
+    _store_db(*_store_entry(start, goal, dt, result))  
+  
+async def store_async(start, goal, dt, result):  
+    """ store のイベントループ版 (1段目はその場で、2段目の書き込みはスレッドで) """  
+    key, entry = _store_entry(start, goal, dt, result)  
+    if CACHE_DB: await asyncio.to_thread(_store_db, key, entry)  
+  
+def _store_db(key, entry):  
+    q, result, expires = entry  
+    try:  
+        conn = _db()  
+        if not conn: return  
+        conn.execute(  
+            "INSERT OR REPLACE INTO route_cache (key, query_min, result, expires) VALUES (?, ?, ?, ?)",  
+            (key, q, json.dumps(result, ensure_ascii=False) if result else None, expires),  
+        )  
+        if (_stats["store"] + _stats["negative_store"]) % PURGE_EVERY == 0:  
+            conn.execute("DELETE FROM route_cache WHERE expires < ?", (time.time(),))  
+    except sqlite3.Error as e:  
+        print(f"Route Cache Error: {e}")  
+  
+def _put_lru(key, entry):  
+    with _lock:  
+        _lru[key] = entry  
+        _lru.move_to_end(key)  
+        while len(_lru) > LRU_SIZE:  
+            _lru.popitem(last=False)  
+  
+def stats():  
+    with _lock:  
+        s = dict(_stats)  
+        s["l1_size"] = len(_lru)  
+    lookups = s["l1_hit"] + s["l2_hit"] + s["miss"]  
+    s["hit_rate"] = round((s["l1_hit"] + s["l2_hit"]) / lookups, 3) if lookups else 0.0  
+    return s  
\ No newline at end of file
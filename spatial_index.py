@@ -0,0 +1,63 @@
+import math  
+import numpy as np  
+  
+# === 駅座標のグリッド空間インデックス ===  
+# 駅を緯度経度の格子(セル)に振り分けておき、矩形内のセルだけを見て候補駅を取り出す。  
+# 距離の厳密判定は NumPy でまとめて計算する。  
+  
+EARTH_RADIUS_KM = 6371  
+KM_PER_DEG_LAT = EARTH_RADIUS_KM * math.pi / 180  # 約111.2km  
+GRID_CELL_DEG = 0.1  # 約10km四方  
+  
+def haversine_np(lat, lon, lats, lons):  
+    """ core_engine.haversine_distance と同じ式のベクトル版 (1点 -> 配列) """  
+    lat1, lon1 = math.radians(lat), math.radians(lon)  
+    lat2, lon2 = np.radians(lats), np.radians(lons)  
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2  
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))  
+    return EARTH_RADIUS_KM * c  
+  
+class StationGrid:  
+    def __init__(self, station_coords, cell_deg=GRID_CELL_DEG):  
+        # station_coords の挿入順をそのまま ID にする (候補の並び順を従来と揃えるため)  
+        self.names = list(station_coords.keys())  
+        self.ids = {name: i for i, name in enumerate(self.names)}  
+        self.lats = np.array([float(c["lat"]) for c in station_coords.values()], dtype=np.float64)  
+        self.lons = np.array([float(c["lon"]) for c in station_coords.values()], dtype=np.float64)  
+        self.cell_deg = cell_deg  
+  
+        cells = {}  
+        for i, (lat, lon) in enumerate(zip(self.lats, self.lons)):  
+            cells.setdefault(self._cell(lat, lon), []).append(i)  
+        self.cells = {key: np.array(ids, dtype=np.int32) for key, ids in cells.items()}  
+  
+    def __len__(self):  
+        return len(self.names)  
+  
+    def _cell(self, lat, lon):  
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))  
+  
+    def query_bbox(self, lat_min, lat_max, lon_min, lon_max):  
+        """ 矩形に掛かるセルの駅IDを昇順で返す (矩形外の駅も少し混ざる) """  
+        y0, x0 = self._cell(lat_min, lon_min)  
+        y1, x1 = self._cell(lat_max, lon_max)  
+        parts = []  
+        for y in range(y0, y1 + 1):  
+            for x in range(x0, x1 + 1):  
+                ids = self.cells.get((y, x))  
+                if ids is not None: parts.append(ids)  
+        if not parts: return np.empty(0, dtype=np.int32)  
+        return np.sort(np.concatenate(parts))  
+  
+    def query_radius_bbox(self, coords_list, radius_km):  
+        """ 全ての点から radius_km 以内に入りうる矩形 (各点の外接矩形の共通部分) の駅ID """  
+        lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0  
+        for c in coords_list:  
+            dlat = radius_km / KM_PER_DEG_LAT  
+            # 経度方向は高緯度側の方が1度が短いので、矩形の端の緯度で安全側に見積もる  
+            edge_lat = min(89.0, abs(c["lat"]) + dlat)  
+            dlon = radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(edge_lat)))  
+            lat_min, lat_max = max(lat_min, c["lat"] - dlat), min(lat_max, c["lat"] + dlat)  
+            lon_min, lon_max = max(lon_min, c["lon"] - dlon), min(lon_max, c["lon"] + dlon)  
+        if lat_min > lat_max or lon_min > lon_max: return np.empty(0, dtype=np.int32)  
+        return self.query_bbox(lat_min, lat_max, lon_min, lon_max)  
\ No newline at end of file
@@ -0,0 +1,72 @@
+import asyncio  
+  
+# === 投機的な並列二分探索 ===  
+# 従来の二分探索 (OKなら右半分, NGなら左半分へ) の判定木を、数段先まで先回りして並列に問い合わせる。  
+# 1ラウンドで depth 段ぶん (= 2^depth - 1 ノード) を投げるので、範囲は 2^depth 分割ずつ狭まる。  
+# 結果は根から順にたどるので、逐次の二分探索と必ず同じ駅になる。  
+# 選ばれなかった側の部分木の問い合わせは、結果が出た時点でキャンセルする。  
+  
+def depth_for_width(width):  
+    """ 1ラウンドの同時問い合わせ数 width (k) から、先読みできる段数を決める (k=3 -> 2段) """  
+    return max(1, (max(1, width) + 1).bit_length() - 1)  
+  
+def effective_width(width):  
+    """ 実際に1ラウンドで投げる問い合わせ数 (2^depth - 1)。k=2 -> 1 (逐次と同じ), k=4..6 -> 3 """  
+    return 2 ** depth_for_width(width) - 1  
+  
+async def speculative_bisect(n, probe, width=3, concurrency=4, progress=None):  
+    """  
+    probe(i) は候補 i を調べるコルーチン (OKなら結果, NGなら None)。  
+    戻り値: (最後にOKだった候補の位置 (-1 = 無し), その結果, 投げた問い合わせ数)  
+    progress に dict を渡すと、途中経過 (best_idx, best_res, launched) を随時書き込む  
+    (締め切りでキャンセルされた場合に「ここまでで確定した駅」を取り出すため)。  
+    width=1 なら従来の逐次二分探索と同じ動きになる。  
+    """  
+    if progress is None: progress = {}  
+    progress.update(best_idx=-1, best_res=None, launched=0)  
+    sem = asyncio.Semaphore(max(1, concurrency))  
+    depth = depth_for_width(width)  
+  
+    async def run(i):  
+        # 浅いノードから順に作るので、同時数の上限に当たっても根に近い方が先に走る  
+        async with sem:  
+            return await probe(i)  
+  
+    tasks = {}  # (lo, hi) -> その範囲の中央を調べるタスク  
+    lo, hi = 0, n - 1  
+    best_idx, best_res = -1, None  
+    launched = 0  
+    try:  
+        while lo <= hi:  
+            level = [(lo, hi)]  
+            for _ in range(depth):  
+                next_level = []  
+                for l, h in level:  
+                    if l > h: continue  
+                    m = (l + h) // 2  
+                    if (l, h) not in tasks:  
+                        tasks[(l, h)] = asyncio.ensure_future(run(m))  
+                        launched += 1  
+                        progress["launched"] = launched  
+                    next_level += [(l, m - 1), (m + 1, h)]  
+                level = next_level  
+  
+            # 根から順に結果をたどる  
+            while lo <= hi and (lo, hi) in tasks:  
+                m = (lo + hi) // 2  
+                res = await tasks.pop((lo, hi))  
+                if res:  
+                    best_idx, best_res = m, res  
+                    progress.update(best_idx=m, best_res=res)  
+                    discard = (lo, m - 1)  
+                    lo = m + 1  
+                else:  
+                    discard = (m + 1, hi)  
+                    hi = m - 1  
+                # もう結果に影響しない側の部分木はキャンセル  
+                for key in [k for k in tasks if discard[0] <= k[0] and k[1] <= discard[1]]:  
+                    tasks.pop(key).cancel()  
+    finally:  
+        for t in tasks.values(): t.cancel()  
+  
+    return best_idx, best_res, launched  
\ No newline at end of file
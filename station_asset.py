@@ -0,0 +1,133 @@
+import os  
+import re  
+import json  
+import gzip  
+import hashlib  
+import threading  
+import timetable  
+  
+# === 駅候補データの配信用ファイル (data/assets/stations.<ハッシュ>.json) ===  
+# stations_kanto.json は {"n", "k", "l"} を路線ごとに1件ずつ持ち、路線名も毎回フルで繰り返している。  
+# これを「駅ごとに1件 + 路線名は表引き」の列形式にまとめ、内容のハッシュをファイル名に入れて書き出す:  
+#   {"v": 1, "lines": [路線名, ...], "n": [駅名, ...], "k": [かな, ...], "l": [[路線番号, ...], ...]}  
+# 中身が変わらない限り URL も変わらないので、ブラウザには immutable で長期キャッシュさせ、  
+# 変わったときだけ新しい URL を取りに来させる (今の URL は stations.current.json に書く)。  
+# gzip と (brotli モジュールがあれば) brotli で圧縮したものも一緒に置き、main.py がそのまま返す。  
+#   python station_asset.py  : 今の stations_kanto.json から作り直す (fetch_stations.py も最後に呼ぶ)  
+  
+STATIONS_JSON = f"{timetable.DATA_DIR}/stations_kanto.json"  
+ASSET_DIR = f"{timetable.DATA_DIR}/assets"  
+CURRENT_JSON = f"{ASSET_DIR}/stations.current.json"  
+ASSET_VERSION = 1  
+ASSET_NAME = re.compile(r"stations\.[0-9a-f]{16}\.json")  
+  
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]  # 優先順  
+  
+def compact_stations(entries):  
+    """ stations_kanto.json の並び -> 列形式 (駅・路線とも最初に出た順) """  
+    line_ids = {}  
+    station_ids = {}  
+    asset = {"v": ASSET_VERSION, "lines": [], "n": [], "k": [], "l": []}  
+    for e in entries:  
+        sid = station_ids.get(e["n"])  
+        if sid is None:  
+            sid = station_ids[e["n"]] = len(asset["n"])  
+            asset["n"].append(e["n"])  
+            asset["k"].append(e.get("k") or "")  
+            asset["l"].append([])  
+        line = e.get("l")  
+        if not line: continue  
+        lid = line_ids.get(line)  
+        if lid is None:  
+            lid = line_ids[line] = len(asset["lines"])  
+            asset["lines"].append(line)  
+        if lid not in asset["l"][sid]: asset["l"][sid].append(lid)  
+    return asset  
+  
+def _write(path, data):  
+    tmp_path = path + ".tmp"  
+    with open(tmp_path, "wb") as f:  
+        f.write(data)  
+    os.replace(tmp_path, path)  
+  
+def build_station_asset(src=STATIONS_JSON, out_dir=ASSET_DIR):  
+    with open(src, "r", encoding="utf-8") as f:  
+        asset = compact_stations(json.load(f))  
+    body = json.dumps(asset, ensure_ascii=False, separators=(",", ":")).encode("utf-8")  
+    digest = hashlib.sha256(body).hexdigest()[:16]  
+    name = f"stations.{digest}.json"  
+    os.makedirs(out_dir, exist_ok=True)  
+  
+    path = os.path.join(out_dir, name)  
+    sizes = {"identity": len(body)}  
+    _write(path, body)  
+    _write(path + ".gz", gzip.compress(body, 9, mtime=0))  # mtime=0: 同じ中身なら同じバイト列  
+    sizes["gzip"] = os.path.getsize(path + ".gz")  
+    try:  
+        import brotli  
+        _write(path + ".br", brotli.compress(body, quality=11))  
+        sizes["br"] = os.path.getsize(path + ".br")  
+    except ImportError:  
+        print("⚠️ brotli が無いので .br は作りません (pip install brotli)")  
+  
+    # 今のファイル名を差し替えてから、古い世代を消す (直前の1世代は読み込み中のクライアントのために残す)  
+    current_path = os.path.join(out_dir, os.path.basename(CURRENT_JSON))  
+    previous = read_current(current_path)  
+    _write(current_path, json.dumps({"file": name, "hash": digest, "sizes": sizes}, ensure_ascii=False).encode("utf-8"))  
+    keep = {name, previous["file"] if previous else None}  
+    for f in os.listdir(out_dir):  
+        base = f.rsplit(".", 1)[0] if f.endswith((".gz", ".br")) else f  
+        if ASSET_NAME.fullmatch(base) and base not in keep:  
+            os.remove(os.path.join(out_dir, f))  
+    return name, sizes  
+  
+def read_current(path=CURRENT_JSON):  
+    try:  
+        with open(path, "r", encoding="utf-8") as f:  
+            return json.load(f)  
+    except (OSError, ValueError):  
+        return None  
+  
+# stations.current.json はファイルの更新時刻が変わったときだけ読み直す  
+_current = (None, None)  
+_current_lock = threading.Lock()  
+  
+def current_asset():  
+    """ 今配信する駅データの {"file", "hash", "sizes"}。無ければ None """  
+    global _current  
+    try:  
+        mtime = os.path.getmtime(CURRENT_JSON)  
+    except OSError:  
+        return None  
+    with _current_lock:  
+        if _current[0] != mtime:  
+            _current = (mtime, read_current(CURRENT_JSON))  
+        return _current[1]  
+  
+def _accepted(accept_encoding):  
+    """ Accept-Encoding -> 受け付ける符号化の集合 (q=0 は除く) """  
+    accepted = set()  
+    for part in accept_encoding.split(","):  
+        token, _, params = part.strip().partition(";")  
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"): continue  
+        if token: accepted.add(token.strip().lower())  
+    return accepted  
+  
+def select_variant(name, accept_encoding):  
+    """  
+    配信するファイルを選ぶ。戻り値: (パス, Content-Encoding or None, ETag)。無い名前なら None。  
+    ETag は符号化ごとに別 (中身のバイト列が違うので強い ETag も分ける)  
+    """  
+    if not ASSET_NAME.fullmatch(name): return None  
+    path = os.path.join(ASSET_DIR, name)  
+    if not os.path.exists(path): return None  
+    digest = name.split(".")[1]  
+    accepted = _accepted(accept_encoding or "")  
+    for encoding, suffix in ENCODINGS:  
+        if (encoding in accepted or "*" in accepted) and os.path.exists(path + suffix):  
+            return path + suffix, encoding, f'"{digest}-{encoding}"'  
+    return path, None, f'"{digest}"'  
+  
+if __name__ == "__main__":  
+    name, sizes = build_station_asset()  
+    print(f"💾 {ASSET_DIR}/{name} ({', '.join(f'{k} {v / 1024:.1f} KB' for k, v in sizes.items())}, 元 {os.path.getsize(STATIONS_JSON) / 1024:.1f} KB)")  
\ No newline at end of file
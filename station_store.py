@@ -0,0 +1,70 @@
+import os  
+import csv  
+from array import array  
+import timetable  
+  
+# === 駅位置データ (data/stops.txt) ===  
+# 起動を速くするため、compile_timetable.py で stops.txt を data/stations.bin に変換しておき、  
+# pandas を使わずに読む (スナップショットが無い・古い場合は csv モジュールで stops.txt を読む)。  
+#  
+# ファイルは timetable.write_columns の形式 (magic "NGST"):  
+#   names     : 駅名と別名 (「〜駅」から「駅」を外した名前) を "\n" で連結 ('B')  
+#   name_rows : 名前 -> 座標の行 ('I')。名前の並び = 名前ID (core_engine.station_coords の順)  
+#   lat / lon : 座標 ('d')  
+  
+STATIONS_BIN = os.environ.get("STATIONS_BIN", f"{timetable.DATA_DIR}/stations.bin")  # 空ならスナップショットを使わない  
+STATIONS_MAGIC = b"NGST"  
+STATIONS_VERSION = 1  
+  
+def read_stops(stops_path=timetable.STOPS_TXT):  
+    """ 戻り値: ({名前: 座標の行}, lat, lon)。同じ名前が複数あれば後の行が勝つ (名前IDは最初の位置のまま) """  
+    name_rows = {}  
+    lats, lons = array('d'), array('d')  
+    with open(stops_path, "r", encoding="utf-8", newline="") as f:  
+        for row in csv.DictReader(f):  
+            i = len(lats)  
+            lats.append(float(row["stop_lat"]))  
+            lons.append(float(row["stop_lon"]))  
+            name_rows[row["stop_name"]] = i  
+            if row["stop_name"].endswith("駅"):  
+                name_rows[row["stop_name"][:-1]] = i  
+    return name_rows, lats, lons  
+  
+def write_station_snapshot(path=STATIONS_BIN, stops_path=timetable.STOPS_TXT):  
+    name_rows, lats, lons = read_stops(stops_path)  
+    columns = {  
+        "names": array('B', "\n".join(name_rows.keys()).encode("utf-8")),  
+        "name_rows": array('I', name_rows.values()),  
+        "lat": lats,  
+        "lon": lons,  
+    }  
+    return timetable.write_columns(path, columns, STATIONS_MAGIC, STATIONS_VERSION)  
+  
+def load_station_snapshot(path=STATIONS_BIN):  
+    mm, columns = timetable.map_columns(path, STATIONS_MAGIC, STATIONS_VERSION)  
+    try:  
+        names = bytes(columns["names"]).decode("utf-8").split("\n")  
+        name_rows = dict(zip(names, columns["name_rows"].tolist()))  
+        lats, lons = array('d', columns["lat"]), array('d', columns["lon"])  
+    finally:  
+        # 起動時に1回読むだけなので、コピーしたら mmap は閉じる  
+        for col in columns.values(): col.release()  
+        mm.close()  
+    return name_rows, lats, lons  
+  
+def _snapshot_is_fresh(stops_path):  
+    """ スナップショットがあり、stops.txt より新しいか """  
+    if not STATIONS_BIN or not os.path.exists(STATIONS_BIN): return False  
+    if not os.path.exists(stops_path): return True  
+    if os.path.getmtime(STATIONS_BIN) >= os.path.getmtime(stops_path): return True  
+    print(f"⚠️ {STATIONS_BIN} is older than {stops_path}. Run compile_timetable.py")  
+    return False  
+  
+def load_station_coords(stops_path=timetable.STOPS_TXT):  
+    """ {駅名: {"lat", "lon"}}。別名は本来の駅名と同じ dict を指す """  
+    if _snapshot_is_fresh(stops_path):  
+        name_rows, lats, lons = load_station_snapshot(STATIONS_BIN)  
+    else:  
+        name_rows, lats, lons = read_stops(stops_path)  
+    coords = [{"lat": lat, "lon": lon} for lat, lon in zip(lats, lons)]  
+    return {name: coords[i] for name, i in name_rows.items()}  
\ No newline at end of file
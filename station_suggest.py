@@ -0,0 +1,89 @@
+import os  
+import json  
+import bisect  
+import heapq  
+import threading  
+import timetable  
+  
+# === 駅名の入力候補 (/suggest) ===  
+# fetch_stations.py が作る stations_kanto.json ({"n": 駅名, "k": かな, "l": 路線} の並び) から、  
+# 駅名ごとに1件 (路線はまとめる) の一覧と、漢字・かなの前方一致用のソート済み配列を1回だけ作る。  
+# 問い合わせは bisect で「その文字列で始まる範囲」を取り、その中から順位の高い駅を k 件返す。  
+# 順位: 入力と完全一致 > 路線の多い駅 (乗換駅) > 名前の短い駅 > ファイルでの出現順  
+  
+STATIONS_JSON = os.environ.get("SUGGEST_STATIONS_JSON", f"{timetable.DATA_DIR}/stations_kanto.json")  
+DEFAULT_LIMIT = 10  
+MAX_LIMIT = 50  
+  
+def to_hiragana(text):  
+    """ カタカナをひらがなにする (かなは stations_kanto.json の k に合わせる) """  
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヴ" else c for c in text)  
+  
+class SuggestIndex:  
+    def __init__(self, entries):  
+        self.names = []   # 駅ID -> 駅名  
+        self.kana = []    # 駅ID -> かな  
+        self.lines = []   # 駅ID -> 路線名のリスト (出現順)  
+        ids = {}  
+        for e in entries:  
+            sid = ids.get(e["n"])  
+            if sid is None:  
+                sid = ids[e["n"]] = len(self.names)  
+                self.names.append(e["n"])  
+                self.kana.append(e.get("k") or "")  
+                self.lines.append([])  
+            if e.get("l") and e["l"] not in self.lines[sid]:  
+                self.lines[sid].append(e["l"])  
+  
+        # 駅ごとの順位 (完全一致以外の部分)  
+        self.rank = [(-len(lines), len(name), sid) for sid, (name, lines) in enumerate(zip(self.names, self.lines))]  
+        # 前方一致用: (文字列, 駅ID) を文字列順に並べた配列  
+        terms = sorted({(t, sid) for sid in range(len(self.names)) for t in (self.names[sid], self.kana[sid]) if t})  
+        self.terms = [t for t, _ in terms]  
+        self.term_ids = [sid for _, sid in terms]  
+  
+    def __len__(self):  
+        return len(self.names)  
+  
+    def suggest(self, query, limit=DEFAULT_LIMIT):  
+        """ query で始まる駅 (漢字 or かな) を順位順に最大 limit 件。[{n, k, lines}, ...] """  
+        query = query.strip()  
+        if not query: return []  
+        hits = {}  
+        # 駅名にはカタカナもある (四ツ谷・虎ノ門) ので、そのままの形とひらがなにした形の両方で引く  
+        for q in {query, to_hiragana(query)}:  
+            lo = bisect.bisect_left(self.terms, q)  
+            hi = bisect.bisect_left(self.terms, q + "\U0010ffff", lo)  
+            for i in range(lo, hi):  
+                sid = self.term_ids[i]  
+                exact = self.terms[i] == q  
+                if exact or sid not in hits: hits[sid] = (not exact,) + self.rank[sid]  
+        best = heapq.nsmallest(limit, hits.values()) if len(hits) > limit else sorted(hits.values())  
+        return [{"n": self.names[r[-1]], "k": self.kana[r[-1]], "lines": self.lines[r[-1]]} for r in best]  
+  
+def load_index(path=STATIONS_JSON):  
+    print(f"📂 Building suggest index {path} ...")  
+    with open(path, "r", encoding="utf-8") as f:  
+        index = SuggestIndex(json.load(f))  
+    print(f"✅ Indexed {len(index)} stations / {len(index.terms)} terms.")  
+    return index  
+  
+# プロセス内で1回だけ作る  
+_index = None  
+_index_loaded = False  
+_index_lock = threading.Lock()  
+  
+def get_index():  
+    """ 作成済みの索引を返す。駅データが無ければ None """  
+    global _index, _index_loaded  
+    if _index_loaded:  
+        return _index  
+    with _index_lock:  
+        if not _index_loaded:  
+            try:  
+                _index = load_index(STATIONS_JSON)  
+            except Exception as e:  
+                print(f"❌ Suggest Index Load Error: {e}")  
+                _index = None  
+            _index_loaded = True  
+    return _index  
\ No newline at end of file
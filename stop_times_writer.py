@@ -0,0 +1,67 @@
+import os  
+import csv  
+import hashlib  
+  
+# === stop_times.txt を少しずつ書き出すライター ===  
+# 行を dict のリストに溜めて最後に DataFrame -> drop_duplicates -> to_csv する代わりに、  
+# CHUNK_ROWS 行ごとにファイルへ書き出す。重複行は行の 8 バイトハッシュの集合で弾く  
+# (最初に出た行を残すので、drop_duplicates と同じ並び・同じ中身になる)。  
+# 注意: このハッシュの集合は「重複しない行の数」に比例して増える (1行あたり約70バイト、58万行で約40MB)。  
+# 行そのものを溜めるよりずっと小さいが、一定ではない。同じ列車が離れた場所に再び出てくる  
+# (Bプランでは同じ駅の別の時刻表から同じ区間が出る) ので、列車ごとに集合を捨てることはできない。  
+# 書き終わるまでは .tmp に書き、close() で差し替える (途中で止まっても前回のファイルは壊れない)。  
+  
+COLUMNS = ["trip_id", "stop_id", "arrival_time", "departure_time", "stop_sequence"]  
+CHUNK_ROWS = 50000  
+  
+class StopTimesWriter:  
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, keep_empty=False):  
+        self.path = path  
+        self.keep_empty = keep_empty  # True なら0行でもヘッダだけのファイルにする  
+        self.tmp_path = path + ".tmp"  
+        self.chunk_rows = chunk_rows  
+        self.rows = 0          # 書いた行数 (重複を除く)  
+        self.duplicates = 0  
+        self._seen = set()  
+        self._buffer = []  
+        self._file = open(self.tmp_path, "w", encoding="utf-8", newline="")  
+        self._writer = csv.writer(self._file, lineterminator="\n")  
+        self._writer.writerow(COLUMNS)  
+  
+    def add(self, trip_id, stop_id, arrival_time, departure_time, stop_sequence):  
+        row = (trip_id, stop_id, arrival_time, departure_time, stop_sequence)  
+        key = hashlib.blake2b("\x1f".join(map(str, row)).encode("utf-8"), digest_size=8).digest()  
+        if key in self._seen:  
+            self.duplicates += 1  
+            return  
+        self._seen.add(key)  
+        self._buffer.append(row)  
+        self.rows += 1  
+        if len(self._buffer) >= self.chunk_rows: self.flush()  
+  
+    def flush(self):  
+        self._writer.writerows(self._buffer)  
+        self._buffer.clear()  
+  
+    def close(self):  
+        """ 書き終えたファイルで置き換える。1行も無ければ (keep_empty でない限り) 元のファイルはそのまま。戻り値: 行数 """  
+        self.flush()  
+        self._file.close()  
+        self._seen.clear()  
+        if self.rows == 0 and not self.keep_empty:  
+            os.remove(self.tmp_path)  
+        else:  
+            os.replace(self.tmp_path, self.path)  
+        return self.rows  
+  
+    def abort(self):  
+        """ 書きかけを捨てる """  
+        self._file.close()  
+        if os.path.exists(self.tmp_path): os.remove(self.tmp_path)  
+  
+    def __enter__(self):  
+        return self  
+  
+    def __exit__(self, exc_type, exc, tb):  
+        if exc_type is not None: self.abort()  
+        else: self.close()  
\ No newline at end of file
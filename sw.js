@@ -1,5 +1,7 @@
-// キャッシュ名  
-const CACHE_NAME = 'never-give-up-v1';  
+// キャッシュ名 (画面のファイルを変えたら番号を上げる。古いキャッシュは activate で消す)  
+const CACHE_NAME = 'never-give-up-v2';  
+// 内容ハッシュ付きの駅データ (/assets/stations.<ハッシュ>.json) 用。URL が同じなら中身も同じ  
+const ASSET_CACHE = 'never-give-up-assets';  
 const urlsToCache = [  
   './',  
   './index.html',  
@@ -14,11 +16,74 @@ self.addEventListener('install', function(event) {
       .then(function(cache) {  
         return cache.addAll(urlsToCache);  
       })  
+      .then(function() {  
+        return self.skipWaiting();  
+      })  
+  );  
+});  
+  
+// 古い版のキャッシュを消す  
+self.addEventListener('activate', function(event) {  
+  event.waitUntil(  
+    caches.keys()  
+      .then(function(keys) {  
+        return Promise.all(keys.filter(function(key) {  
+          return key !== CACHE_NAME && key !== ASSET_CACHE;  
+        }).map(function(key) {  
+          return caches.delete(key);  
+        }));  
+      })  
+      .then(function() {  
+        return self.clients.claim();  
+      })  
   );  
 });  
   
-// リクエスト時にキャッシュがあればそれを返す  
+function isHashedAsset(url) {  
+  return /\/assets\/stations\.[0-9a-f]{16}\.json$/.test(url.pathname);  
+}  
+  
 self.addEventListener('fetch', function(event) {  
+  if (event.request.method !== 'GET') return;  
+  const url = new URL(event.request.url);  
+  
+  // ハッシュ付きの駅データ: キャッシュにあればそれ (変わらない)。新しく取ったら古いハッシュのものは消す  
+  if (isHashedAsset(url)) {  
+    event.respondWith(  
+      caches.open(ASSET_CACHE).then(function(cache) {  
+        return cache.match(event.request).then(function(cached) {  
+          if (cached) return cached;  
+          return fetch(event.request).then(function(response) {  
+            if (!response.ok) return response;  
+            cache.put(event.request, response.clone());  
+            cache.keys().then(function(keys) {  
+              keys.forEach(function(req) {  
+                if (req.url !== event.request.url && isHashedAsset(new URL(req.url))) cache.delete(req);  
+              });  
+            });  
+            return response;  
+          });  
+        });  
+      })  
+    );  
+    return;  
+  }  
+  
+  // 駅データの今のファイル名: ネットワーク優先 (オフラインなら前回のもの)  
+  if (url.pathname === '/assets/stations.json') {  
+    event.respondWith(  
+      fetch(event.request).then(function(response) {  
+        const copy = response.clone();  
+        if (response.ok) caches.open(ASSET_CACHE).then(function(cache) { cache.put(event.request, copy); });  
+        return response;  
+      }).catch(function() {  
+        return caches.match(event.request);  
+      })  
+    );  
+    return;  
+  }  
+  
+  // それ以外: キャッシュがあればそれを返す  
   event.respondWith(  
     caches.match(event.request)  
       .then(function(response) {  
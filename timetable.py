@@ -0,0 +1,345 @@
+import csv  
+import os  
+import json  
+import sys  
+import mmap  
+import struct  
+import bisect  
+import threading  
+from array import array  
+  
+# === 時刻表データ (data/stop_times.manifest.json / data/stop_times.txt) の読み込み ===  
+# generate_full_timetable.py / fetch_odpt.py が出力したCSV (路線ごとのシャード。timetable_shards.py) を  
+# 「接続 (ある列車が隣り合う2駅間を走る1区間)」の配列に変換して保持する。  
+# 時刻はすべて「営業日0時からの経過分」(25:10 -> 1510) で扱う。  
+  
+DATA_DIR = "data"  
+STOP_TIMES_TXT = f"{DATA_DIR}/stop_times.txt"  # 1ファイルの時刻表 (マニフェストが無いときだけ使う)  
+STOP_TIMES_MANIFEST = f"{DATA_DIR}/stop_times.manifest.json"  # 路線ごとのシャードの一覧  
+SHARD_DIR = f"{DATA_DIR}/stop_times.d"  
+STOPS_TXT = f"{DATA_DIR}/stops.txt"  
+TIMETABLE_BIN = f"{DATA_DIR}/timetable.bin"  # compile_timetable.py が生成するバイナリスナップショット  
+  
+SERVICE_DAY_START_HOUR = 4  # これより前の時刻は前日の営業日 (24時越え) とみなす  
+  
+def parse_time_to_minutes(time_str):  
+    """ "25:10:00" / "25:10" -> 1510 """  
+    parts = time_str.split(':')  
+    return int(parts[0]) * 60 + int(parts[1])  
+  
+def minutes_to_hhmm(minutes):  
+    """ 1510 -> "01:10" (Yahoo!の表示に合わせて24時間表記に戻す) """  
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"  
+  
+# 列の名前 (Timetable の属性名と一致させる)  
+CONNECTION_COLUMNS = ["conn_dep", "conn_arr", "conn_from", "conn_to", "conn_trip"]  
+ROUTE_COLUMNS = [  
+    "route_stop_offsets", "route_stops",        # 系統r の停車駅 = route_stops[off[r]:off[r+1]]  
+    "route_trip_offsets", "route_trip_ids",     # 系統r の列車 (始発駅の発車順)  
+    "route_time_offsets", "st_arr", "st_dep",   # 系統r のj本目・p番目の駅 = off[r] + j*停車駅数 + p  
+    "station_route_offsets", "station_routes", "station_route_pos",  # 駅s を通る系統と、その中での位置  
+]  
+  
+class Timetable:  
+    """  
+    出発時刻順にソートした接続配列 (CSA用) と、  
+    停車駅の並びが同じ列車をまとめた系統 (route) の配列 (RAPTOR用) を列指向で保持する  
+    """  
+  
+    def __init__(self, station_names, trip_ids, columns):  
+        self.station_names = station_names  
+        self.station_ids = {name: i for i, name in enumerate(station_names)}  
+        self.trip_ids = trip_ids  
+        for name in CONNECTION_COLUMNS + ROUTE_COLUMNS:  
+            setattr(self, name, columns[name])  
+        # 駅座標 (stops.txt 由来, 不明は NaN)。CSVから直接読んだ場合は無い  
+        self.station_lat = columns.get("station_lat")  
+        self.station_lon = columns.get("station_lon")  
+        self.route_count = len(self.route_stop_offsets) - 1  
+        self._mmap = None  # スナップショットを mmap した場合はここで保持する  
+  
+    def __len__(self):  
+        return len(self.conn_dep)  
+  
+    def first_connection_at(self, minutes):  
+        """ 出発時刻が minutes 以降の最初の接続のインデックス """  
+        return bisect.bisect_left(self.conn_dep, minutes)  
+  
+def _read_stops(stops_path):  
+    """ stops.txt の順に駅IDを振る。戻り値: (駅名 -> ID, 駅名リスト, 緯度, 経度) """  
+    station_ids = {}  
+    station_names = []  
+    station_lat = array('f')  
+    station_lon = array('f')  
+    if stops_path:  
+        with open(stops_path, "r", encoding="utf-8", newline="") as f:  
+            for row in csv.DictReader(f):  
+                if row["stop_name"] in station_ids: continue  
+                station_ids[row["stop_name"]] = len(station_names)  
+                station_names.append(row["stop_name"])  
+                station_lat.append(float(row["stop_lat"]))  
+                station_lon.append(float(row["stop_lon"]))  
+    return station_ids, station_names, station_lat, station_lon  
+  
+def _make_timetable(station_names, station_lat, station_lon, trip_ids, trip_stops, stops_path):  
+    columns = build_columns(len(station_names), trip_stops)  
+    if stops_path:  
+        nan = float("nan")  
+        station_lat.extend([nan] * (len(station_names) - len(station_lat)))  
+        station_lon.extend([nan] * (len(station_names) - len(station_lon)))  
+        columns["station_lat"] = station_lat  
+        columns["station_lon"] = station_lon  
+    tt = Timetable(station_names, trip_ids, columns)  
+    print(f"✅ Loaded {len(tt)} connections / {len(station_names)} stations / {len(trip_ids)} trips / {tt.route_count} routes.")  
+    return tt  
+  
+def stop_times_source():  
+    """ 時刻表の元データ: シャードのマニフェストがあればそれ、無ければ stop_times.txt """  
+    return STOP_TIMES_MANIFEST if os.path.exists(STOP_TIMES_MANIFEST) else STOP_TIMES_TXT  
+  
+def stop_times_paths(source):  
+    """ 元データ (マニフェスト or CSV) -> 読むCSVのパス (マニフェストの順) """  
+    if not source.endswith(".json"): return [source]  
+    with open(source, "r", encoding="utf-8") as f:  
+        manifest = json.load(f)  
+    shard_dir = os.path.join(os.path.dirname(source), manifest["shard_dir"])  
+    return [os.path.join(shard_dir, shard["file"]) for shard in manifest["shards"]]  
+  
+def load_timetable(path=None, stops_path=None):  
+    """  
+    stop_times.txt (またはシャードのマニフェスト) を読む。省略時は stop_times_source()。  
+    stops_path を渡すと駅IDをstops.txtの順で振り、座標も持たせる  
+    """  
+    path = path or stop_times_source()  
+    print(f"📂 Loading timetable {path} ...")  
+    station_ids, station_names, station_lat, station_lon = _read_stops(stops_path)  
+    trips = {}  # trip_id -> [(stop_sequence, station_id, arr, dep)]  
+  
+    for csv_path in stop_times_paths(path):  
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:  
+            for row in csv.DictReader(f):  
+                name = row["stop_id"]  
+                sid = station_ids.get(name)  
+                if sid is None:  
+                    sid = len(station_names)  
+                    station_ids[name] = sid  
+                    station_names.append(name)  
+                trips.setdefault(row["trip_id"], []).append((  
+                    int(row["stop_sequence"]),  
+                    sid,  
+                    parse_time_to_minutes(row["arrival_time"]),  
+                    parse_time_to_minutes(row["departure_time"]),  
+                ))  
+  
+    trip_ids = list(trips.keys())  
+    trip_stops = []  
+    for stops in trips.values():  
+        stops.sort()  
+        trip_stops.append([(sid, arr, dep) for _, sid, arr, dep in stops])  
+    del trips  
+  
+    return _make_timetable(station_names, station_lat, station_lon, trip_ids, trip_stops, stops_path)  
+  
+def timetable_from_trips(trips, stops_path=None):  
+    """  
+    CSVを経由せずに Timetable を作る (generate_full_timetable.py 用)。  
+    trips: [(trip_id, 駅名リスト, 着の分リスト, 発の分リスト), ...] (停車順, trip_id は重複なし)。  
+    駅IDの振り方は、同じ内容の stop_times.txt を load_timetable で読んだ場合と同じになる  
+    """  
+    station_ids, station_names, station_lat, station_lon = _read_stops(stops_path)  
+    trip_ids = []  
+    trip_stops = []  
+    for trip_id, names, arrs, deps in trips:  
+        sids = []  
+        for name in names:  
+            sid = station_ids.get(name)  
+            if sid is None:  
+                sid = len(station_names)  
+                station_ids[name] = sid  
+                station_names.append(name)  
+            sids.append(sid)  
+        trip_ids.append(trip_id)  
+        trip_stops.append(list(zip(sids, arrs, deps)))  
+  
+    return _make_timetable(station_names, station_lat, station_lon, trip_ids, trip_stops, stops_path)  
+  
+def build_columns(station_count, trip_stops):  
+    """  
+    trip_stops[t] = [(駅ID, 着, 発), ...] (停車順) から Timetable の全列を作る  
+    """  
+    columns = {}  
+  
+    # --- 接続 (CSA用) ---  
+    connections = []  
+    for t, stops in enumerate(trip_stops):  
+        for prev, nxt in zip(stops, stops[1:]):  
+            # (出発, 到着, 発駅, 着駅, 列車)  
+            connections.append((prev[2], nxt[1], prev[0], nxt[0], t))  
+    connections.sort()  
+    for k, name in enumerate(CONNECTION_COLUMNS):  
+        columns[name] = array('h' if k < 2 else 'i', (c[k] for c in connections))  
+    del connections  
+  
+    # --- 系統 (RAPTOR用) : 停車駅の並びが同じ列車をまとめる ---  
+    routes = {}  
+    for t, stops in enumerate(trip_stops):  
+        if len(stops) < 2: continue  
+        routes.setdefault(tuple(s[0] for s in stops), []).append(t)  
+  
+    route_stop_offsets = array('i', [0])  
+    route_stops = array('i')  
+    route_trip_offsets = array('i', [0])  
+    route_trip_ids = array('i')  
+    route_time_offsets = array('i', [0])  
+    st_arr = array('h')  
+    st_dep = array('h')  
+    station_routes = [[] for _ in range(station_count)]  
+  
+    for r, (seq, trips_in_route) in enumerate(routes.items()):  
+        for pos, sid in enumerate(seq):  
+            station_routes[sid].append((r, pos))  
+        route_stops.extend(seq)  
+        route_stop_offsets.append(len(route_stops))  
+        # 始発駅の発車順 (追い越しは無いものとみなす)  
+        trips_in_route.sort(key=lambda t: trip_stops[t][0][2])  
+        route_trip_ids.extend(trips_in_route)  
+        route_trip_offsets.append(len(route_trip_ids))  
+        for t in trips_in_route:  
+            for _, arr, dep in trip_stops[t]:  
+                st_arr.append(arr)  
+                st_dep.append(dep)  
+        route_time_offsets.append(len(st_arr))  
+  
+    station_route_offsets = array('i', [0])  
+    station_route_ids = array('i')  
+    station_route_pos = array('i')  
+    for pairs in station_routes:  
+        for r, pos in pairs:  
+            station_route_ids.append(r)  
+            station_route_pos.append(pos)  
+        station_route_offsets.append(len(station_route_ids))  
+  
+    columns.update({  
+        "route_stop_offsets": route_stop_offsets,  
+        "route_stops": route_stops,  
+        "route_trip_offsets": route_trip_offsets,  
+        "route_trip_ids": route_trip_ids,  
+        "route_time_offsets": route_time_offsets,  
+        "st_arr": st_arr,  
+        "st_dep": st_dep,  
+        "station_route_offsets": station_route_offsets,  
+        "station_routes": station_route_ids,  
+        "station_route_pos": station_route_pos,  
+    })  
+    return columns  
+  
+# === バイナリスナップショット ===  
+# CSVをパースし直さずに済むよう、Timetable の列をそのままバイト列で並べたファイル。  
+# mmap して memoryview.cast するだけで読めるので、複数のuvicornワーカーが  
+# OSのページキャッシュ上の1コピーを共有できる (プロセスごとのコピーは作らない)。  
+#  
+#   ヘッダ   : magic(4s) version(I) byteorder(B) pad(3x) 列数(I)  
+#   列目録   : [列名(24s) 型コード(c) pad(7x) オフセット(Q) 要素数(Q)] x 列数  
+#   本体     : 各列 (8バイト境界に揃える)  
+#   駅名/列車ID は UTF-8 を "\n" で連結した 'B' 列として格納  
+  
+SNAPSHOT_MAGIC = b"NGTT"  
+SNAPSHOT_VERSION = 1  
+_HEADER = struct.Struct("<4sIB3xI")  
+_ENTRY = struct.Struct("<24sc7xQQ")  
+  
+def write_columns(path, columns, magic=SNAPSHOT_MAGIC, version=SNAPSHOT_VERSION):  
+    """ {列名: array} を上の形式で書き出す (時刻表以外の mmap 用ファイルでも使う) """  
+    entries = []  
+    offset = _HEADER.size + _ENTRY.size * len(columns)  
+    for name, col in columns.items():  
+        offset = (offset + 7) // 8 * 8  
+        entries.append((name, col, offset))  
+        offset += len(col) * col.itemsize  
+  
+    tmp_path = path + ".tmp"  
+    with open(tmp_path, "wb") as f:  
+        byteorder = 0 if sys.byteorder == "little" else 1  
+        f.write(_HEADER.pack(magic, version, byteorder, len(columns)))  
+        for name, col, offset in entries:  
+            f.write(_ENTRY.pack(name.encode("ascii"), col.typecode.encode("ascii"), offset, len(col)))  
+        for name, col, offset in entries:  
+            f.write(b"\0" * (offset - f.tell()))  
+            col.tofile(f)  
+    # 読み込み中のワーカーがいても壊れないよう、差し替えは rename で行う  
+    os.replace(tmp_path, path)  
+    return os.path.getsize(path)  
+  
+def map_columns(path, magic=SNAPSHOT_MAGIC, version=SNAPSHOT_VERSION):  
+    """ write_columns で書いたファイルを mmap する。戻り値: (mmap, {列名: memoryview}) """  
+    with open(path, "rb") as f:  
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  
+  
+    file_magic, file_version, byteorder, count = _HEADER.unpack_from(mm, 0)  
+    if file_magic != magic or file_version != version:  
+        raise ValueError(f"unsupported snapshot: {file_magic!r} v{file_version}")  
+    if byteorder != (0 if sys.byteorder == "little" else 1):  
+        raise ValueError("snapshot byte order mismatch")  
+  
+    view = memoryview(mm)  
+    columns = {}  
+    for i in range(count):  
+        name, typecode, offset, length = _ENTRY.unpack_from(mm, _HEADER.size + _ENTRY.size * i)  
+        name = name.rstrip(b"\0").decode("ascii")  
+        typecode = typecode.decode("ascii")  
+        size = array(typecode).itemsize  
+        # コピーせずに mmap 上の領域をそのまま型付きで見る  
+        columns[name] = view[offset:offset + length * size].cast(typecode)  
+    return mm, columns  
+  
+def write_snapshot(tt, path=TIMETABLE_BIN):  
+    columns = {name: getattr(tt, name) for name in CONNECTION_COLUMNS + ROUTE_COLUMNS}  
+    if tt.station_lat is not None:  
+        columns["station_lat"] = tt.station_lat  
+        columns["station_lon"] = tt.station_lon  
+    columns["station_names"] = array('B', "\n".join(tt.station_names).encode("utf-8"))  
+    columns["trip_ids"] = array('B', "\n".join(tt.trip_ids).encode("utf-8"))  
+    return write_columns(path, columns)  
+  
+def load_snapshot(path=TIMETABLE_BIN):  
+    print(f"📂 Mapping timetable snapshot {path} ...")  
+    mm, columns = map_columns(path)  
+  
+    station_names = bytes(columns.pop("station_names")).decode("utf-8").split("\n")  
+    trip_ids = bytes(columns.pop("trip_ids")).decode("utf-8").split("\n")  
+    tt = Timetable(station_names, trip_ids, columns)  
+    tt._mmap = mm  
+    print(f"✅ Mapped {len(tt)} connections / {len(station_names)} stations / {tt.route_count} routes.")  
+    return tt  
+  
+# プロセス内で1回だけ読み込む  
+_timetable = None  
+_timetable_loaded = False  
+_timetable_lock = threading.Lock()  
+  
+def _snapshot_is_fresh():  
+    """ スナップショットがあり、元データ (マニフェスト or stop_times.txt) より新しいか """  
+    if not os.path.exists(TIMETABLE_BIN): return False  
+    source = stop_times_source()  
+    if not os.path.exists(source): return True  
+    if os.path.getmtime(TIMETABLE_BIN) >= os.path.getmtime(source): return True  
+    print(f"⚠️ {TIMETABLE_BIN} is older than {source}. Run compile_timetable.py")  
+    return False  
+  
+def get_timetable():  
+    """ 読み込み済みの時刻表を返す。データが無ければ None """  
+    global _timetable, _timetable_loaded  
+    if _timetable_loaded:  
+        return _timetable  
+    with _timetable_lock:  
+        if not _timetable_loaded:  
+            try:  
+                if _snapshot_is_fresh():  
+                    _timetable = load_snapshot(TIMETABLE_BIN)  
+                elif os.path.exists(stop_times_source()):  
+                    _timetable = load_timetable(stop_times_source())  
+            except Exception as e:  
+                print(f"❌ Timetable Load Error: {e}")  
+                _timetable = None  
+            _timetable_loaded = True  
+    return _timetable  
\ No newline at end of file
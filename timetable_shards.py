@@ -0,0 +1,116 @@
+import os  
+import re  
+import json  
+import hashlib  
+from contextlib import contextmanager  
+import timetable  
+from stop_times_writer import StopTimesWriter, COLUMNS  
+  
+# === 路線ごとの時刻表シャード ===  
+# 時刻表を1路線1ファイル (data/stop_times.d/<路線>-<ハッシュ>.csv) で持ち、  
+# data/stop_times.manifest.json に「どのシャードをどの順で読むか」を書く (timetable.load_timetable が読む)。  
+# ハッシュは、そのシャードを作るのに使った入力 (駅リストと座標・ODPT の生の応答など) から作るので、  
+# 入力が変わっていない路線は前回のファイルをそのまま使い、変わった路線だけ作り直せばよい。  
+# マニフェストは中身が変わったときだけ書き直す (変わらなければ timetable.bin も作り直さずに済む)。  
+#  
+#   builder = ShardBuilder()  
+#   digest = content_hash(入力...)  
+#   if not builder.reuse(路線, digest):  
+#       with builder.writer(路線, digest) as w: w.add(...)  
+#   builder.commit()  
+  
+MANIFEST_VERSION = 1  
+  
+def content_hash(*inputs):  
+    """ JSON にできる入力からシャードのハッシュ (16桁) を作る """  
+    data = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))  
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]  
+  
+def _file_name(key, digest):  
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "_", key)  
+    return f"{safe}-{digest}.csv"  
+  
+def read_manifest(path=timetable.STOP_TIMES_MANIFEST):  
+    try:  
+        with open(path, "r", encoding="utf-8") as f:  
+            return json.load(f)  
+    except (OSError, ValueError):  
+        return None  
+  
+class ShardBuilder:  
+    def __init__(self, manifest_path=timetable.STOP_TIMES_MANIFEST, shard_dir=timetable.SHARD_DIR):  
+        self.manifest_path = manifest_path  
+        self.shard_dir = shard_dir  
+        os.makedirs(shard_dir, exist_ok=True)  
+        previous = read_manifest(manifest_path)  
+        self.previous = previous["shards"] if previous else []  
+        self._previous_rows = {(s["key"], s["hash"]): s["rows"] for s in self.previous}  
+        self.shards = []  
+        self.reused = 0  
+        self.built = 0  
+  
+    def _path(self, key, digest):  
+        return os.path.join(self.shard_dir, _file_name(key, digest))  
+  
+    def _add(self, key, digest, rows):  
+        self.shards.append({"key": key, "hash": digest, "file": _file_name(key, digest), "rows": rows})  
+  
+    def reuse(self, key, digest):  
+        """ 同じ入力から作ったシャードが既にあれば、それを使うことにして True """  
+        if not os.path.exists(self._path(key, digest)): return False  
+        rows = self._previous_rows.get((key, digest))  
+        if rows is None:  
+            with open(self._path(key, digest), "rb") as f:  
+                rows = sum(1 for _ in f) - 1  
+        self._add(key, digest, rows)  
+        self.reused += 1  
+        return True  
+  
+    @contextmanager  
+    def writer(self, key, digest):  
+        """ 新しいシャードを StopTimesWriter で書く (重複行は弾く。0行でもファイルは作る) """  
+        w = StopTimesWriter(self._path(key, digest), keep_empty=True)  
+        with w:  
+            yield w  
+        self._add(key, digest, w.rows)  
+        self.built += 1  
+  
+    def write_text(self, key, digest, text, rows):  
+        """ 整形済みのCSV本文 (ヘッダ無し) をそのままシャードにする """  
+        path = self._path(key, digest)  
+        tmp_path = path + ".tmp"  
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:  
+            f.write(",".join(COLUMNS) + "\n")  
+            f.write(text)  
+        os.replace(tmp_path, path)  
+        self._add(key, digest, rows)  
+        self.built += 1  
+  
+    def commit(self):  
+        """  
+        マニフェストを差し替え、使われなくなったシャードを消す。  
+        戻り値: マニフェストが変わったか (変わっていなければファイルには触らない)  
+        """  
+        changed = self.shards != self.previous  
+        if changed:  
+            manifest = {  
+                "version": MANIFEST_VERSION,  
+                "shard_dir": os.path.relpath(self.shard_dir, os.path.dirname(self.manifest_path) or "."),  
+                "shards": self.shards,  
+            }  
+            tmp_path = self.manifest_path + ".tmp"  
+            with open(tmp_path, "w", encoding="utf-8") as f:  
+                json.dump(manifest, f, ensure_ascii=False, indent=1)  
+            # 読み込み中のワーカーがいても壊れないよう、差し替えは rename で行う  
+            os.replace(tmp_path, self.manifest_path)  
+  
+        # 古いマニフェストを読んだばかりのワーカーのために、1つ前の世代までは残す  
+        live = {s["file"] for s in self.shards + self.previous}  
+        for name in os.listdir(self.shard_dir):  
+            if name.endswith(".csv") and name not in live:  
+                os.remove(os.path.join(self.shard_dir, name))  
+        return changed  
+  
+    @property  
+    def rows(self):  
+        return sum(s["rows"] for s in self.shards)  
\ No newline at end of file
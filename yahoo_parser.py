@@ -0,0 +1,112 @@
+import os  
+import re  
+from html.parser import HTMLParser  
+  
+# === Yahoo!乗換案内 印刷用ページから「ルートの要約」だけを取り出す ===  
+# parse_yahoo_route (core_engine.py) が使うのは div.routeSummary の中の  
+# 最初の li.time (出発→到着) と li.transfer (乗換回数) の文字列だけなので、ページ全体の木は要らない。  
+#   "fast" : routeSummary の開始タグを正規表現で探し、そこから div が閉じるまでだけを HTMLParser に流す (既定)  
+#   "soup" : 従来どおりページ全体を BeautifulSoup (html.parser) で木にする (比較用・切り戻し用)  
+#   "lxml" : SoupStrainer で routeSummary の部分だけを lxml で組み立てる (lxml が入っている環境向け)  
+# どれも (li.time の文字列, li.transfer の文字列 or None) を返す。要約が無ければ None (li.time が無ければ time は None)。  
+# 結果が同じであることは benchmarks/bench_yahoo_parser.py で確かめる。  
+  
+PARSER = os.environ.get("YAHOO_PARSER", "fast")  
+  
+def _has_class(attrs, name):  
+    """ class 属性 (空白区切り) に name が含まれるか (BeautifulSoup の class_= と同じ判定) """  
+    return any(k == "class" and v and name in v.split() for k, v in attrs)  
+  
+# --- "soup" ---  
+  
+def extract_soup(html):  
+    from bs4 import BeautifulSoup  
+    soup = BeautifulSoup(html, "html.parser")  
+    return _from_summary_tag(soup.find("div", class_="routeSummary"))  
+  
+def _from_summary_tag(summary):  
+    if not summary: return None  
+    time_li = summary.find("li", class_="time")  
+    transfer_li = summary.find("li", class_="transfer")  
+    return (time_li.text if time_li else None, transfer_li.text if transfer_li else None)  
+  
+# --- "lxml" ---  
+  
+def extract_lxml(html):  
+    from bs4 import BeautifulSoup, SoupStrainer  
+    only_summary = SoupStrainer("div", class_="routeSummary")  
+    return _from_summary_tag(BeautifulSoup(html, "lxml", parse_only=only_summary).find("div", class_="routeSummary"))  
+  
+# --- "fast" ---  
+  
+_SUMMARY_START = re.compile(r"<div\b[^>]*routeSummary", re.IGNORECASE)  
+  
+class _Done(Exception):  
+    pass  
+  
+class _SummaryParser(HTMLParser):  
+    """ routeSummary の開始タグから流し込み、その div が閉じたところで止める """  
+  
+    def __init__(self):  
+        super().__init__(convert_charrefs=True)  
+        self.div_depth = 0  
+        self.li_depth = 0  
+        self.time = self.transfer = None      # 見つかった li の文字片  
+        self._time_at = self._transfer_at = 0  # 文字を集めている li の深さ (0 = 集めていない)  
+        self.matched = None                    # 最初のタグが本当に routeSummary だったか  
+  
+    def handle_starttag(self, tag, attrs):  
+        if self.matched is None:  
+            self.matched = tag == "div" and _has_class(attrs, "routeSummary")  
+            if not self.matched: raise _Done()  
+        if tag == "div":  
+            self.div_depth += 1  
+        elif tag == "li":  
+            self.li_depth += 1  
+            if self.time is None and _has_class(attrs, "time"):  
+                self.time, self._time_at = [], self.li_depth  
+            if self.transfer is None and _has_class(attrs, "transfer"):  
+                self.transfer, self._transfer_at = [], self.li_depth  
+  
+    def handle_endtag(self, tag):  
+        if tag == "li" and self.li_depth > 0:  
+            if self._time_at == self.li_depth: self._time_at = 0  
+            if self._transfer_at == self.li_depth: self._transfer_at = 0  
+            self.li_depth -= 1  
+        elif tag == "div":  
+            self.div_depth -= 1  
+            if self.div_depth == 0: raise _Done()  
+  
+    def handle_data(self, data):  
+        if self._time_at: self.time.append(data)  
+        if self._transfer_at: self.transfer.append(data)  
+  
+def _in_raw_text(html, pos):  
+    """ pos が <script> / <style> の中身かコメントの中か (そこにある "<div" はタグではない) """  
+    lower = html[:pos].lower()  
+    for open_tag, close_tag in (("<script", "</script"), ("<style", "</style")):  
+        if lower.rfind(open_tag) > lower.rfind(close_tag): return True  
+    return html.rfind("<!--", 0, pos) > html.rfind("-->", 0, pos)  
+  
+def extract_fast(html):  
+    pos = 0  
+    while True:  
+        m = _SUMMARY_START.search(html, pos)  
+        if not m: return None  
+        pos = m.end()  
+        if _in_raw_text(html, m.start()): continue  
+        parser = _SummaryParser()  
+        try:  
+            parser.feed(html[m.start():])  
+            parser.close()  
+        except _Done:  
+            pass  
+        if not parser.matched: continue  # 別のクラス名に routeSummary が含まれていただけ  
+        return ("".join(parser.time) if parser.time is not None else None,  
+                "".join(parser.transfer) if parser.transfer is not None else None)  
+  
+BACKENDS = {"fast": extract_fast, "soup": extract_soup, "lxml": extract_lxml}  
+  
+def extract_summary(html, backend=None):  
+    """ (li.time の文字列 or None, li.transfer の文字列 or None)。routeSummary が無ければ None """  
+    return BACKENDS[backend or PARSER](html)  
\ No newline at end of file